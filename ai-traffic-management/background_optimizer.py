@@ -0,0 +1,128 @@
+import asyncio
+import time
+from typing import Callable, Dict, Optional
+
+
+class CircuitBreaker:
+    # Stops calling a failing backend: after `failure_threshold` failures in a row the
+    # circuit opens and calls are refused for `reset_timeout` seconds, then a single
+    # trial call decides whether it closes again
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if self._trial_in_flight or self.clock() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self._trial_in_flight or self.clock() - self.opened_at < self.reset_timeout:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    @property
+    def trial_in_flight(self) -> bool:
+        return self._trial_in_flight
+
+    def release_trial(self) -> None:
+        # The trial call ended without a verdict (it was cancelled); the next call
+        # gets to be the trial instead
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.times_opened += 1
+            self.opened_at = self.clock()
+
+
+class BackgroundOptimizer:
+    # Runs an optimizer off the simulation's critical path. Each tick hands over the
+    # latest state and immediately gets the most recent published plan back, so the
+    # simulation keeps ticking on the last plan while a request is in flight. Only
+    # the newest state is kept for the next request; states that arrive while one is
+    # running replace each other and the stale ones are dropped.
+    def __init__(self, optimizer):
+        self.optimizer = optimizer
+        self.plan: Dict = optimizer._get_fallback_timing()
+        self.plan_version = 0
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._pending: Optional[Dict] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def get_optimal_timing(self, current_state: Dict) -> Dict:
+        self.submit(current_state)
+        return self.plan
+
+    def submit(self, current_state: Dict) -> None:
+        if self._pending is not None:
+            self.dropped += 1
+        self._pending = current_state
+        self.submitted += 1
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def _ensure_worker(self) -> None:
+        # A new event loop (e.g. a fresh asyncio.run) needs its own worker
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            state, self._pending = self._pending, None
+            if state is None:
+                continue
+            try:
+                plan = await self.optimizer.get_optimal_timing(state)
+            except Exception:
+                self.failed += 1
+                continue
+            self.plan = plan
+            self.plan_version += 1
+            self.completed += 1
+
+    async def close(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'plan_version': self.plan_version,
+        }
@@ -0,0 +1,125 @@
+import asyncio
+import re
+import time
+from typing import Dict, List, Optional
+
+from traffic_core import AITrafficOptimizer
+
+BATCH_LINE = re.compile(r'Intersection\s+(\d+)\s*:\s*(.*)')
+
+
+def prepare_batch_context(states: List[Dict]) -> str:
+    sections = []
+    for number, state in enumerate(states, start=1):
+        sections.append(f"""
+        Intersection {number}:
+        - Waiting vehicles: {state['waiting_vehicles']}
+        - Flow rates: {state['flow_rates']}
+        - Congestion levels: {state['congestion']}
+        - Time of day: {state['time_of_day']}
+        """)
+    return f"""
+        Current traffic state at {len(states)} intersections:
+        {''.join(sections)}
+        Recommend optimal signal timings for each intersection. Answer with one line
+        per intersection in the form "Intersection <number>: <four numbers>".
+        """
+
+
+class OptimizerBatcher:
+    # Collects the states that callers submit within `window` seconds (or until
+    # `max_batch` are waiting) and asks the backend about all of them in one request,
+    # then hands each caller its own plan. Cached states are answered straight away.
+    def __init__(self, optimizer: AITrafficOptimizer, window: float = 0.005,
+                 max_batch: int = 32):
+        self.optimizer = optimizer
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []  # (state, cache key, future)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.requests = 0
+        self.states = 0
+
+    def client(self) -> 'BatchedOptimizer':
+        return BatchedOptimizer(self)
+
+    async def request(self, state: Dict) -> Dict:
+        metrics = self.optimizer.metrics
+        start = time.perf_counter()
+        metrics.count('decisions')
+        try:
+            key = self.optimizer.cache.key(state)
+            timing = self.optimizer.cache.get(key)
+            if timing is not None:
+                metrics.count('cache_hits')
+                return timing
+
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending.append((state, key, future))
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+            return await future
+        finally:
+            metrics.observe('decision', time.perf_counter() - start)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._send(batch))
+
+    async def _send(self, batch: List) -> None:
+        self.requests += 1
+        self.states += len(batch)
+        answered = False
+        try:
+            response = await self.optimizer._get_ai_recommendation(
+                prepare_batch_context([state for state, _, _ in batch]))
+            answered = isinstance(response, str)
+            plans = self._parse_batch_response(response, len(batch))
+        except Exception:
+            self.optimizer.metrics.count('errors')
+            plans = [None] * len(batch)
+
+        for (_, key, future), timing in zip(batch, plans):
+            # Intersections the answer left out get the fallback plan, which isn't cached
+            if timing is None:
+                if answered:
+                    # A failed request was already counted under its own reason
+                    self.optimizer.metrics.fallback('missing_from_batch')
+                timing = self.optimizer._get_fallback_timing()
+            else:
+                self.optimizer.cache.put(key, timing)
+            if not future.done():
+                future.set_result(timing)
+
+    def _parse_batch_response(self, response: str, count: int) -> List[Optional[Dict]]:
+        plans: List[Optional[Dict]] = [None] * count
+        if not isinstance(response, str):
+            return plans  # the request failed and came back as the fallback plan
+        for line in response.splitlines():
+            match = BATCH_LINE.search(line)
+            if match and 1 <= int(match.group(1)) <= count:
+                plans[int(match.group(1)) - 1] = self.optimizer._parse_ai_response(match.group(2))
+        return plans
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.states / self.requests if self.requests else 0.0
+
+
+class BatchedOptimizer:
+    # What each simulation holds in place of its own AITrafficOptimizer
+    def __init__(self, batcher: OptimizerBatcher):
+        self.batcher = batcher
+
+    async def get_optimal_timing(self, current_state: Dict) -> Dict:
+        return await self.batcher.request(current_state)
+
+    def _get_fallback_timing(self) -> Dict:
+        return self.batcher.optimizer._get_fallback_timing()
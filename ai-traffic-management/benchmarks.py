@@ -0,0 +1,406 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from traffic_core import (VEHICLE_CONFIGS, AITrafficOptimizer, SimulationConfig,
+                          TrafficSimulation, Vehicle)
+from controllers import CONTROLLERS, create_local_optimizer
+from decision_cache import DecisionCache
+from demand import APPROACHES, LANES_PER_APPROACH
+from headless import ENGINES, FixedTimingOptimizer
+
+# Every result is one flat row: what was measured, at which parameters, the number
+# and whether higher or lower is better. Rows with the same suite, name and params
+# line up between runs, which is what --compare diffs.
+DEFAULT_COUNTS = [50, 200, 1000, 5000, 10000]
+QUICK_COUNTS = [50, 1000]
+
+STOP_LINES = {'right': 350, 'down': 200, 'left': 550, 'up': 400}
+EXIT_EDGES = {'right': 950, 'down': 650, 'left': -50, 'up': -50}
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def row(suite: str, name: str, value: float, unit: str, better: str, **params) -> Dict:
+    return {'suite': suite, 'name': name, 'params': params, 'value': value, 'unit': unit,
+            'better': better}
+
+
+def row_key(result: Dict) -> tuple:
+    return (result['suite'], result['name'], tuple(sorted(result['params'].items())))
+
+
+def populate(simulation: TrafficSimulation, count: int, seed: int = 0) -> TrafficSimulation:
+    # Puts `count` vehicles on the road at once, which spawning can't do: the spawn gap
+    # limits each lane to a vehicle every few ticks. Each lane gets a queue of waiting
+    # vehicles from its stop line back to the spawn point, as long as the model allows,
+    # and the rest have crossed and are spread over the road beyond the intersection.
+    # Every engine starts from the same scene.
+    rng = random.Random(seed)
+    types = list(VEHICLE_CONFIGS['speeds'])
+    lanes = [(direction, lane) for direction in APPROACHES for lane in range(LANES_PER_APPROACH)]
+    for index, (direction, lane) in enumerate(lanes):
+        in_lane = count // len(lanes) + (index < count % len(lanes))
+        vehicles = [Vehicle(lane, rng.choice(types), direction, rng.random() < 0.4)
+                    for _ in range(in_lane)]
+        horizontal = direction in ('right', 'left')
+        sign = 1 if direction in ('right', 'down') else -1
+        spawn = vehicles[0].position[0 if horizontal else 1] if vehicles else 0
+        # Waiting queue, front first, one vehicle length plus the gap apart
+        queue, along = [], vehicles[0].stop_position if vehicles else 0
+        while vehicles and (along - spawn) * sign >= 0:
+            vehicle = vehicles.pop()
+            queue.append((vehicle, along))
+            along -= sign * (vehicle.size[0] + SimulationConfig.MOVING_GAP)
+        # Everyone else is past the crossing point and heading for the edge
+        start = STOP_LINES[direction] + sign * 51
+        end = EXIT_EDGES[direction]
+        for k, vehicle in enumerate(vehicles):
+            vehicle.crossed = True
+            queue.insert(k, (vehicle, start + (end - start) * (k + 0.5) / len(vehicles)))
+        for vehicle, along in queue:
+            x, y = vehicle.position
+            vehicle.position = (along, y) if horizontal else (x, along)
+            simulation._add_vehicle(vehicle)
+    simulation.config.MAX_VEHICLES = count  # no spawning until vehicles leave
+    return simulation
+
+
+def build(engine: str, count: int, seed: int = 0) -> TrafficSimulation:
+    # The fixed plan answers instantly, so tick timings measure the model alone
+    return populate(ENGINES[engine](FixedTimingOptimizer(), seed=seed), count, seed)
+
+
+def best_time(function: Callable[[], object], repeats: int) -> float:
+    # Seconds per call. Like timeit: enough calls per run to take 0.2 s, the garbage
+    # collector off, and the best of `repeats` runs, so sub-millisecond numbers are
+    # steady enough to compare between commits
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeats, number)) / number
+
+
+def bench_ticks(counts: Sequence[int], ticks: int, repeats: int,
+                engines: Sequence[str] = tuple(ENGINES)) -> List[Dict]:
+    # TrafficSimulation.update (and the other engines' equivalent) at a given load
+    results = []
+    for engine in engines:
+        for count in counts:
+            rates = []
+            for repeat in range(repeats):
+                simulation = build(engine, count, seed=repeat)
+                start = time.perf_counter()
+                if hasattr(simulation, 'run_until'):
+                    asyncio.run(simulation.run_until(ticks))
+                else:
+                    asyncio.run(_run_ticks(simulation, ticks))
+                rates.append(ticks / (time.perf_counter() - start))
+            results.append(row('ticks', 'ticks_per_second', max(rates), 'ticks/s', 'higher',
+                               engine=engine, vehicles=count))
+    return results
+
+
+async def _run_ticks(simulation: TrafficSimulation, ticks: int) -> None:
+    for _ in range(ticks):
+        await simulation.update()
+
+
+def _per_call(function: Callable, arguments: Sequence, repeats: int) -> float:
+    # Microseconds per call, best of `repeats` passes over `arguments`
+    def calls():
+        for argument in arguments:
+            function(argument)
+    return best_time(calls, repeats) / max(len(arguments), 1) * 1e6
+
+
+def bench_lookups(counts: Sequence[int], repeats: int, sample: int = 1000) -> List[Dict]:
+    # Neighbour and spawn-gap lookups, the per-vehicle work inside every tick
+    results = []
+    rng = random.Random(0)
+    for count in counts:
+        # The same vehicles in both engines: build() gives them the same scene
+        picked = sorted(rng.sample(range(count), min(sample, count)))
+        for engine in ('object', 'vectorized'):
+            simulation = build(engine, count)
+            all_vehicles = list(simulation.vehicles)
+            vehicles = [all_vehicles[index] for index in picked]
+            candidates = [Vehicle(vehicle.lane, vehicle.type, vehicle.direction, False)
+                          for vehicle in vehicles]
+            results += [
+                row('lookups', 'get_vehicles_ahead', _per_call(
+                    simulation._get_vehicles_ahead, vehicles, repeats), 'us', 'lower',
+                    engine=engine, vehicles=count),
+                row('lookups', 'is_safe_to_spawn', _per_call(
+                    simulation._is_safe_to_spawn, candidates, repeats), 'us', 'lower',
+                    engine=engine, vehicles=count),
+            ]
+    return results
+
+
+def bench_snapshots(counts: Sequence[int], repeats: int) -> List[Dict]:
+    results = []
+    for count in counts:
+        for engine in ENGINES:
+            simulation = build(engine, count)
+            data = simulation.snapshot()
+            cls = ENGINES[engine]
+            results += [
+                row('snapshot', 'snapshot', best_time(simulation.snapshot, repeats) * 1e3,
+                    'ms', 'lower', engine=engine, vehicles=count),
+                row('snapshot', 'restore', best_time(
+                    lambda: cls.from_snapshot(data, FixedTimingOptimizer()), repeats) * 1e3,
+                    'ms', 'lower', engine=engine, vehicles=count),
+                row('snapshot', 'size', len(data) / 1024, 'KiB', 'lower',
+                    engine=engine, vehicles=count),
+            ]
+            if hasattr(simulation, 'clone'):
+                results.append(row('snapshot', 'clone', best_time(simulation.clone, repeats) * 1e3,
+                                   'ms', 'lower', engine=engine, vehicles=count))
+    return results
+
+
+def _state(index: int) -> Dict:
+    # Distinct enough for the decision cache to miss every time
+    return {
+        'waiting_vehicles': [2 * index, index % 7, 3, 1],
+        'flow_rates': [0.1, 0.2, 0.1, 0.05],
+        'congestion': [0.2, 0.1, 0.3, 0.0],
+        'time_of_day': 8,
+    }
+
+
+async def _decision_latencies(optimizer, decisions: int, distinct: bool) -> List[float]:
+    latencies = []
+    for index in range(decisions):
+        state = _state(index if distinct else 0)
+        start = time.perf_counter()
+        await optimizer.get_optimal_timing(state)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _latency_rows(name: str, latencies: List[float], **params) -> List[Dict]:
+    milliseconds = np.array(latencies) * 1e3
+    return [
+        row('optimizer', f'{name}_p50', float(np.percentile(milliseconds, 50)), 'ms', 'lower',
+            **params),
+        row('optimizer', f'{name}_p95', float(np.percentile(milliseconds, 95)), 'ms', 'lower',
+            **params),
+    ]
+
+
+def bench_optimizer(decisions: int) -> List[Dict]:
+    # Decision latency through the real AITrafficOptimizer path (prompt, HTTP, parse)
+    # against local_chat_server.py, plus the in-process controllers for scale
+    from local_chat_server import serve_in_background
+
+    server = serve_in_background()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        optimizer = AITrafficOptimizer(DecisionCache(max_entries=decisions + 1), base_url=url)
+        asyncio.run(_decision_latencies(optimizer, 3, True))  # client setup, connections
+        results = _latency_rows('decision', asyncio.run(
+            _decision_latencies(optimizer, decisions, True)), optimizer='ai', cache='miss')
+        results += _latency_rows('decision', asyncio.run(
+            _decision_latencies(optimizer, decisions, False)), optimizer='ai', cache='hit')
+    finally:
+        server.shutdown()
+        server.server_close()
+    for name in sorted(CONTROLLERS):
+        results += _latency_rows('decision', asyncio.run(_decision_latencies(
+            create_local_optimizer(name), decisions, True)), optimizer=name, cache='none')
+    return results
+
+
+def _frame_times(simulation: TrafficSimulation, draw: Callable, frames: int) -> float:
+    # Milliseconds per frame, the simulation ticking between frames (not timed)
+    loop = asyncio.new_event_loop()
+    try:
+        draw(simulation)  # cached backgrounds and sprites are built on the first frame
+        elapsed = 0.0
+        for _ in range(frames):
+            loop.run_until_complete(simulation.update())
+            start = time.perf_counter()
+            draw(simulation)
+            elapsed += time.perf_counter() - start
+    finally:
+        loop.close()
+    return elapsed / frames * 1e3
+
+
+def bench_render(counts: Sequence[int], frames: int) -> List[Dict]:
+    # Frame time of both renderers; a renderer whose library isn't installed is skipped
+    results = []
+    try:
+        from renderer import IntersectionRenderer
+    except ImportError:
+        print("matplotlib is not installed; skipping the matplotlib frame benchmark",
+              file=sys.stderr)
+    else:
+        for engine in ('object', 'vectorized'):
+            for count in counts:
+                renderer = IntersectionRenderer(seed=0)
+                results.append(row('render', 'matplotlib_frame', _frame_times(
+                    build(engine, count), renderer.render_image, frames), 'ms', 'lower',
+                    engine=engine, vehicles=count))
+    try:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # no window needed
+        import pygame
+        from pygame_renderer import SCREEN_SIZE, PygameRenderer
+    except ImportError:
+        print("pygame is not installed; skipping the pygame frame benchmark", file=sys.stderr)
+    else:
+        pygame.init()
+        try:
+            screen = pygame.display.set_mode(SCREEN_SIZE)
+            for engine in ('object', 'vectorized'):
+                for count in counts:
+                    renderer = PygameRenderer(screen, seed=0)
+                    results.append(row('render', 'pygame_frame', _frame_times(
+                        build(engine, count), renderer.render, frames), 'ms', 'lower',
+                        engine=engine, vehicles=count))
+        finally:
+            pygame.quit()
+    return results
+
+
+SUITES = ('ticks', 'lookups', 'snapshot', 'optimizer', 'render')
+
+
+def git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               cwd=HERE, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty.strip() else '')
+
+
+def run(suites: Sequence[str] = SUITES, counts: Sequence[int] = DEFAULT_COUNTS,
+        ticks: int = 100, repeats: int = 3, decisions: int = 200, frames: int = 20) -> Dict:
+    results: List[Dict] = []
+    start = time.perf_counter()
+    if 'ticks' in suites:
+        results += bench_ticks(counts, ticks, repeats)
+    if 'lookups' in suites:
+        results += bench_lookups(counts, repeats)
+    if 'snapshot' in suites:
+        results += bench_snapshots(counts, repeats)
+    if 'optimizer' in suites:
+        results += bench_optimizer(decisions)
+    if 'render' in suites:
+        results += bench_render(counts, frames)
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'suites': list(suites),
+            'counts': list(counts),
+            'ticks': ticks,
+            'repeats': repeats,
+            'elapsed': time.perf_counter() - start,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.35) -> List[Dict]:
+    # Relative change of every row present in both runs; positive `change` is better
+    old = {row_key(result): result for result in baseline['results']}
+    changes = []
+    for result in current['results']:
+        before = old.get(row_key(result))
+        if before is None or not before['value']:
+            continue
+        ratio = result['value'] / before['value'] - 1
+        change = ratio if result['better'] == 'higher' else -ratio
+        changes.append(dict(result, baseline=before['value'], change=change,
+                            regression=change < -threshold))
+    return changes
+
+
+def _describe(result: Dict) -> str:
+    params = ' '.join(f'{key}={value}' for key, value in sorted(result['params'].items()))
+    return f"{result['suite']}/{result['name']} {params}"
+
+
+def format_report(report: Dict) -> str:
+    lines = [f"commit {report['meta']['commit']}, {report['meta']['elapsed']:.1f} s"]
+    for result in report['results']:
+        lines.append(f"{_describe(result):<58}{result['value']:>14,.3f} {result['unit']}")
+    return "\n".join(lines)
+
+
+def format_comparison(changes: List[Dict], threshold: float) -> str:
+    lines = [f"{'':<58}{'baseline':>14}{'current':>14}{'change':>9}"]
+    for change in changes:
+        flag = '  REGRESSION' if change['regression'] else ''
+        lines.append(f"{_describe(change):<58}{change['baseline']:>14,.3f}"
+                     f"{change['value']:>14,.3f}{change['change']:>+9.1%}{flag}")
+    regressions = sum(change['regression'] for change in changes)
+    lines.append(f"{regressions} of {len(changes)} results worse by more than {threshold:.0%}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the simulation and optimizer hot paths and save the results "
+                    "as JSON for comparing commits")
+    parser.add_argument('--suite', action='append', choices=SUITES, default=None,
+                        help="run only this suite; repeatable (default: all)")
+    parser.add_argument('--counts', type=int, nargs='+', default=None,
+                        help=f"vehicle counts (default {' '.join(map(str, DEFAULT_COUNTS))})")
+    parser.add_argument('--ticks', type=int, default=100, help="ticks timed per measurement")
+    parser.add_argument('--repeats', type=int, default=3, help="best of this many runs")
+    parser.add_argument('--decisions', type=int, default=200,
+                        help="optimizer decisions timed per case")
+    parser.add_argument('--frames', type=int, default=20, help="frames timed per renderer case")
+    parser.add_argument('--quick', action='store_true',
+                        help=f"smoke run: counts {' '.join(map(str, QUICK_COUNTS))}, one repeat")
+    parser.add_argument('--out', default=None,
+                        help="JSON file to write (default benchmark_results/<commit>.json)")
+    parser.add_argument('--compare', default=None, metavar='BASELINE',
+                        help="JSON from an earlier run; exit 1 if anything regressed")
+    parser.add_argument('--threshold', type=float, default=0.35,
+                        help="relative change that counts as a regression (default 0.35; "
+                             "timings on a shared machine move 10-35%% between runs)")
+    args = parser.parse_args(argv)
+
+    counts = args.counts or (QUICK_COUNTS if args.quick else DEFAULT_COUNTS)
+    repeats = 1 if args.quick else args.repeats
+    report = run(args.suite or SUITES, counts, args.ticks, repeats, args.decisions, args.frames)
+    print(format_report(report))
+
+    out = args.out or os.path.join(HERE, 'benchmark_results',
+                                   f"{report['meta']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        changes = compare(baseline, report, args.threshold)
+        print(format_comparison(changes, args.threshold))
+        return 1 if any(change['regression'] for change in changes) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
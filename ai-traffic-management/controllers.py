@@ -0,0 +1,120 @@
+import math
+from typing import Dict, List
+
+from traffic_core import SignalOptimizer, SimulationConfig
+
+# Waiting counts are spread over the same window the flow rates are measured on
+DEMAND_WINDOW = 60
+
+
+class SignalController:
+    # Turns the optimizer state (waiting counts, flow rates, congestion) into green
+    # times locally. Subclasses only provide green_times; timing() clamps them to the
+    # configured bounds and builds the plan in the same shape the model backend returns.
+    def green_times(self, state: Dict) -> List[float]:
+        raise NotImplementedError
+
+    def timing(self, state: Dict) -> Dict:
+        green_times = [
+            int(round(min(max(green, SimulationConfig.DEFAULT_MIN), SimulationConfig.DEFAULT_MAX)))
+            for green in self.green_times(state)
+        ]
+        return {
+            'green_times': green_times,
+            'cycle_length': sum(green_times) +
+                            SimulationConfig.NUM_SIGNALS * SimulationConfig.DEFAULT_YELLOW
+        }
+
+
+def demand(state: Dict) -> List[float]:
+    # Vehicles per tick that want to use each approach: what got through recently
+    # plus the queue that is still waiting
+    return [flow + waiting / DEMAND_WINDOW
+            for flow, waiting in zip(state['flow_rates'], state['waiting_vehicles'])]
+
+
+class FixedController(SignalController):
+    def green_times(self, state: Dict) -> List[float]:
+        return [SimulationConfig.DEFAULT_GREEN] * SimulationConfig.NUM_SIGNALS
+
+
+class WebsterController(SignalController):
+    # Webster's optimum cycle C0 = (1.5 L + 5) / (1 - Y), with the effective green
+    # split in proportion to each approach's flow ratio y = q / s
+    def __init__(self, saturation_flow: float = 0.5, max_flow_ratio: float = 0.9):
+        self.saturation_flow = saturation_flow  # vehicles per tick an approach discharges
+        self.max_flow_ratio = max_flow_ratio
+
+    def green_times(self, state: Dict) -> List[float]:
+        ratios = [q / self.saturation_flow for q in demand(state)]
+        total = sum(ratios)
+        lost_time = SimulationConfig.NUM_SIGNALS * SimulationConfig.DEFAULT_YELLOW
+        cycle = (1.5 * lost_time + 5) / (1 - min(total, self.max_flow_ratio))
+        effective_green = cycle - lost_time
+        if total == 0:
+            return [effective_green / SimulationConfig.NUM_SIGNALS] * SimulationConfig.NUM_SIGNALS
+        return [effective_green * ratio / total for ratio in ratios]
+
+
+class MaxPressureController(SignalController):
+    # Serves the approach with the largest pressure (queue upstream minus queue
+    # downstream) for the longest allowed green and the others for the minimum.
+    # A single intersection has no downstream queues unless the state provides them.
+    def green_times(self, state: Dict) -> List[float]:
+        downstream = state.get('downstream', [0] * SimulationConfig.NUM_SIGNALS)
+        pressure = [waiting - queued for waiting, queued in zip(state['waiting_vehicles'], downstream)]
+        if max(pressure) <= 0:
+            return [SimulationConfig.DEFAULT_GREEN] * SimulationConfig.NUM_SIGNALS
+        winner = pressure.index(max(pressure))
+        return [SimulationConfig.DEFAULT_MAX if index == winner else SimulationConfig.DEFAULT_MIN
+                for index in range(SimulationConfig.NUM_SIGNALS)]
+
+
+class ActuatedController(SignalController):
+    # Gap-out actuation from the counters: each green runs its minimum, then long
+    # enough to discharge the queue, and keeps being extended up to the maximum while
+    # vehicles arrive closer together than the unit extension
+    def __init__(self, unit_extension: float = 3.0, saturation_flow: float = 0.5):
+        self.unit_extension = unit_extension
+        self.saturation_flow = saturation_flow
+
+    def green_times(self, state: Dict) -> List[float]:
+        green_times = []
+        for waiting, flow in zip(state['waiting_vehicles'], state['flow_rates']):
+            if flow * self.unit_extension >= 1:
+                green_times.append(SimulationConfig.DEFAULT_MAX)
+            else:
+                green_times.append(SimulationConfig.DEFAULT_MIN +
+                                   math.ceil(waiting / self.saturation_flow))
+        return green_times
+
+
+class PlanController(SignalController):
+    # Always answers with the same plan; used to hold a candidate fixed during a rollout
+    def __init__(self, green_times: List[float]):
+        self.plan = list(green_times)
+
+    def green_times(self, state: Dict) -> List[float]:
+        return self.plan
+
+
+CONTROLLERS = {
+    'fixed': FixedController,
+    'webster': WebsterController,
+    'max-pressure': MaxPressureController,
+    'actuated': ActuatedController,
+}
+
+
+class LocalOptimizer(SignalOptimizer):
+    # Drop-in for AITrafficOptimizer that asks a local controller instead of the model
+    def __init__(self, controller: SignalController):
+        super().__init__()
+        self.controller = controller
+
+    async def get_optimal_timing(self, current_state: Dict) -> Dict:
+        return self.controller.timing(current_state)
+
+
+def create_local_optimizer(name: str) -> LocalOptimizer:
+    return LocalOptimizer(CONTROLLERS[name]())
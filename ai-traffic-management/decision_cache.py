@@ -0,0 +1,76 @@
+import copy
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+
+class DecisionCache:
+    # Timing plans keyed on a coarse version of the traffic state, so states that
+    # differ by a vehicle or two reuse the last answer instead of asking the model
+    # again. Least recently used entries are evicted first, and entries older than
+    # `ttl` seconds are treated as missing.
+    def __init__(self, max_entries: int = 256, ttl: float = 60.0, waiting_step: int = 2,
+                 congestion_step: float = 0.2, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.waiting_step = waiting_step
+        self.congestion_step = congestion_step
+        self.clock = clock
+        self._entries: OrderedDict = OrderedDict()  # key -> (stored_at, timing)
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def key(self, state: Dict) -> Hashable:
+        # Flow rates are left out: they trail the waiting counts and would split
+        # otherwise identical states into many keys
+        return (
+            tuple(count // self.waiting_step for count in state['waiting_vehicles']),
+            tuple(round(level / self.congestion_step) for level in state['congestion']),
+            state['time_of_day'],
+        )
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, timing = entry
+        if self.clock() - stored_at > self.ttl:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Callers may adjust the plan they get back; the cached one stays intact
+        return copy.deepcopy(timing)
+
+    def put(self, key: Hashable, timing: Dict) -> None:
+        self._entries[key] = (self.clock(), copy.deepcopy(timing))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'expirations': self.expirations,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate,
+        }
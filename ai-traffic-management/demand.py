@@ -0,0 +1,258 @@
+import csv
+import os
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Approach order used by the model's counters and snapshots
+APPROACHES = ('right', 'down', 'left', 'up')
+LANES_PER_APPROACH = 3
+TURN_PROBABILITY = 0.4  # as in the per-tick generator
+LANE_QUEUE_LIMIT = 200  # arrivals one lane's entry queue holds before turning them away
+
+
+class DemandProfile:
+    # Vehicles per hour arriving on each approach for each hour of the day, read
+    # from a CSV with an `hour` column and one column per approach:
+    #
+    #   hour,right,down,left,up
+    #   0,60,40,60,40
+    #   7,900,450,850,400
+    #
+    # An hour that isn't listed keeps the rates of the listed hour before it.
+    def __init__(self, rates: np.ndarray, name: str = 'custom'):
+        rates = np.asarray(rates, dtype=np.float64)
+        if rates.shape != (24, len(APPROACHES)):
+            raise ValueError(f"demand rates must be 24 hours x {len(APPROACHES)} approaches, "
+                             f"got {rates.shape}")
+        if (rates < 0).any():
+            raise ValueError("demand rates can't be negative")
+        self.rates = rates
+        self.name = name
+
+    @classmethod
+    def constant(cls, vehicles_per_hour: float) -> 'DemandProfile':
+        # The same rate on every approach all day
+        return cls(np.full((24, len(APPROACHES)), float(vehicles_per_hour)),
+                   name=f'constant-{vehicles_per_hour:g}')
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'DemandProfile':
+        listed: Dict[int, List[float]] = {}
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            missing = {'hour', *APPROACHES} - set(reader.fieldnames or ())
+            if missing:
+                raise ValueError(f"{path}: missing column(s) {', '.join(sorted(missing))}")
+            for row in reader:
+                try:
+                    hour = int(row['hour'])
+                    rates = [float(row[approach]) for approach in APPROACHES]
+                except (TypeError, ValueError):
+                    raise ValueError(f"{path}, line {reader.line_num}: expected an hour and "
+                                     f"a vehicles-per-hour rate for each approach") from None
+                if not 0 <= hour < 24:
+                    raise ValueError(f"{path}, line {reader.line_num}: hour {hour} is not in 0-23")
+                listed[hour] = rates
+        if not listed:
+            raise ValueError(f"{path} has no demand rows")
+        rates = np.empty((24, len(APPROACHES)))
+        current = listed[max(listed)]  # hours before the first row wrap round from the last
+        for hour in range(24):
+            current = listed.get(hour, current)
+            rates[hour] = current
+        return cls(rates, name=os.path.splitext(os.path.basename(path))[0])
+
+    def to_csv(self, path: str) -> None:
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['hour', *APPROACHES])
+            for hour, rates in enumerate(self.rates.tolist()):
+                writer.writerow([hour, *(f'{rate:g}' for rate in rates)])
+
+
+class ArrivalSchedule:
+    # Poisson arrivals for every lane, drawn in bulk: one `poisson` call samples the
+    # arrival counts of all lanes for a block of ticks, and the vehicle types and turns
+    # of those arrivals are drawn alongside as arrays. Each tick the simulation takes
+    # its arrivals by index, so nothing is drawn per tick. Arrivals that can't enter
+    # yet (spawn point occupied, vehicle cap reached) wait in a per-lane entry queue
+    # rather than being lost, which is what keeps peaks at full volume. A queue holds
+    # at most `lane_queue_limit` arrivals; past that, demand the intersection can never
+    # serve would only grow memory, so further arrivals are dropped and counted.
+    def __init__(self, profile: DemandProfile, vehicle_types: Sequence[str],
+                 seed: Optional[int] = None, seconds_per_tick: float = 1.0,
+                 start_hour: float = 0.0, approaches: Sequence[str] = APPROACHES,
+                 block: int = 3600, lane_queue_limit: int = LANE_QUEUE_LIMIT):
+        self.profile = profile
+        self.vehicle_types = list(vehicle_types)
+        self.seconds_per_tick = seconds_per_tick
+        self.start_hour = start_hour
+        self.approaches = tuple(approaches)  # others get no arrivals (network interiors)
+        self.block = block
+        self.lane_queue_limit = lane_queue_limit
+        # Expected arrivals per tick for each hour and lane, approaches split evenly
+        # across their lanes
+        mask = np.array([approach in self.approaches for approach in APPROACHES])
+        self.hourly_rates = np.repeat(profile.rates * mask, LANES_PER_APPROACH, axis=1) * (
+            seconds_per_tick / 3600 / LANES_PER_APPROACH)
+        self.rng = np.random.default_rng(seed)
+        # Sampled arrivals in tick order; lane is approach * LANES_PER_APPROACH + lane
+        self.ticks = np.empty(0, dtype=np.int64)
+        self.lanes = np.empty(0, dtype=np.int8)
+        self.types = np.empty(0, dtype=np.uint8)
+        self.turns = np.empty(0, dtype=bool)
+        self.cursor = 0  # first arrival not yet handed out
+        self.sampled_until = 0  # first tick not sampled yet
+        self.tick = -1  # last tick handed out
+        self.queues: List[deque] = [deque() for _ in range(len(APPROACHES) * LANES_PER_APPROACH)]
+        self.queued = 0
+        self.max_queued = 0
+        self.arrived = 0
+        self.admitted = 0
+        self.dropped = 0  # arrivals turned away because their entry queue was full
+
+    def hour(self, tick: int) -> int:
+        return int(self.start_hour + tick * self.seconds_per_tick / 3600) % 24
+
+    def lane_rates(self, ticks: np.ndarray) -> np.ndarray:
+        # Expected arrivals per tick, shape (len(ticks), lanes)
+        hours = (self.start_hour + ticks * (self.seconds_per_tick / 3600)).astype(np.int64) % 24
+        return self.hourly_rates[hours]
+
+    def _sample(self) -> None:
+        start = self.sampled_until
+        ticks = np.arange(start, start + self.block)
+        counts = self.rng.poisson(self.lane_rates(ticks))
+        tick_index, lane = np.nonzero(counts)  # row-major, so in tick order
+        repeats = counts[tick_index, lane]
+        arrivals = int(repeats.sum())
+        # Arrivals of the previous block that haven't been handed out stay in front
+        rest = slice(self.cursor, None)
+        self.ticks = np.concatenate([self.ticks[rest], np.repeat(ticks[tick_index], repeats)])
+        self.lanes = np.concatenate([self.lanes[rest], np.repeat(lane, repeats).astype(np.int8)])
+        self.types = np.concatenate([self.types[rest], self.rng.integers(
+            0, len(self.vehicle_types), arrivals, dtype=np.uint8)])
+        self.turns = np.concatenate([self.turns[rest], self.rng.random(arrivals) < TURN_PROBABILITY])
+        self.cursor = 0
+        self.sampled_until = start + self.block
+
+    def arrive(self, tick: int) -> int:
+        # Queues every arrival up to and including `tick`; returns how many there were
+        while self.sampled_until <= tick:
+            self._sample()
+        self.tick = tick
+        start = self.cursor
+        end = int(np.searchsorted(self.ticks, tick, side='right'))
+        if end == start:
+            return 0
+        dropped = 0
+        for lane, type_code, turn in zip(self.lanes[start:end].tolist(),
+                                         self.types[start:end].tolist(),
+                                         self.turns[start:end].tolist()):
+            if len(self.queues[lane]) >= self.lane_queue_limit:
+                dropped += 1
+                continue
+            self.queues[lane].append((type_code, turn))
+        self.cursor = end
+        self.arrived += end - start
+        self.dropped += dropped
+        self.queued += end - start - dropped
+        self.max_queued = max(self.max_queued, self.queued)
+        return end - start
+
+    def waiting(self):
+        # (lane id, approach, lane, vehicle type, will turn) for the head of each entry queue
+        for lane_id, queue in enumerate(self.queues):
+            if queue:
+                type_code, turn = queue[0]
+                yield (lane_id, APPROACHES[lane_id // LANES_PER_APPROACH],
+                       lane_id % LANES_PER_APPROACH, self.vehicle_types[type_code], turn)
+
+    def admit(self, lane_id: int) -> None:
+        self.queues[lane_id].popleft()
+        self.queued -= 1
+        self.admitted += 1
+
+    def next_tick(self) -> Optional[int]:
+        # Tick of the next arrival not handed out yet, for engines that jump between
+        # events; None when the profile never sends anything
+        if not self.hourly_rates.any():
+            return None
+        while self.cursor >= len(self.ticks):
+            self._sample()
+        return int(self.ticks[self.cursor])
+
+    def reseed(self, seed: int) -> None:
+        # Drop what was sampled ahead and draw the future again from a new stream;
+        # the entry queues are the present and stay
+        self.rng = np.random.default_rng(seed)
+        self.ticks = self.ticks[:0]
+        self.lanes = self.lanes[:0]
+        self.types = self.types[:0]
+        self.turns = self.turns[:0]
+        self.cursor = 0
+        self.sampled_until = self.tick + 1
+
+    def summary(self) -> Dict:
+        return {
+            'arrivals': self.arrived,
+            'entry_queue': self.queued,
+            'max_entry_queue': self.max_queued,
+            'dropped_arrivals': self.dropped,
+        }
+
+    def get_state(self) -> Tuple[Dict, Dict[str, np.ndarray]]:
+        rest = slice(self.cursor, None)
+        queued = [(lane_id, type_code, turn) for lane_id, queue in enumerate(self.queues)
+                  for type_code, turn in queue]
+        header = {
+            'name': self.profile.name,
+            'vehicle_types': self.vehicle_types,
+            'seconds_per_tick': self.seconds_per_tick,
+            'start_hour': self.start_hour,
+            'approaches': list(self.approaches),
+            'block': self.block,
+            'lane_queue_limit': self.lane_queue_limit,
+            'rng': self.rng.bit_generator.state,
+            'sampled_until': self.sampled_until,
+            'tick': self.tick,
+            'counts': [self.max_queued, self.arrived, self.admitted, self.dropped],
+        }
+        arrays = {
+            'rates': self.profile.rates,
+            'ticks': self.ticks[rest],
+            'lanes': self.lanes[rest],
+            'types': self.types[rest],
+            'turns': self.turns[rest],
+            'queued': np.array(queued, dtype=np.int64).reshape(-1, 3),
+        }
+        return header, arrays
+
+    def copy(self, seed: Optional[int] = None) -> 'ArrivalSchedule':
+        schedule = ArrivalSchedule.from_state(*self.get_state())
+        if seed is not None:
+            schedule.reseed(seed)
+        return schedule
+
+    @classmethod
+    def from_state(cls, header: Dict, arrays: Dict[str, np.ndarray]) -> 'ArrivalSchedule':
+        schedule = cls(DemandProfile(arrays['rates'], header['name']), header['vehicle_types'],
+                       seconds_per_tick=header['seconds_per_tick'],
+                       start_hour=header['start_hour'], approaches=header['approaches'],
+                       block=header['block'],
+                       lane_queue_limit=header.get('lane_queue_limit', LANE_QUEUE_LIMIT))
+        schedule.rng.bit_generator.state = header['rng']
+        schedule.ticks = np.array(arrays['ticks'], dtype=np.int64)
+        schedule.lanes = np.array(arrays['lanes'], dtype=np.int8)
+        schedule.types = np.array(arrays['types'], dtype=np.uint8)
+        schedule.turns = np.array(arrays['turns'], dtype=bool)
+        schedule.sampled_until = header['sampled_until']
+        schedule.tick = header['tick']
+        schedule.max_queued, schedule.arrived, schedule.admitted = header['counts'][:3]
+        schedule.dropped = header['counts'][3] if len(header['counts']) > 3 else 0
+        for lane_id, type_code, turn in arrays['queued'].tolist():
+            schedule.queues[lane_id].append((type_code, bool(turn)))
+        schedule.queued = len(arrays['queued'])
+        return schedule
@@ -0,0 +1,128 @@
+import argparse
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from headless import ENGINES, OPTIMIZERS, create_simulation, run_simulation
+
+METRICS = ['total_vehicles', 'average_wait_time', 'wait_time_p95', 'throughput',
+           'exit_rate', 'mean_vehicles', 'mean_crossing_wait', 'ticks_per_second']
+
+
+def replication_seeds(seed: int, replications: int) -> List[int]:
+    # Spawned child sequences give statistically independent streams per replication
+    children = np.random.SeedSequence(seed).spawn(replications)
+    return [int.from_bytes(child.generate_state(4).tobytes(), 'little') for child in children]
+
+
+def run_replication(task: tuple) -> Dict:
+    engine, optimizer, ticks, seed, max_vehicles = task
+    simulation = create_simulation(engine, optimizer, max_vehicles, seed)
+    result = run_simulation(simulation, ticks)
+    return dict(result.summary, ticks_per_second=result.ticks_per_second, seed=seed)
+
+
+def summarize_distribution(values: List[float]) -> Dict:
+    data = np.asarray(values, dtype=float)
+    std = float(data.std(ddof=1)) if data.size > 1 else 0.0
+    half_width = 1.96 * std / math.sqrt(data.size)
+    p5, p50, p95 = np.percentile(data, [5, 50, 95])
+    return {
+        'mean': float(data.mean()),
+        'std': std,
+        'min': float(data.min()),
+        'max': float(data.max()),
+        'p5': float(p5),
+        'p50': float(p50),
+        'p95': float(p95),
+        'ci95': (float(data.mean()) - half_width, float(data.mean()) + half_width),
+    }
+
+
+@dataclass
+class EnsembleResult:
+    replications: List[Dict]
+    distributions: Dict
+    elapsed: float
+    workers: int
+
+    def to_dict(self) -> Dict:
+        return {
+            'replications': len(self.replications),
+            'workers': self.workers,
+            'elapsed': self.elapsed,
+            'distributions': self.distributions,
+        }
+
+
+def run_ensemble(replications: int, ticks: int, engine: str = 'object', seed: int = 0,
+                 workers: Optional[int] = None,
+                 max_vehicles: Optional[int] = None,
+                 optimizer: str = 'fixed') -> EnsembleResult:
+    workers = workers or os.cpu_count() or 1
+    tasks = [(engine, optimizer, ticks, replication_seed, max_vehicles)
+             for replication_seed in replication_seeds(seed, replications)]
+
+    start = time.perf_counter()
+    if workers == 1:
+        results = [run_replication(task) for task in tasks]
+    else:
+        # Replications only send back a small summary dict, and a few tasks per
+        # chunk keeps scheduling overhead low while still balancing the load
+        chunksize = max(1, replications // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_replication, tasks, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    distributions = {
+        metric: summarize_distribution([result[metric] for result in results])
+        for metric in METRICS
+    }
+    return EnsembleResult(results, distributions, elapsed, workers)
+
+
+def format_report(result: EnsembleResult) -> str:
+    lines = [
+        f"Replications: {len(result.replications)} on {result.workers} workers "
+        f"in {result.elapsed:.2f} s",
+        f"{'metric':<20}{'mean':>12}{'95% CI':>26}{'p5':>12}{'p95':>12}",
+    ]
+    for metric, summary in result.distributions.items():
+        low, high = summary['ci95']
+        lines.append(
+            f"{metric:<20}{summary['mean']:>12.4f}{f'[{low:.4f}, {high:.4f}]':>26}"
+            f"{summary['p5']:>12.4f}{summary['p95']:>12.4f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> EnsembleResult:
+    parser = argparse.ArgumentParser(description="Run seeded Monte Carlo replications in parallel")
+    parser.add_argument('--replications', type=int, default=100)
+    parser.add_argument('--ticks', type=int, default=3600)
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='object')
+    parser.add_argument('--optimizer', choices=sorted(OPTIMIZERS), default='fixed')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('--max-vehicles', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    args = parser.parse_args(argv)
+
+    result = run_ensemble(args.replications, args.ticks, args.engine, args.seed,
+                          args.workers, args.max_vehicles, args.optimizer)
+    if args.json:
+        print(json.dumps(result.to_dict(), indent=2))
+    else:
+        print(format_report(result))
+    return result
+
+
+if __name__ == "__main__":
+    main()
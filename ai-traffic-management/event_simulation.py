@@ -0,0 +1,358 @@
+import heapq
+import math
+from typing import Dict, List, Optional
+
+from traffic_core import AITrafficOptimizer, TrafficSimulation, Vehicle, VEHICLE_CONFIGS
+from demand import DemandProfile
+
+# Event kinds in the order the tick engine handles them within one tick
+WEATHER, EMERGENCY, SIGNAL, RELEASE, EXIT, ARRIVAL = range(6)
+
+DIRECTION_NUMBERS = {'right': 0, 'down': 1, 'left': 2, 'up': 3}
+UNIT_VECTORS = {'right': (1, 0), 'down': (0, 1), 'left': (-1, 0), 'up': (0, -1)}
+
+
+def exit_distance(direction: str, position: tuple) -> float:
+    # Distance from a position to where a vehicle leaves the simulated area
+    x, y = position
+    return {
+        'right': 950 - x,
+        'left': x + 50,
+        'down': 650 - y,
+        'up': y + 50,
+    }[direction]
+
+
+class EventVehicle(Vehicle):
+    # A vehicle whose position and wait time are computed from the tick it was last
+    # anchored at, so nothing has to touch it on ticks where it just drives on
+    def __init__(self, lane: int, vehicle_type: str, direction: str, will_turn: bool,
+                 simulation: 'EventDrivenSimulation'):
+        self._simulation = simulation
+        self._origin = (0.0, 0.0)
+        self._base_wait = 0
+        self._added_tick = simulation._motion_tick
+        self.anchor_tick: Optional[int] = None
+        self.progress = 0.0
+        self.velocity = 0.0
+        self.version = 0
+        super().__init__(lane, vehicle_type, direction, will_turn)
+
+    @classmethod
+    def from_vehicle(cls, vehicle: Vehicle,
+                     simulation: 'EventDrivenSimulation') -> 'EventVehicle':
+        event_vehicle = cls(vehicle.lane, vehicle.type, vehicle.direction, vehicle.will_turn,
+                            simulation)
+        event_vehicle.position = vehicle.position
+        event_vehicle.speed = vehicle.speed
+        event_vehicle.creation_time = vehicle.creation_time
+        event_vehicle.wait_time = vehicle.wait_time
+        event_vehicle.crossed = vehicle.crossed
+        event_vehicle.priority = vehicle.priority
+        event_vehicle.turned = vehicle.turned
+        return event_vehicle
+
+    @property
+    def position(self) -> tuple:
+        if self.anchor_tick is None:
+            return self._origin
+        moves = self._simulation._motion_tick - self.anchor_tick + 1
+        distance = self.progress + max(moves, 0) * self.velocity
+        dx, dy = UNIT_VECTORS[self.direction]
+        return (self._origin[0] + dx * distance, self._origin[1] + dy * distance)
+
+    @position.setter
+    def position(self, value: tuple) -> None:
+        self._origin = value
+
+    @property
+    def wait_time(self) -> int:
+        if self.anchor_tick is not None:
+            return self._base_wait
+        return self._base_wait + max(self._simulation._motion_tick - self._added_tick, 0)
+
+    @wait_time.setter
+    def wait_time(self, value: int) -> None:
+        self._base_wait = value
+
+    def release(self, tick: int, speed_modifier: float) -> None:
+        self._base_wait += max(tick - 1 - self._added_tick, 0)
+        self.anchor_tick = tick
+        self.velocity = self.speed * speed_modifier
+        self.crossed = True
+
+    def resume(self, tick: int, speed_modifier: float) -> None:
+        # Already past the stop line (a restored vehicle): drive on from where it is
+        self.anchor_tick = tick
+        self.velocity = self.speed * speed_modifier
+
+    def reanchor(self, tick: int, speed_modifier: float) -> None:
+        self.progress += (tick - self.anchor_tick) * self.velocity
+        self.anchor_tick = tick
+        self.velocity = self.speed * speed_modifier
+        self.version += 1
+
+    def exit_tick(self) -> int:
+        # Last tick whose move takes the vehicle past the edge
+        remaining = exit_distance(self.direction, self._origin) - self.progress
+        return self.anchor_tick + math.floor(remaining / self.velocity)
+
+
+class EventDrivenSimulation(TrafficSimulation):
+    # Same model as TrafficSimulation, but time jumps from one event to the next
+    # instead of visiting every tick. Events are arrivals, weather changes, emergency
+    # spawns, signal phase boundaries, vehicles reaching the stop line and exits.
+    #
+    # Between events nothing observable changes: moving vehicles travel in a straight
+    # line at constant speed, and a vehicle only waits at the stop line while the
+    # signal holds it. Spawning needs a clear gap behind the newest vehicle in the
+    # lane, so a lane never holds more than one waiting vehicle and the gap to a
+    # leader never stops a vehicle. The per-tick Bernoulli draws are replaced by
+    # geometric gaps between successes, which gives the same distributions from far
+    # fewer draws, so runs match the tick engine statistically rather than draw for
+    # draw. The optimizer is asked for timing at phase boundaries only, and
+    # stats['waiting_times'] and stats['throughput'] are sampled on event ticks;
+    # self.trips holds the KPIs to compare against the tick engines.
+    def __init__(self, ai_optimizer: Optional[AITrafficOptimizer] = None,
+                 seed: Optional[int] = None):
+        self._motion_tick = -1  # last tick whose vehicle movement has been applied
+        super().__init__(ai_optimizer, seed)
+        self._events = []
+        self._sequence = 0
+        self._held: Dict[str, List[EventVehicle]] = {
+            direction: [] for direction in DIRECTION_NUMBERS
+        }
+        self._moving: Dict[EventVehicle, None] = {}  # dict as ordered set
+        self._speed_modifier = self.weather.get_speed_modifier()
+        self._last_emergency_draw = 0
+        self._arrivals_version = 0  # bumped when set_demand() voids the pending arrival
+        self._handlers = {
+            WEATHER: self._on_weather,
+            EMERGENCY: self._on_emergency,
+            SIGNAL: self._on_signal,
+            RELEASE: self._on_release,
+            EXIT: self._on_exit,
+            ARRIVAL: self._on_arrival,
+        }
+        self._schedule(self.weather.update_interval - 1 - self.weather.last_update, WEATHER)
+        self._schedule_emergency(self.emergency_handler.emergency_cooldown + 1)
+        self._schedule(0, SIGNAL)
+        self._schedule(self._geometric(self.config.SPAWN_PROBABILITY), ARRIVAL,
+                       self._arrivals_version)
+
+    def _schedule(self, tick: int, kind: int, payload=None) -> None:
+        heapq.heappush(self._events, (tick, kind, self._sequence, payload))
+        self._sequence += 1
+
+    def _geometric(self, probability: float) -> int:
+        # Failed draws before the first success of a per-tick Bernoulli trial
+        return int(math.log(1.0 - self.rng.random()) / math.log(1.0 - probability))
+
+    def _schedule_emergency(self, eligible: int) -> None:
+        self._schedule(eligible + self._geometric(self.emergency_handler.emergency_probability),
+                       EMERGENCY)
+
+    async def update(self):
+        await self.run_until(self.time_elapsed + 1)
+
+    async def run_until(self, tick: int) -> None:
+        while True:
+            # Superseded events don't make a tick worth visiting (or sampling stats on)
+            while self._is_stale(self._events[0]):
+                heapq.heappop(self._events)
+            if self._events[0][0] >= tick:
+                break
+            await self._process_tick(self._events[0][0])
+        self._skip_to(tick)
+
+    def _is_stale(self, event: tuple) -> bool:
+        _, kind, _, payload = event
+        if kind == EXIT:
+            return payload[0].version != payload[1]
+        return kind == ARRIVAL and payload != self._arrivals_version
+
+    def _skip_to(self, tick: int) -> None:
+        idle = tick - self.time_elapsed
+        if idle > 0:
+            self.counters.advance(idle)
+            self.trips.record_ticks(len(self.vehicles), idle)
+            self.time_elapsed = tick
+            self._motion_tick = tick - 1
+        # Keep the tick-engine counters in step so snapshots stay meaningful
+        self.weather.last_update = self.time_elapsed % self.weather.update_interval
+        self.emergency_handler.last_emergency = self.time_elapsed - self._last_emergency_draw
+
+    async def _process_tick(self, tick: int) -> None:
+        self._skip_to(tick)
+        while self._events and self._events[0][0] == tick:
+            _, kind, _, payload = heapq.heappop(self._events)
+            if kind >= RELEASE:
+                self._motion_tick = tick
+            result = self._handlers[kind](payload)
+            if result is not None:
+                await result
+        self._motion_tick = tick
+        self._update_stats()
+        self.counters.advance()
+        self.trips.record_ticks(len(self.vehicles))
+        self.time_elapsed = tick + 1
+
+    def _on_weather(self, payload) -> None:
+        self.weather.update()
+        self._speed_modifier = self.weather.get_speed_modifier()
+        for vehicle in self._moving:
+            vehicle.reanchor(self.time_elapsed, self._speed_modifier)
+            self._schedule(vehicle.exit_tick(), EXIT, (vehicle, vehicle.version))
+        self._schedule(self.time_elapsed + self.weather.update_interval, WEATHER)
+
+    def _on_emergency(self, payload) -> None:
+        handler = self.emergency_handler
+        self._last_emergency_draw = self.time_elapsed
+        handler._spawn_emergency_vehicle(self)
+        if not handler.active_emergency:
+            self._schedule_emergency(self.time_elapsed + handler.emergency_cooldown + 1)
+
+    async def _on_signal(self, payload) -> None:
+        timing = await self.ai_optimizer.get_optimal_timing(self._get_current_state())
+        self._apply_signal_timing(timing)
+        for direction, held in self._held.items():
+            if held and self._signal_allows(direction):
+                for vehicle in held:
+                    self._release(vehicle)
+                held.clear()
+        self._schedule(self.phase_end, SIGNAL)
+
+    def _signal_allows(self, direction: str) -> bool:
+        return not self.current_yellow and self.current_green == DIRECTION_NUMBERS[direction]
+
+    def _on_release(self, vehicle: EventVehicle) -> None:
+        if vehicle.priority or self._signal_allows(vehicle.direction):
+            self._release(vehicle)
+        else:
+            self._held[vehicle.direction].append(vehicle)
+
+    def _release(self, vehicle: EventVehicle) -> None:
+        # The first move already takes a vehicle more than 50 px from the stop line,
+        # so it crosses on the tick it starts moving
+        vehicle.release(self.time_elapsed, self._speed_modifier)
+        self.lane_index.mark_crossed(vehicle)
+        self.counters.crossed(vehicle.direction)
+        self.trips.record_crossing(vehicle.wait_time)
+        self._moving[vehicle] = None
+        self._schedule(vehicle.exit_tick(), EXIT, (vehicle, vehicle.version))
+
+    def _on_exit(self, payload) -> None:
+        vehicle, version = payload
+        if vehicle.version != version:
+            return  # rescheduled by a weather change
+        self._moving.pop(vehicle, None)
+        self.vehicles.remove(vehicle)
+        self.lane_index.remove(vehicle)
+        self.counters.removed(vehicle.direction, vehicle.crossed)
+        self.trips.record_exit()
+        self._on_vehicle_exit(vehicle)
+        if vehicle.type == 'emergency' and self.emergency_handler.active_emergency:
+            # The handler notices the empty road on the next tick and may draw the one after
+            self.emergency_handler.active_emergency = False
+            self._schedule_emergency(max(
+                self._last_emergency_draw + self.emergency_handler.emergency_cooldown + 1,
+                self.time_elapsed + 2))
+
+    def set_demand(self, profile: Optional[DemandProfile], seed: Optional[int] = None,
+                   seconds_per_tick: float = 1.0, start_hour: float = 0.0) -> None:
+        super().set_demand(profile, seed, seconds_per_tick, start_hour)
+        self._arrivals_version += 1
+        if self.demand is None:
+            self._schedule(self.time_elapsed + self._geometric(self.config.SPAWN_PROBABILITY),
+                           ARRIVAL, self._arrivals_version)
+        else:
+            self._schedule_demand()
+
+    def _schedule_demand(self) -> None:
+        # The next scheduled arrival, or the next tick while an entry queue is waiting
+        tick = self.demand.next_tick()
+        if self.demand.queued:
+            tick = self.time_elapsed + 1 if tick is None else min(tick, self.time_elapsed + 1)
+        if tick is not None:
+            self._schedule(tick, ARRIVAL, self._arrivals_version)
+
+    def _on_arrival(self, version) -> None:
+        if version != self._arrivals_version:
+            return  # superseded by set_demand()
+        if self.demand is not None:
+            self._admit_arrivals()
+            self._schedule_demand()
+            return
+        if len(self.vehicles) < self.config.MAX_VEHICLES:
+            vehicle_type = self.rng.choice(list(VEHICLE_CONFIGS['speeds'].keys()))
+            direction = self.rng.choice(['right', 'down', 'left', 'up'])
+            lane = self.rng.randint(0, 2)
+            will_turn = self.rng.random() < 0.4
+
+            new_vehicle = Vehicle(lane, vehicle_type, direction, will_turn)
+            if direction in self.entry_directions and self._is_safe_to_spawn(new_vehicle):
+                self._add_vehicle(new_vehicle)
+        self._schedule(self.time_elapsed + 1 + self._geometric(self.config.SPAWN_PROBABILITY),
+                       ARRIVAL, version)
+
+    def _add_vehicle(self, vehicle: Vehicle):
+        # Vehicles added before this tick's movement (emergency spawns) try to move
+        # on this tick, those added after it on the next
+        if not isinstance(vehicle, EventVehicle):
+            vehicle = EventVehicle.from_vehicle(vehicle, self)
+        super()._add_vehicle(vehicle)
+        if vehicle.crossed:
+            vehicle.resume(self._motion_tick + 1, self._speed_modifier)
+            self._moving[vehicle] = None
+            self._schedule(vehicle.exit_tick(), EXIT, (vehicle, vehicle.version))
+        else:
+            self._schedule(self._motion_tick + 1, RELEASE, vehicle)
+
+    def _load_vehicle_records(self, records, type_names: List[str]) -> None:
+        # The weather is restored by now; moving vehicles resume at its speed
+        self._speed_modifier = self.weather.get_speed_modifier()
+        super()._load_vehicle_records(records, type_names)
+
+    def _snapshot_state(self) -> tuple:
+        # The pending draws go with the snapshot so a restored copy continues exactly
+        header, arrays = super()._snapshot_state()
+        pending = {}
+        for tick, kind, _, payload in self._events:
+            if kind == ARRIVAL and payload != self._arrivals_version:
+                continue
+            if kind in (EMERGENCY, ARRIVAL):
+                pending[kind] = min(tick, pending.get(kind, tick))
+        header['events'] = {'emergency': pending.get(EMERGENCY), 'arrival': pending.get(ARRIVAL)}
+        return header, arrays
+
+    def _restore_state(self, header: Dict, arrays) -> None:
+        # The heap is rebuilt from the restored state: waiting vehicles are released
+        # on the next tick (held ones are simply held again), moving ones get their
+        # exit rescheduled, the signal changes at the restored phase end, and the
+        # emergency and arrival draws are taken from the snapshot or, for tick-engine
+        # snapshots, drawn afresh
+        self._events = []
+        self._held = {direction: [] for direction in DIRECTION_NUMBERS}
+        self._moving = {}
+        self._motion_tick = header['time_elapsed'] - 1
+        self._arrivals_version += 1
+        super()._restore_state(header, arrays)
+        self._last_emergency_draw = self.time_elapsed - self.emergency_handler.last_emergency
+        events = header.get('events') or {}
+        tick = self.time_elapsed
+        self._schedule(tick + self.weather.update_interval - 1 - self.weather.last_update,
+                       WEATHER)
+        self._schedule(max(self.phase_end, tick), SIGNAL)
+        if events.get('emergency') is not None:
+            self._schedule(events['emergency'], EMERGENCY)
+        elif 'events' not in header and not self.emergency_handler.active_emergency:
+            self._schedule_emergency(max(
+                self._last_emergency_draw + self.emergency_handler.emergency_cooldown + 1, tick))
+        if events.get('arrival') is not None:
+            self._schedule(events['arrival'], ARRIVAL, self._arrivals_version)
+        elif 'events' not in header:
+            if self.demand is not None:
+                self._schedule_demand()
+            else:
+                self._schedule(tick + self._geometric(self.config.SPAWN_PROBABILITY), ARRIVAL,
+                               self._arrivals_version)
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import functools
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from traffic_core import AITrafficOptimizer, SignalOptimizer, SimulationConfig, TrafficSimulation
+from vectorized_simulation import VectorizedTrafficSimulation
+from event_simulation import EventDrivenSimulation
+from controllers import CONTROLLERS, LocalOptimizer, create_local_optimizer
+from policy_table import PolicyTable
+from mpc import ModelPredictiveOptimizer
+from optimizer_metrics import serve_metrics
+from trace_replay import TraceRecorder
+from demand import DemandProfile
+
+ENGINES = {
+    'object': TrafficSimulation,
+    'vectorized': VectorizedTrafficSimulation,
+    'event': EventDrivenSimulation,
+}
+
+
+class FixedTimingOptimizer(SignalOptimizer):
+    # Answers every request with the fallback plan, so no model backend is contacted
+    async def get_optimal_timing(self, current_state: Dict) -> Dict:
+        return self._get_fallback_timing()
+
+
+OPTIMIZERS = {
+    'fixed': FixedTimingOptimizer,
+    'ai': AITrafficOptimizer,
+}
+# Local controllers answer in microseconds and need no backend
+OPTIMIZERS.update({
+    name: functools.partial(create_local_optimizer, name)
+    for name in CONTROLLERS if name != 'fixed'
+})
+OPTIMIZERS['mpc'] = ModelPredictiveOptimizer
+
+
+@dataclass
+class BatchResult:
+    ticks: int
+    elapsed: float
+    stats: Dict
+    vehicles: int
+    summary: Dict = field(default_factory=dict)
+    optimizer_metrics: Dict = field(default_factory=dict)
+
+    @property
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.elapsed if self.elapsed > 0 else float('inf')
+
+    def to_dict(self) -> Dict:
+        return {
+            'ticks': self.ticks,
+            'elapsed': self.elapsed,
+            'ticks_per_second': self.ticks_per_second,
+            'vehicles': self.vehicles,
+            'summary': self.summary,
+            **({'optimizer_metrics': self.optimizer_metrics} if self.optimizer_metrics else {}),
+        }
+
+
+def summarize_stats(stats: Dict) -> Dict:
+    waiting_times = stats['waiting_times']
+    throughput = stats['throughput']
+    return {
+        'total_vehicles': stats['total_vehicles'],
+        'average_wait_time': waiting_times.mean,
+        'wait_time_std': waiting_times.std,
+        'wait_time_p50': waiting_times.percentile(50),
+        'wait_time_p95': waiting_times.percentile(95),
+        'wait_time_p99': waiting_times.percentile(99),
+        'throughput': throughput[-1] if throughput else 0.0,
+    }
+
+
+def create_simulation(engine: str = 'object', optimizer: str = 'fixed',
+                      max_vehicles: Optional[int] = None,
+                      seed: Optional[int] = None,
+                      spawn_probability: Optional[float] = None,
+                      policy_table: Optional[str] = None,
+                      demand: Optional[str] = None, seconds_per_tick: float = 1.0,
+                      start_hour: float = 0.0) -> TrafficSimulation:
+    # A policy table file replaces the named optimizer with table lookups
+    ai_optimizer = (LocalOptimizer(PolicyTable.load(policy_table)) if policy_table
+                    else OPTIMIZERS[optimizer]())
+    simulation = ENGINES[engine](ai_optimizer, seed=seed)
+    if hasattr(ai_optimizer, 'attach'):
+        # Optimizers that plan by simulating ahead need the simulation itself
+        ai_optimizer.attach(simulation)
+    if max_vehicles is not None:
+        simulation.config.MAX_VEHICLES = max_vehicles
+    if spawn_probability is not None:
+        simulation.config.SPAWN_PROBABILITY = spawn_probability
+    if demand is not None:
+        # A demand profile CSV replaces the constant spawn probability
+        simulation.set_demand(DemandProfile.from_csv(demand), seed,
+                              seconds_per_tick=seconds_per_tick, start_hour=start_hour)
+    return simulation
+
+
+async def run_simulation_async(simulation: TrafficSimulation, ticks: int,
+                               recorder: Optional[TraceRecorder] = None) -> BatchResult:
+    start = time.perf_counter()
+    if recorder is not None:
+        # A trace needs every tick, so even event-driven engines step one at a time
+        for _ in range(ticks):
+            await simulation.update()
+            recorder.record(simulation)
+    elif hasattr(simulation, 'run_until'):
+        # Event-driven engines jump over idle ticks instead of stepping through them
+        await simulation.run_until(simulation.time_elapsed + ticks)
+    else:
+        for _ in range(ticks):
+            await simulation.update()
+    elapsed = time.perf_counter() - start
+    return BatchResult(
+        ticks=ticks,
+        elapsed=elapsed,
+        stats=simulation.stats,
+        vehicles=len(simulation.vehicles),
+        summary=dict(summarize_stats(simulation.stats), **simulation.trips.summary(),
+                     **(simulation.demand.summary() if simulation.demand is not None else {})),
+        # Only optimizers that talk to the backend keep metrics
+        optimizer_metrics=(simulation.ai_optimizer.metrics_snapshot()
+                           if hasattr(simulation.ai_optimizer, 'metrics') else {}),
+    )
+
+
+def run_simulation(simulation: TrafficSimulation, ticks: int,
+                   recorder: Optional[TraceRecorder] = None) -> BatchResult:
+    return asyncio.run(run_simulation_async(simulation, ticks, recorder))
+
+
+def run_batch(ticks: int, engine: str = 'object', optimizer: str = 'fixed',
+              seed: Optional[int] = None, max_vehicles: Optional[int] = None,
+              spawn_probability: Optional[float] = None,
+              policy_table: Optional[str] = None,
+              metrics_port: Optional[int] = None,
+              trace: Optional[str] = None,
+              demand: Optional[str] = None, seconds_per_tick: float = 1.0,
+              start_hour: float = 0.0) -> BatchResult:
+    simulation = create_simulation(engine, optimizer, max_vehicles, seed, spawn_probability,
+                                   policy_table, demand, seconds_per_tick, start_hour)
+    server = None
+    if metrics_port is not None and hasattr(simulation.ai_optimizer, 'metrics'):
+        server = serve_metrics(simulation.ai_optimizer.metrics_snapshot, port=metrics_port)
+        print(f"Serving optimizer metrics on "
+              f"http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    recorder = None
+    if trace:
+        recorder = TraceRecorder(trace, {'engine': engine, 'optimizer': optimizer, 'seed': seed})
+    try:
+        return run_simulation(simulation, ticks, recorder)
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+def format_report(result: BatchResult) -> str:
+    lines = [
+        f"Ticks:             {result.ticks}",
+        f"Elapsed:           {result.elapsed:.3f} s",
+        f"Ticks/sec:         {result.ticks_per_second:,.0f}",
+        f"Vehicles on road:  {result.vehicles}",
+        f"Total vehicles:    {result.summary['total_vehicles']}",
+        f"Average wait time: {result.summary['average_wait_time']:.2f}",
+        f"Wait p50/p95/p99:  {result.summary['wait_time_p50']:.2f} / "
+        f"{result.summary['wait_time_p95']:.2f} / {result.summary['wait_time_p99']:.2f}",
+        f"Throughput:        {result.summary['throughput']:.4f}",
+        f"Exits per tick:    {result.summary['exit_rate']:.4f}",
+        f"Crossing wait:     {result.summary['mean_crossing_wait']:.2f}",
+    ]
+    if 'arrivals' in result.summary:
+        lines += [
+            f"Arrivals:          {result.summary['arrivals']}",
+            f"Entry queue:       {result.summary['entry_queue']} "
+            f"(max {result.summary['max_entry_queue']}, "
+            f"{result.summary['dropped_arrivals']} dropped)",
+        ]
+    if result.optimizer_metrics:
+        metrics = result.optimizer_metrics
+        backend = metrics['latency']['backend']
+        lines += [
+            f"Backend calls:     {backend['count']} "
+            f"(p50 {backend['p50']:.3f} s, p95 {backend['p95']:.3f} s)",
+            f"Fallback rate:     {metrics['rates']['fallback_rate']:.1%}",
+            f"Parse failures:    {metrics['rates']['parse_failure_rate']:.1%}",
+            f"Cache hit rate:    {metrics['cache']['hit_rate']:.1%}",
+        ]
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> BatchResult:
+    parser = argparse.ArgumentParser(description="Run the traffic simulation without a UI")
+    parser.add_argument('--ticks', type=int, default=SimulationConfig.SIM_TIME,
+                        help="number of simulation ticks to run")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='object')
+    parser.add_argument('--optimizer', choices=sorted(OPTIMIZERS), default='fixed',
+                        help="'ai' calls the model backend on every tick")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--max-vehicles', type=int, default=None)
+    parser.add_argument('--spawn-probability', type=float, default=None,
+                        help="chance of a new vehicle each tick (default 0.3)")
+    parser.add_argument('--policy-table', default=None,
+                        help="answer signal timing from a table written by policy_table.py")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="serve the 'ai' optimizer's metrics as text on this port while running")
+    parser.add_argument('--trace', default=None,
+                        help="record every tick to this trace directory (see trace_replay.py)")
+    parser.add_argument('--demand', default=None,
+                        help="CSV of vehicles per hour per approach for each hour of the day "
+                             "(see demand.py); replaces --spawn-probability")
+    parser.add_argument('--seconds-per-tick', type=float, default=1.0,
+                        help="simulated seconds per tick, for reading the demand profile")
+    parser.add_argument('--start-hour', type=float, default=0.0,
+                        help="time of day the demand profile starts at")
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    args = parser.parse_args(argv)
+
+    result = run_batch(args.ticks, args.engine, args.optimizer, args.seed, args.max_vehicles,
+                       args.spawn_probability, args.policy_table, args.metrics_port, args.trace,
+                       args.demand, args.seconds_per_tick, args.start_hour)
+    if args.json:
+        print(json.dumps(result.to_dict(), indent=2))
+    else:
+        print(format_report(result))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Sequence
+
+# What a worker process imports before it can run its first tick. None of these may
+# drag in the UI or LLM stacks; those belong to main.py and game.py and are imported
+# on first use everywhere else.
+WORKER_MODULES = ('traffic_core', 'headless', 'vectorized_simulation', 'event_simulation',
+                  'controllers', 'ensemble', 'tuner', 'policy_table', 'mpc', 'network')
+HEAVY_MODULES = ('streamlit', 'matplotlib', 'g4f', 'pygame')
+DEFAULT_BUDGET = 0.5  # seconds per module, median of fresh interpreters
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    seconds: List[float]
+    heavy: List[str]
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.seconds)
+
+    def to_dict(self) -> Dict:
+        return dict(asdict(self), median=self.median)
+
+
+def parse_importtime(stderr: str, module: str) -> tuple:
+    # `python -X importtime` writes "import time: self | cumulative | name" per module,
+    # indented by nesting depth; the unindented line for `module` is its whole cost
+    seconds = None
+    loaded = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        if not cumulative.strip().isdigit():
+            continue  # the column header
+        loaded.add(name.strip().split('.')[0])
+        if name.strip() == module and not name[1:].startswith(' '):
+            seconds = int(cumulative) / 1e6
+    return seconds, sorted(name for name in HEAVY_MODULES if name in loaded)
+
+
+def measure(module: str, repeats: int = 5) -> ImportTiming:
+    # A fresh interpreter each time: that is what a spawned worker pays
+    seconds: List[float] = []
+    heavy: List[str] = []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=HERE, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"importing {module} failed:\n{result.stderr.strip()[-2000:]}")
+        elapsed, heavy = parse_importtime(result.stderr, module)
+        seconds.append(elapsed)
+    return ImportTiming(module, seconds, heavy)
+
+
+def check(timings: Sequence[ImportTiming], budget: float = DEFAULT_BUDGET) -> List[str]:
+    problems = []
+    for timing in timings:
+        if timing.heavy:
+            problems.append(f"{timing.module} imports {', '.join(timing.heavy)}")
+        if timing.median > budget:
+            problems.append(f"{timing.module} takes {timing.median:.3f}s to import "
+                            f"(budget {budget:.3f}s)")
+    return problems
+
+
+def format_report(timings: Sequence[ImportTiming], budget: float) -> str:
+    lines = [f"{'module':<24}{'median (s)':>12}{'max (s)':>10}  heavy imports"]
+    for timing in timings:
+        lines.append(f"{timing.module:<24}{timing.median:>12.3f}{max(timing.seconds):>10.3f}  "
+                     f"{', '.join(timing.heavy) or '-'}")
+    lines.append(f"budget: {budget:.3f}s per module")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure how long worker modules take to import in a fresh interpreter "
+                    "and fail if any is over budget or pulls in the UI/LLM dependencies")
+    parser.add_argument('modules', nargs='*', default=list(WORKER_MODULES))
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help="seconds allowed per module (median)")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help="print the timings as JSON")
+    args = parser.parse_args(argv)
+
+    timings = [measure(module, args.repeats) for module in args.modules]
+    problems = check(timings, args.budget)
+    if args.json:
+        print(json.dumps({'budget': args.budget, 'timings': [t.to_dict() for t in timings],
+                          'problems': problems}, indent=2))
+    else:
+        print(format_report(timings, args.budget))
+        for problem in problems:
+            print(f"FAIL: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import argparse
+import ast
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from controllers import CONTROLLERS, SignalController
+
+# Pulls the state back out of the prompt built by AITrafficOptimizer._prepare_ai_context
+PROMPT_FIELDS = {
+    'waiting_vehicles': re.compile(r'Waiting vehicles:\s*(\[[^\]]*\])'),
+    'flow_rates': re.compile(r'Flow rates:\s*(\[[^\]]*\])'),
+    'congestion': re.compile(r'Congestion levels:\s*(\[[^\]]*\])'),
+    'time_of_day': re.compile(r'Time of day:\s*(\d+)'),
+}
+# Batched prompts (batch_optimizer.py) carry one such section per intersection
+SECTION = re.compile(r'Intersection\s+(\d+):')
+
+
+def parse_prompt(prompt: str) -> Dict:
+    state = {}
+    for name, pattern in PROMPT_FIELDS.items():
+        match = pattern.search(prompt)
+        if match is None:
+            raise ValueError(f"Prompt has no {name}")
+        state[name] = ast.literal_eval(match.group(1))
+    return state
+
+
+def render_reply(timing: Dict) -> str:
+    # _parse_ai_response reads the first four integers as extra vehicles per approach
+    # and gives each 20 + 2 * n seconds of green, so answer in those units
+    extra = [max(0, round((green - 20) / 2)) for green in timing['green_times']]
+    return " ".join(str(n) for n in extra)
+
+
+def answer(prompt: str, controller: SignalController) -> str:
+    parts = SECTION.split(prompt)
+    if len(parts) == 1:
+        return "Extra vehicles to serve per approach: " + render_reply(
+            controller.timing(parse_prompt(prompt)))
+    # parts alternates text before the first section, then number, section text, ...
+    return "\n".join(
+        f"Intersection {number}: {render_reply(controller.timing(parse_prompt(section)))}"
+        for number, section in zip(parts[1::2], parts[2::2])
+    )
+
+
+class ChatCompletionHandler(BaseHTTPRequestHandler):
+    # Answers OpenAI-style chat completion requests with a local controller's plan
+    controller: SignalController = CONTROLLERS['webster']()
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send(404, {'error': {'message': f"Unknown endpoint {self.path}"}})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+            prompt = request['messages'][-1]['content']
+            content = answer(prompt, self.controller)
+        except (ValueError, KeyError, IndexError, SyntaxError) as e:
+            self._send(400, {'error': {'message': str(e)}})
+            return
+        self._send(200, {
+            'id': f"chatcmpl-local-{time.time_ns()}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'local'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        })
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send(200, {'object': 'list',
+                             'data': [{'id': 'local', 'object': 'model', 'owned_by': 'local'}]})
+        else:
+            self._send(404, {'error': {'message': f"Unknown endpoint {self.path}"}})
+
+    def _send(self, status: int, body: Dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(host: str = '127.0.0.1', port: int = 8765,
+                  controller: Optional[SignalController] = None) -> ThreadingHTTPServer:
+    handler = type('Handler', (ChatCompletionHandler,),
+                   {'controller': controller or CONTROLLERS['webster']()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve_in_background(host: str = '127.0.0.1', port: int = 0,
+                        controller: Optional[SignalController] = None) -> ThreadingHTTPServer:
+    # Port 0 picks a free port; the bound address is server.server_address
+    server = create_server(host, port, controller)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stand-in for the chat completion backend, answered by a local controller")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--controller', choices=sorted(CONTROLLERS), default='webster')
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, CONTROLLERS[args.controller]())
+    print(f"Serving {args.controller} plans on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
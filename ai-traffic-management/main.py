@@ -1,464 +1,58 @@
-import random
-import time
+import os
 import asyncio
+import logging
 import streamlit as st
-from typing import Dict, List, Optional
-import numpy as np
-import g4f
-from g4f.client import Client
-import matplotlib.pyplot as plt
-from dataclasses import dataclass
-from collections import deque
+from sim_loop import FixedTimestepLoop
+from background_optimizer import BackgroundOptimizer
+from renderer import IntersectionRenderer
+# The model lives in traffic_core.py; these names stay importable from here
+from traffic_core import (CONGESTION_LEVELS, VEHICLE_CONFIGS, AITrafficOptimizer, DirectionCounters,
+                          EmergencyVehicleHandler, LaneIndex, SimulationConfig, TrafficSimulation,
+                          Vehicle, WeatherConditions)
 
-# Configuration
-@dataclass
-class SimulationConfig:
-    DEFAULT_RED: int = 150
-    DEFAULT_YELLOW: int = 5
-    DEFAULT_GREEN: int = 20
-    DEFAULT_MIN: int = 10
-    DEFAULT_MAX: int = 60
-    NUM_SIGNALS: int = 4
-    SIM_TIME: int = 300
-    GAP: int = 15
-    MOVING_GAP: int = 15
 
-# Vehicle configurations
-VEHICLE_CONFIGS = {
-    'speeds': {'car': 2.25, 'bus': 1.8, 'truck': 1.8, 'rickshaw': 2, 'bike': 2.5},
-    'colors': {'car': 'blue', 'bus': 'red', 'truck': 'gray', 'rickshaw': 'green', 
-               'bike': 'yellow', 'emergency': 'red'},
-    'sizes': {'car': (30, 20), 'bus': (40, 20), 'truck': (40, 20), 
-              'rickshaw': (25, 15), 'bike': (20, 10), 'emergency': (35, 20)}
-}
-
-class WeatherConditions:
-    def __init__(self):
-        self.conditions = {
-            'rain': 0.0,
-            'fog': 0.0,
-            'wind': 0.0
-        }
-        self.update_interval = 100  # Update weather every 100 simulation steps
-        self.last_update = 0
-
-    def update(self):
-        self.last_update += 1
-        if self.last_update >= self.update_interval:
-            self.conditions['rain'] = random.random()
-            self.conditions['fog'] = random.random() * 0.8  # Less intense fog
-            self.conditions['wind'] = random.random() * 0.6  # Moderate wind
-            self.last_update = 0
-
-    def get_speed_modifier(self) -> float:
-        # Calculate speed reduction based on weather conditions
-        rain_effect = 1 - (self.conditions['rain'] * 0.3)  # Up to 30% slower in rain
-        fog_effect = 1 - (self.conditions['fog'] * 0.2)   # Up to 20% slower in fog
-        wind_effect = 1 - (self.conditions['wind'] * 0.1)  # Up to 10% slower in wind
-        return min(rain_effect, fog_effect, wind_effect)
-
-class EmergencyVehicleHandler:
-    def __init__(self):
-        self.emergency_probability = 0.001  # Probability of emergency vehicle spawn
-        self.active_emergency = False
-        self.emergency_cooldown = 200  # Minimum time between emergency vehicles
-        self.last_emergency = 0
-
-    def update(self, simulation):
-        if not self.active_emergency and self.last_emergency > self.emergency_cooldown:
-            if random.random() < self.emergency_probability:
-                self._spawn_emergency_vehicle(simulation)
-                self.last_emergency = 0
-        
-        self.last_emergency += 1
-        self._update_emergency_status(simulation)
-
-    def _spawn_emergency_vehicle(self, simulation):
-        direction = random.choice(['right', 'down', 'left', 'up'])
-        lane = random.randint(0, 2)
-        emergency_vehicle = Vehicle(lane, 'emergency', direction, False)
-        if simulation._is_safe_to_spawn(emergency_vehicle):
-            simulation.vehicles.append(emergency_vehicle)
-            self.active_emergency = True
-
-    def _update_emergency_status(self, simulation):
-        if self.active_emergency:
-            emergency_vehicles = [v for v in simulation.vehicles 
-                                if v.type == 'emergency']
-            if not emergency_vehicles:
-                self.active_emergency = False
-
-class AITrafficOptimizer:
+class StreamlitErrorHandler(logging.Handler):
+    # The model logs optimizer errors; on the page they show up as before
     def __init__(self):
-        self.client = Client()
-        self.history = deque(maxlen=10)
-        self.model = "gpt-4o-mini"
-
-    async def get_optimal_timing(self, current_state: Dict) -> Dict:
-        try:
-            context = self._prepare_ai_context(current_state)
-            response = await self._get_ai_recommendation(context)
-            timing = self._parse_ai_response(response)
-            
-            self.history.append({
-                'state': current_state,
-                'recommendation': timing
-            })
-            
-            return timing
-        except Exception as e:
-            st.error(f"AI optimization error: {str(e)}")
-            return self._get_fallback_timing()
-
-    async def _get_ai_recommendation(self, context: str) -> str:
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": context}],
-                web_search=False
-            )
-            return response.choices[0].message.content
-        except Exception:
-            return self._get_fallback_timing()
-
-    def _prepare_ai_context(self, state: Dict) -> str:
-        return f"""
-        Current traffic state:
-        - Waiting vehicles: {state['waiting_vehicles']}
-        - Flow rates: {state['flow_rates']}
-        - Congestion levels: {state['congestion']}
-        - Time of day: {state['time_of_day']}
-        
-        Recommend optimal signal timings based on this data.
-        """
-
-    def _parse_ai_response(self, response: str) -> Dict:
-        try:
-            base_time = 20
-            waiting_vehicles = [int(x) for x in response.split() if x.isdigit()][:4]
-            if not waiting_vehicles:
-                waiting_vehicles = [0] * 4
-                
-            green_times = [
-                min(max(base_time + w * 2, SimulationConfig.DEFAULT_MIN),
-                    SimulationConfig.DEFAULT_MAX) 
-                for w in waiting_vehicles
-            ]
-            
-            return {
-                'green_times': green_times,
-                'cycle_length': sum(green_times) + 
-                               SimulationConfig.NUM_SIGNALS * SimulationConfig.DEFAULT_YELLOW
-            }
-        except Exception:
-            return self._get_fallback_timing()
-
-    def _get_fallback_timing(self) -> Dict:
-        return {
-            'green_times': [SimulationConfig.DEFAULT_GREEN] * SimulationConfig.NUM_SIGNALS,
-            'cycle_length': (SimulationConfig.DEFAULT_GREEN * SimulationConfig.NUM_SIGNALS + 
-                           SimulationConfig.DEFAULT_YELLOW * SimulationConfig.NUM_SIGNALS)
-        }
-
-class Vehicle:
-    def __init__(self, lane: int, vehicle_type: str, direction: str, will_turn: bool):
-        self.lane = lane
-        self.type = vehicle_type
-        self.speed = VEHICLE_CONFIGS['speeds'].get(vehicle_type, 2.0)
-        self.direction = direction
-        self.position = self._initialize_position()
-        self.size = VEHICLE_CONFIGS['sizes'].get(vehicle_type, (30, 20))
-        self.color = VEHICLE_CONFIGS['colors'].get(vehicle_type, 'gray')
-        self.crossed = False
-        self.will_turn = will_turn
-        self.turned = False
-        self.creation_time = time.time()
-        self.wait_time = 0
-        self.stop_position = self._calculate_stop_position()
-        self.priority = vehicle_type == 'emergency'
-
-    def _initialize_position(self) -> tuple:
-        positions = {
-            'right': (50, 200 + self.lane * 20),
-            'down': (450 - self.lane * 20, 50),
-            'left': (850, 300 - self.lane * 20),
-            'up': (400 + self.lane * 20, 550)
-        }
-        return positions[self.direction]
-
-    def _calculate_stop_position(self) -> float:
-        stop_lines = {'right': 350, 'down': 200, 'left': 550, 'up': 400}
-        return stop_lines[self.direction] - self.size[0] - SimulationConfig.GAP
-
-    def move(self, current_green: int, current_yellow: int, vehicles_ahead: List['Vehicle'],
-            weather_modifier: float = 1.0) -> None:
-        if self._can_move(current_green, current_yellow, vehicles_ahead):
-            modified_speed = self.speed * weather_modifier
-            if self.direction in ['right', 'left']:
-                new_x = self.position[0] + (modified_speed if self.direction == 'right' else -modified_speed)
-                new_y = self.position[1]
-            else:  # up or down
-                new_x = self.position[0]
-                new_y = self.position[1] + (modified_speed if self.direction == 'down' else -modified_speed)
-            
-            self.position = (new_x, new_y)
-            self._check_crossing()
-        else:
-            self.wait_time += 1
-
-    def _can_move(self, current_green: int, current_yellow: int, vehicles_ahead: List['Vehicle']) -> bool:
-        if self.crossed:
-            return True
-        
-        direction_numbers = {'right': 0, 'down': 1, 'left': 2, 'up': 3}
-        if not self.priority and current_green != direction_numbers[self.direction] and not current_yellow:
-            return False
-
-        if vehicles_ahead:
-            next_vehicle = vehicles_ahead[0]
-            if self._distance_to(next_vehicle) < SimulationConfig.MOVING_GAP:
-                return False
-
-        return True
-
-    def _distance_to(self, other: 'Vehicle') -> float:
-        return ((self.position[0] - other.position[0]) ** 2 + 
-                (self.position[1] - other.position[1]) ** 2) ** 0.5
-
-    def _check_crossing(self) -> None:
-        if not self.crossed:
-            stop_lines = {'right': 350, 'down': 200, 'left': 550, 'up': 400}
-            if ((self.direction in ['right', 'left'] and 
-                 abs(self.position[0] - stop_lines[self.direction]) > 50) or
-                (self.direction in ['up', 'down'] and 
-                 abs(self.position[1] - stop_lines[self.direction]) > 50)):
-                self.crossed = True
-
-class TrafficSimulation:
-    def __init__(self):
-        self.config = SimulationConfig()
-        self.ai_optimizer = AITrafficOptimizer()
-        self.vehicles = []
-        self.current_green = 0
-        self.current_yellow = False
-        self.time_elapsed = 0
-        self.stats = {
-            'total_vehicles': 0,
-            'waiting_times': [],
-            'throughput': []
-        }
-        self.weather = WeatherConditions()
-        self.emergency_handler = EmergencyVehicleHandler()
-
-    def _count_waiting_vehicles(self) -> List[int]:
-        waiting_counts = [0] * 4
-        direction_map = {'right': 0, 'down': 1, 'left': 2, 'up': 3}
-        
-        for vehicle in self.vehicles:
-            if not vehicle.crossed:
-                direction_index = direction_map[vehicle.direction]
-                waiting_counts[direction_index] += 1
-                
-        return waiting_counts
-
-    def _calculate_flow_rates(self) -> List[float]:
-        flow_rates = [0] * 4
-        direction_map = {'right': 0, 'down': 1, 'left': 2, 'up': 3}
-        time_window = 60
-        start_time = max(0, self.time_elapsed - time_window)
-        
-        for vehicle in self.vehicles:
-            if vehicle.crossed:
-                direction_index = direction_map[vehicle.direction]
-                flow_rates[direction_index] += 1
-                
-        return [rate / time_window for rate in flow_rates]
-
-    def _calculate_congestion_levels(self) -> List[float]:
-        congestion_levels = [0] * 4
-        direction_map = {'right': 0, 'down': 1, 'left': 2, 'up': 3}
-        
-        for vehicle in self.vehicles:
-            if not vehicle.crossed:
-                direction_index = direction_map[vehicle.direction]
-                congestion_levels[direction_index] += 0.1
-                
-        return [min(level, 1.0) for level in congestion_levels]
-
-    async def update(self):
-        self.weather.update()
-        self.emergency_handler.update(self)
-        await self._update_signals()
-        self._update_vehicles()
-        self._generate_vehicles()
-        self._update_stats()
-        self.time_elapsed += 1
-
-    async def _update_signals(self):
-        state = self._get_current_state()
-        timing = await self.ai_optimizer.get_optimal_timing(state)
-        self._apply_signal_timing(timing)
-
-    def _get_current_state(self) -> Dict:
-        return {
-            'waiting_vehicles': self._count_waiting_vehicles(),
-            'flow_rates': self._calculate_flow_rates(),
-            'congestion': self._calculate_congestion_levels(),
-            'time_of_day': time.localtime().tm_hour
-        }
-
-    def _apply_signal_timing(self, timing: Dict):
-        if self.current_yellow:
-            return
-            
-        green_times = timing['green_times']
-        if self.time_elapsed % timing['cycle_length'] == 0:
-            self.current_yellow = True
-            self.current_green = (self.current_green + 1) % 4
-        elif self.time_elapsed % timing['cycle_length'] == SimulationConfig.DEFAULT_YELLOW:
-            self.current_yellow = False
+        super().__init__(logging.ERROR)
+        self.name = 'streamlit'
 
-    def _update_vehicles(self):
-        weather_modifier = self.weather.get_speed_modifier()
-        for vehicle in self.vehicles[:]:
-            vehicle.move(
-                self.current_green,
-                self.current_yellow,
-                self._get_vehicles_ahead(vehicle),
-                weather_modifier
-            )
-            if self._is_vehicle_out_of_bounds(vehicle):
-                self.vehicles.remove(vehicle)
+    def emit(self, record: logging.LogRecord) -> None:
+        st.error(self.format(record))
 
-    def _get_vehicles_ahead(self, vehicle: Vehicle) -> List[Vehicle]:
-        return [v for v in self.vehicles 
-                if v != vehicle and 
-                v.direction == vehicle.direction and 
-                v.lane == vehicle.lane and 
-                not v.crossed and 
-                self._is_ahead(vehicle, v)]
-
-    def _is_ahead(self, vehicle1: Vehicle, vehicle2: Vehicle) -> bool:
-        if vehicle1.direction in ['right', 'left']:
-            return ((vehicle1.direction == 'right' and 
-                    vehicle2.position[0] > vehicle1.position[0]) or
-                   (vehicle1.direction == 'left' and 
-                    vehicle2.position[0] < vehicle1.position[0]))
-        else:
-            return ((vehicle1.direction == 'down' and 
-                    vehicle2.position[1] > vehicle1.position[1]) or
-                   (vehicle1.direction == 'up' and 
-                    vehicle2.position[1] < vehicle1.position[1]))
-                    
-    def _generate_vehicles(self):
-        if random.random() < 0.3 and len(self.vehicles) < 50:
-            vehicle_type = random.choice(list(VEHICLE_CONFIGS['speeds'].keys()))
-            direction = random.choice(['right', 'down', 'left', 'up'])
-            lane = random.randint(0, 2)
-            will_turn = random.random() < 0.4
-            
-            new_vehicle = Vehicle(lane, vehicle_type, direction, will_turn)
-            if self._is_safe_to_spawn(new_vehicle):
-                self.vehicles.append(new_vehicle)
-
-    def _is_vehicle_out_of_bounds(self, vehicle: Vehicle) -> bool:
-        x, y = vehicle.position
-        return (x < -50 or x > 950 or y < -50 or y > 650)
-
-    def _is_safe_to_spawn(self, vehicle: Vehicle) -> bool:
-        return not any(
-            existing.direction == vehicle.direction and
-            existing.lane == vehicle.lane and
-            self._distance_between_positions(existing.position, vehicle.position) < SimulationConfig.GAP * 2
-            for existing in self.vehicles
-        )
-
-    def _distance_between_positions(self, pos1: tuple, pos2: tuple) -> float:
-        return ((pos1[0] - pos2[0]) ** 2 + (pos1[1] - pos2[1]) ** 2) ** 0.5
-
-    def _update_stats(self):
-        self.stats['total_vehicles'] = len([v for v in self.vehicles if v.crossed])
-        waiting_times = [v.wait_time for v in self.vehicles if not v.crossed]
-        
-        if waiting_times:
-            self.stats['waiting_times'].append(sum(waiting_times) / len(waiting_times))
-        
-        self.stats['throughput'].append(
-            self.stats['total_vehicles'] / (self.time_elapsed + 1)
-        )
-
-    def render(self) -> plt.Figure:
-        fig, ax = plt.subplots(figsize=(10, 10))
-        self._draw_infrastructure(ax)
-        self._draw_vehicles(ax)
-        self._draw_signals(ax)
-        
-        if self.weather.conditions['rain'] > 0.3:
-            self._draw_rain(ax)
-        if self.weather.conditions['fog'] > 0.3:
-            self._draw_fog(ax)
-            
-        plt.close()
-        return fig
-
-    def _draw_infrastructure(self, ax):
-        # Draw roads
-        ax.set_xlim(0, 900)
-        ax.set_ylim(0, 600)
-        
-        # Main intersection
-        ax.add_patch(plt.Rectangle((300, 150), 300, 300, fill=False, color='black'))
-        
-        # Road markings
-        for y in range(150, 451, 20):  # Horizontal lines
-            ax.plot([0, 900], [y, y], 'w--', alpha=0.5)
-        for x in range(300, 601, 20):  # Vertical lines
-            ax.plot([x, x], [0, 600], 'w--', alpha=0.5)
-        
-        # Set background color
-        ax.set_facecolor('#555555')  # Dark gray for road
-
-    def _draw_vehicles(self, ax):
-        for vehicle in self.vehicles:
-            ax.add_patch(plt.Rectangle(vehicle.position, *vehicle.size, 
-                                     color=vehicle.color))
-
-    def _draw_signals(self, ax):
-        signal_positions = [(300, 150), (600, 150), (600, 450), (300, 450)]
-        for i, pos in enumerate(signal_positions):
-            color = self._get_signal_color(i)
-            ax.add_patch(plt.Circle(pos, 10, color=color))
-
-    def _get_signal_color(self, signal_index: int) -> str:
-        if signal_index == self.current_green:
-            return 'yellow' if self.current_yellow else 'green'
-        return 'red'
-
-    def _draw_rain(self, ax):
-        intensity = self.weather.conditions['rain']
-        num_drops = int(intensity * 100)
-        for _ in range(num_drops):
-            x = random.uniform(0, 900)
-            y = random.uniform(0, 600)
-            ax.plot([x, x - 5], [y, y - 5], 'b-', alpha=0.3)
-
-    def _draw_fog(self, ax):
-        intensity = self.weather.conditions['fog']
-        ax.add_patch(plt.Rectangle((0, 0), 900, 600, 
-                                 color='white', alpha=intensity * 0.3))
 
 async def main():
     st.set_page_config(page_title="AI Traffic Simulation", layout="wide")
     st.title("AI Traffic Simulation")
+    core_logger = logging.getLogger('traffic_core')
+    # Reruns re-execute this script, so match the handler by name rather than class
+    if not any(handler.name == 'streamlit' for handler in core_logger.handlers):
+        core_logger.addHandler(StreamlitErrorHandler())
+
+    # A recorded trace (headless.py --trace) plays back without re-simulating
+    trace_path = st.sidebar.text_input("Replay trace directory")
+    if trace_path:
+        await replay_trace(trace_path)
+        return
+    # Sessions watching a shared simulation (sim_server.py) run nothing themselves
+    shared = st.sidebar.text_input("Shared simulation server (host:port)",
+                                   os.environ.get('TRAFFIC_SIM_SERVER', ''))
+    if shared:
+        await watch_shared(shared)
+        return
 
     if 'simulation' not in st.session_state:
-        st.session_state.simulation = TrafficSimulation()
+        # The model answers in the background; ticks use the latest plan it published
+        st.session_state.simulation = TrafficSimulation(BackgroundOptimizer(AITrafficOptimizer()))
         st.session_state.running = False
 
     # Sidebar controls
     st.sidebar.title("Simulation Controls")
     if st.sidebar.button("Start/Stop Simulation"):
         st.session_state.running = not st.session_state.running
+    speed = st.sidebar.slider("Speed Multiplier", 0.5, 20.0, 1.0, 0.5)
+    time_warp = st.sidebar.checkbox("Time Warp (run as fast as possible)")
+    render_fps = st.sidebar.slider("Render FPS", 1, 30, 10)
 
     # Weather display
     st.sidebar.subheader("Weather Conditions")
@@ -477,27 +71,112 @@ async def main():
         st.subheader("Statistics")
         stats_placeholder = st.empty()
 
+    def draw():
+        with plot_placeholder:
+            st.image(st.session_state.simulation.render_image())
+        
+        with stats_placeholder:
+            stats = st.session_state.simulation.stats
+            st.metric("Total Vehicles", stats['total_vehicles'])
+            st.metric("Average Wait Time", 
+                     round(sum(stats['waiting_times'][-10:]) / 10 
+                           if stats['waiting_times'] else 0, 2))
+            st.metric("95th Percentile Wait Time",
+                     round(stats['waiting_times'].percentile(95), 2))
+            st.metric("Throughput", 
+                     round(stats['throughput'][-1], 2) 
+                     if stats['throughput'] else 0)
+            st.metric("Time Elapsed", st.session_state.simulation.time_elapsed)
+            st.metric("Sim Rate (ticks/s)", round(loop.stats.sim_rate, 1))
+            st.metric("Render Rate (fps)", round(loop.stats.render_rate, 1))
+            background = st.session_state.simulation.ai_optimizer
+            st.metric("Decision Cache Hit Rate", f"{background.optimizer.cache.hit_rate:.0%}")
+            st.metric("Timing Plans Applied", background.plan_version)
+            st.metric("Backend Circuit", background.optimizer.breaker.state)
+            metrics = background.optimizer.metrics.snapshot()
+            st.metric("Backend Latency p95 (s)", round(metrics['latency']['backend']['p95'], 3))
+            st.metric("Fallback Rate", f"{metrics['rates']['fallback_rate']:.0%}")
+
+    # The model ticks at 10 Hz times the speed multiplier (or flat out in time warp)
+    # and is only drawn at the render rate, so a slow frame no longer slows it down
+    loop = FixedTimestepLoop(st.session_state.simulation, tick_rate=10, speed=speed,
+                             time_warp=time_warp, render_fps=render_fps, on_render=draw)
+
     while True:
         if st.session_state.running:
-            await st.session_state.simulation.update()
-            
-            with plot_placeholder:
-                fig = st.session_state.simulation.render()
-                st.pyplot(fig)
-            
-            with stats_placeholder:
-                stats = st.session_state.simulation.stats
-                st.metric("Total Vehicles", stats['total_vehicles'])
-                st.metric("Average Wait Time", 
-                         round(sum(stats['waiting_times'][-10:]) / 10 
-                               if stats['waiting_times'] else 0, 2))
-                st.metric("Throughput", 
-                         round(stats['throughput'][-1], 2) 
-                         if stats['throughput'] else 0)
-                st.metric("Time Elapsed", st.session_state.simulation.time_elapsed)
+            await loop.run()
         
         await asyncio.sleep(0.1)
 
+async def watch_shared(address: str):
+    from sim_server import FrameSubscriber, parse_address
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        plot_placeholder = st.empty()
+    with col2:
+        st.subheader("Statistics")
+        stats_placeholder = st.empty()
+
+    renderer = None
+    async with FrameSubscriber(*parse_address(address)) as subscriber:
+        while True:
+            frame = await subscriber.next_frame()
+            if frame.image is None:
+                # The server left drawing to the viewers
+                renderer = renderer or IntersectionRenderer()
+                plot_placeholder.image(renderer.render_image(frame))
+            else:
+                plot_placeholder.image(frame.image)
+            stats = frame.stats
+            with stats_placeholder.container():
+                st.metric("Total Vehicles", stats['total_vehicles'])
+                st.metric("Average Wait Time", round(stats['average_wait_time'], 2))
+                st.metric("95th Percentile Wait Time", round(stats['wait_time_p95'], 2))
+                st.metric("Throughput", round(stats['throughput'], 2))
+                st.metric("Time Elapsed", stats['time_elapsed'])
+                st.metric("Sim Rate (ticks/s)", round(stats['sim_rate'], 1))
+                st.metric("Viewers", stats['viewers'])
+                if 'backend_circuit' in stats:
+                    st.metric("Decision Cache Hit Rate", f"{stats['cache_hit_rate']:.0%}")
+                    st.metric("Timing Plans Applied", stats.get('plans_applied', 0))
+                    st.metric("Backend Circuit", stats['backend_circuit'])
+                    st.metric("Fallback Rate", f"{stats['fallback_rate']:.0%}")
+
+async def replay_trace(path: str):
+    from trace_replay import TraceReplay
+
+    replay = TraceReplay(path)
+    if not len(replay):
+        st.warning(f"{path} has no recorded ticks")
+        return
+    if 'trace_renderer' not in st.session_state:
+        st.session_state.trace_renderer = IntersectionRenderer()
+    renderer = st.session_state.trace_renderer
+    tick = st.sidebar.slider("Tick", replay.first_tick, replay.last_tick, replay.first_tick)
+    playing = st.sidebar.checkbox("Play from this tick")
+    fps = st.sidebar.slider("Playback FPS", 1, 60, 20)
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        plot_placeholder = st.empty()
+    with col2:
+        st.subheader("Replay")
+        stats_placeholder = st.empty()
+
+    position = replay.position(tick)
+    while True:
+        frame = replay.frame_at(position)
+        plot_placeholder.image(renderer.render_image(frame))
+        with stats_placeholder.container():
+            st.metric("Tick", frame.time_elapsed)
+            st.metric("Vehicles", len(frame.vehicles))
+            st.metric("Waiting", int((~frame.vehicles.columns['crossed']).sum()))
+        if not playing or position == len(replay) - 1:
+            break
+        position += 1
+        await asyncio.sleep(1 / fps)
+
 if __name__ == "__main__":
     asyncio.run(main())
 
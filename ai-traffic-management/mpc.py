@@ -0,0 +1,130 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from traffic_core import SignalOptimizer, TrafficSimulation
+from vectorized_simulation import VectorizedTrafficSimulation
+from controllers import CONTROLLERS, LocalOptimizer, PlanController
+
+
+async def rollout(simulation: VectorizedTrafficSimulation, horizon: int) -> int:
+    # Vehicle-ticks spent waiting over the horizon
+    delay = 0
+    for _ in range(horizon):
+        await simulation.update()
+        delay += sum(simulation.counters.waiting)
+    return delay
+
+
+def rollout_snapshot(task: tuple) -> int:
+    # Worker-process entry point: rebuild the state from snapshot bytes and roll it out,
+    # seeded the way clone() seeds a local rollout
+    data, plan, seed, horizon, entry_directions = task
+    simulation = VectorizedTrafficSimulation.from_snapshot(data, LocalOptimizer(PlanController(plan)))
+    simulation.entry_directions = entry_directions
+    simulation.rng.seed(seed)
+    if simulation.demand is not None:
+        simulation.demand.reseed(seed)
+    return asyncio.run(rollout(simulation, horizon))
+
+
+class ModelPredictiveOptimizer(SignalOptimizer):
+    # Whenever a green is about to start (the end of a yellow), forks the attached
+    # simulation once per candidate plan, rolls every fork forward `horizon` ticks with
+    # its plan held fixed, and keeps the plan with the least predicted delay until the
+    # next green. All forks share one seed, so they only differ by plan. Rollouts use
+    # the vectorized engine and run in worker processes when `workers` > 1: every plan
+    # is queued and the pool works through them as workers free up; any not scored
+    # within `decision_budget` seconds are left out, and the current plan is kept if
+    # none finish.
+    def __init__(self, horizon: int = 50, workers: int = 1, decision_budget: float = 0.1,
+                 controllers: Optional[List[str]] = None):
+        super().__init__()
+        self.horizon = horizon
+        self.workers = workers
+        self.decision_budget = decision_budget
+        self.controllers = [CONTROLLERS[name]() for name in (controllers or CONTROLLERS)]
+        self.simulation: Optional[TrafficSimulation] = None
+        self.plan = self._get_fallback_timing()
+        self.decisions = 0
+        self.last_decision_time = 0.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def attach(self, simulation: TrafficSimulation) -> None:
+        self.simulation = simulation
+
+    def candidate_plans(self, state: Dict) -> List[List[int]]:
+        # The current plan goes first so it wins ties
+        plans = [self.plan['green_times']]
+        for controller in self.controllers:
+            plan = controller.timing(state)['green_times']
+            if plan not in plans:
+                plans.append(plan)
+        return plans
+
+    async def get_optimal_timing(self, current_state: Dict) -> Dict:
+        # Green times only take effect when a green starts, so that is when to decide;
+        # the tick engines ask every tick, the event engine only at phase ends
+        simulation = self.simulation
+        if (simulation is None or not simulation.current_yellow
+                or simulation.time_elapsed < simulation.phase_end):
+            return self.plan
+
+        start = time.perf_counter()
+        plans = self.candidate_plans(current_state)
+        seed = simulation.time_elapsed
+        if self.workers > 1:
+            delays = await self._parallel_rollouts(simulation.snapshot(), plans, seed)
+        else:
+            delays = await self._local_rollouts(simulation, plans, seed)
+
+        scored = [(delay, index) for index, delay in enumerate(delays) if delay is not None]
+        if scored:
+            self.plan = PlanController(plans[min(scored)[1]]).timing(current_state)
+        self.decisions += 1
+        self.last_decision_time = time.perf_counter() - start
+        self.history.append({'state': current_state, 'recommendation': self.plan,
+                             'delays': delays})
+        return self.plan
+
+    async def _local_rollouts(self, simulation: TrafficSimulation, plans: List[List[int]],
+                              seed: int) -> List[Optional[int]]:
+        if isinstance(simulation, VectorizedTrafficSimulation):
+            base = simulation
+        else:
+            base = VectorizedTrafficSimulation.from_snapshot(simulation.snapshot())
+            base.entry_directions = simulation.entry_directions
+        delays = []
+        for plan in plans:
+            fork = base.clone(seed, LocalOptimizer(PlanController(plan)))
+            delays.append(await rollout(fork, self.horizon))
+        return delays
+
+    async def _parallel_rollouts(self, data: bytes, plans: List[List[int]],
+                                 seed: int) -> List[Optional[int]]:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=min(self.workers, os.cpu_count() or 1))
+        # Every plan is queued, current plan first; a worker takes the next one as soon
+        # as it is free, so a small pool still scores as many as fit in the budget
+        entry_directions = self.simulation.entry_directions
+        submitted = [self._executor.submit(rollout_snapshot,
+                                           (data, plan, seed, self.horizon, entry_directions))
+                     for plan in plans]
+        await asyncio.wait([asyncio.wrap_future(future) for future in submitted],
+                           timeout=self.decision_budget)
+        delays = []
+        for future in submitted:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                delays.append(future.result())
+            else:
+                future.cancel()  # still queued: drop it; already running: it finishes unused
+                delays.append(None)
+        return delays
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,339 @@
+import argparse
+import asyncio
+import heapq
+import json
+import multiprocessing
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from traffic_core import AITrafficOptimizer, Vehicle, TrafficSimulation
+from vectorized_simulation import VectorizedTrafficSimulation
+from headless import OPTIMIZERS, FixedTimingOptimizer
+from batch_optimizer import OptimizerBatcher
+
+# Grid step for a vehicle leaving an intersection in each direction of travel
+DIRECTION_OFFSETS = {'right': (0, 1), 'down': (1, 0), 'left': (0, -1), 'up': (-1, 0)}
+
+# A vehicle in transit between intersections:
+# (arrival_tick, target_id, source_id, sequence, type, direction, lane, will_turn, wait_time)
+Transfer = Tuple[int, int, int, int, str, str, int, bool, int]
+
+
+@dataclass
+class NetworkSpec:
+    rows: int = 1
+    cols: int = 4
+    segment_delay: int = 20  # ticks to drive the road segment between two intersections
+    seed: int = 0
+    engine: str = 'object'
+    max_vehicles: Optional[int] = None
+    optimizer: str = 'fixed'  # any headless optimizer; 'ai' requests are batched per process
+    backend_url: Optional[str] = None  # OpenAI-compatible server for 'ai'
+
+    @property
+    def size(self) -> int:
+        return self.rows * self.cols
+
+    def position(self, intersection_id: int) -> Tuple[int, int]:
+        return divmod(intersection_id, self.cols)
+
+    def neighbour(self, intersection_id: int, direction: str) -> Optional[int]:
+        row, col = self.position(intersection_id)
+        d_row, d_col = DIRECTION_OFFSETS[direction]
+        row, col = row + d_row, col + d_col
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row * self.cols + col
+        return None
+
+    def upstream(self, intersection_id: int, direction: str) -> Optional[int]:
+        row, col = self.position(intersection_id)
+        d_row, d_col = DIRECTION_OFFSETS[direction]
+        row, col = row - d_row, col - d_col
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row * self.cols + col
+        return None
+
+    def intersection_seed(self, intersection_id: int) -> int:
+        state = np.random.SeedSequence([self.seed, intersection_id]).generate_state(2)
+        return int.from_bytes(state.tobytes(), 'little')
+
+
+class IntersectionMixin:
+    # Turns a simulation into one node of a RoadNetwork: vehicles leaving its bounds
+    # go to the outbox, and vehicles handed over by neighbours queue in the inbox
+    def _setup_intersection(self, spec: NetworkSpec, intersection_id: int):
+        self.spec = spec
+        self.intersection_id = intersection_id
+        self.entry_directions = tuple(
+            direction for direction in DIRECTION_OFFSETS
+            if spec.upstream(intersection_id, direction) is None
+        )
+        self.inbox: List[Transfer] = []
+        self.outbox: List[Transfer] = []
+        self.completed_trips = 0
+        self._exit_sequence = 0
+
+    def _on_vehicle_exit(self, vehicle: Vehicle):
+        target = self.spec.neighbour(self.intersection_id, vehicle.direction)
+        if target is None:
+            self.completed_trips += 1
+            return
+        self.outbox.append((self.time_elapsed + self.spec.segment_delay, target,
+                            self.intersection_id, self._exit_sequence, vehicle.type,
+                            vehicle.direction, vehicle.lane, vehicle.will_turn,
+                            vehicle.wait_time))
+        self._exit_sequence += 1
+
+    def receive(self, transfer: Transfer) -> None:
+        heapq.heappush(self.inbox, transfer)
+
+    def _deliver_arrivals(self):
+        # Vehicles that can't enter yet wait at the end of the segment and retry next tick
+        held = []
+        while self.inbox and self.inbox[0][0] <= self.time_elapsed:
+            transfer = heapq.heappop(self.inbox)
+            _, _, _, _, vehicle_type, direction, lane, will_turn, wait_time = transfer
+            vehicle = Vehicle(lane, vehicle_type, direction, will_turn)
+            vehicle.wait_time = wait_time
+            if self._is_safe_to_spawn(vehicle):
+                self._add_vehicle(vehicle)
+            else:
+                held.append(transfer)
+        for transfer in held:
+            heapq.heappush(self.inbox, transfer)
+
+    async def update(self):
+        self._deliver_arrivals()
+        await super().update()
+
+
+class Intersection(IntersectionMixin, TrafficSimulation):
+    def __init__(self, spec: NetworkSpec, intersection_id: int, ai_optimizer=None):
+        super().__init__(ai_optimizer or FixedTimingOptimizer(),
+                         seed=spec.intersection_seed(intersection_id))
+        self._setup_intersection(spec, intersection_id)
+
+
+class VectorizedIntersection(IntersectionMixin, VectorizedTrafficSimulation):
+    def __init__(self, spec: NetworkSpec, intersection_id: int, ai_optimizer=None):
+        super().__init__(ai_optimizer or FixedTimingOptimizer(),
+                         seed=spec.intersection_seed(intersection_id))
+        self._setup_intersection(spec, intersection_id)
+
+
+INTERSECTION_ENGINES = {
+    'object': Intersection,
+    'vectorized': VectorizedIntersection,
+}
+
+
+class RoadNetwork:
+    # Intersections owned by this process; transfers to intersections it doesn't
+    # own are collected in `outbound` for the caller to route
+    def __init__(self, spec: NetworkSpec, intersection_ids: Optional[List[int]] = None):
+        self.spec = spec
+        if spec.segment_delay < 1:
+            raise ValueError("segment_delay must be at least one tick")
+        ids = range(spec.size) if intersection_ids is None else intersection_ids
+        # Intersections asking the model share one batcher, so each tick costs one
+        # request for all of them instead of one each
+        self.batcher = (OptimizerBatcher(AITrafficOptimizer(base_url=spec.backend_url))
+                        if spec.optimizer == 'ai' else None)
+        self.intersections: Dict[int, TrafficSimulation] = {}
+        for intersection_id in ids:
+            optimizer = (self.batcher.client() if self.batcher is not None
+                         else OPTIMIZERS[spec.optimizer]())
+            intersection = INTERSECTION_ENGINES[spec.engine](spec, intersection_id, optimizer)
+            if hasattr(optimizer, 'attach'):
+                # Each intersection gets its own planner looking at its own state
+                optimizer.attach(intersection)
+            if spec.max_vehicles is not None:
+                intersection.config.MAX_VEHICLES = spec.max_vehicles
+            self.intersections[intersection_id] = intersection
+        self.outbound: List[Transfer] = []
+        self.transfers = 0
+        self.time_elapsed = 0
+
+    def receive(self, transfers: List[Transfer]) -> None:
+        for transfer in transfers:
+            self.intersections[transfer[1]].receive(transfer)
+
+    async def update(self):
+        if self.batcher is not None:
+            # Run the ticks side by side so their optimizer requests land in one batch
+            await asyncio.gather(*(i.update() for i in self.intersections.values()))
+        else:
+            for intersection in self.intersections.values():
+                await intersection.update()
+        for intersection in self.intersections.values():
+            for transfer in intersection.outbox:
+                target = self.intersections.get(transfer[1])
+                if target is None:
+                    self.outbound.append(transfer)
+                else:
+                    target.receive(transfer)
+            self.transfers += len(intersection.outbox)
+            intersection.outbox.clear()
+        self.time_elapsed += 1
+
+    async def run(self, ticks: int):
+        for _ in range(ticks):
+            await self.update()
+
+    def take_outbound(self) -> List[Transfer]:
+        outbound, self.outbound = self.outbound, []
+        return outbound
+
+    def summary(self) -> Dict:
+        intersections = self.intersections.values()
+        wait_means = [i.stats['waiting_times'].mean for i in intersections
+                      if i.stats['waiting_times'].count]
+        return {
+            'intersections': len(self.intersections),
+            'vehicles': sum(len(i.vehicles) for i in intersections),
+            'in_transit': sum(len(i.inbox) for i in intersections),
+            'completed_trips': sum(i.completed_trips for i in intersections),
+            'transfers': self.transfers,
+            'wait_time_sum': sum(wait_means),
+            'wait_time_samples': len(wait_means),
+        }
+
+
+def merge_summaries(summaries: List[Dict]) -> Dict:
+    merged = {key: sum(summary[key] for summary in summaries) for key in summaries[0]}
+    samples = merged.pop('wait_time_samples')
+    merged['average_wait_time'] = merged.pop('wait_time_sum') / samples if samples else 0.0
+    return merged
+
+
+def partition(spec: NetworkSpec, shards: int) -> List[List[int]]:
+    # Contiguous bands of rows (or columns for a single-row corridor) keep the
+    # cut, and so the boundary traffic, as small as possible
+    shards = max(1, min(shards, spec.rows if spec.rows > 1 else spec.cols))
+    if spec.rows > 1:
+        bands = np.array_split(np.arange(spec.rows), shards)
+        return [[row * spec.cols + col for row in band for col in range(spec.cols)]
+                for band in bands]
+    return [band.tolist() for band in np.array_split(np.arange(spec.cols), shards)]
+
+
+def _shard_worker(spec: NetworkSpec, intersection_ids: List[int], connection):
+    network = RoadNetwork(spec, intersection_ids)
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            message = connection.recv()
+            if message[0] == 'stop':
+                break
+            _, ticks, inbound = message
+            network.receive(inbound)
+            loop.run_until_complete(network.run(ticks))
+            connection.send((network.take_outbound(), network.summary()))
+    finally:
+        loop.close()
+        connection.close()
+
+
+class ShardedNetwork:
+    # Runs each partition in its own process. Every vehicle crossing between shards
+    # spends segment_delay ticks on the road, so shards can run that many ticks
+    # independently and only exchange boundary vehicles once per epoch.
+    def __init__(self, spec: NetworkSpec, workers: int):
+        self.spec = spec
+        self.shards = partition(spec, workers)
+        self.owner = {i: shard for shard, ids in enumerate(self.shards) for i in ids}
+        self.time_elapsed = 0
+        self._pending: List[List[Transfer]] = [[] for _ in self.shards]
+        self._summaries: List[Dict] = []
+        context = multiprocessing.get_context()
+        self._connections = []
+        self._processes = []
+        for ids in self.shards:
+            parent, child = context.Pipe()
+            process = context.Process(target=_shard_worker, args=(spec, ids, child), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def run(self, ticks: int):
+        epoch = self.spec.segment_delay
+        remaining = ticks
+        while remaining > 0:
+            step = min(epoch, remaining)
+            for connection, inbound in zip(self._connections, self._pending):
+                connection.send(('run', step, inbound))
+            self._pending = [[] for _ in self.shards]
+            self._summaries = []
+            for connection in self._connections:
+                outbound, summary = connection.recv()
+                self._summaries.append(summary)
+                for transfer in outbound:
+                    self._pending[self.owner[transfer[1]]].append(transfer)
+            remaining -= step
+            self.time_elapsed += step
+
+    def summary(self) -> Dict:
+        merged = merge_summaries(self._summaries)
+        # Boundary vehicles held by the coordinator are still in transit
+        merged['in_transit'] += sum(len(pending) for pending in self._pending)
+        return merged
+
+    def close(self):
+        for connection in self._connections:
+            connection.send(('stop',))
+            connection.close()
+        for process in self._processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_network(spec: NetworkSpec, ticks: int, workers: int = 1) -> Dict:
+    start = time.perf_counter()
+    if workers <= 1:
+        network = RoadNetwork(spec)
+        asyncio.run(network.run(ticks))
+        summary = merge_summaries([network.summary()])
+    else:
+        with ShardedNetwork(spec, workers) as network:
+            network.run(ticks)
+            summary = network.summary()
+    elapsed = time.perf_counter() - start
+    summary.update(ticks=ticks, elapsed=elapsed,
+                   intersection_ticks_per_second=spec.size * ticks / elapsed)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Simulate a grid of linked intersections")
+    parser.add_argument('--rows', type=int, default=1)
+    parser.add_argument('--cols', type=int, default=4)
+    parser.add_argument('--ticks', type=int, default=600)
+    parser.add_argument('--segment-delay', type=int, default=20)
+    parser.add_argument('--engine', choices=sorted(INTERSECTION_ENGINES), default='object')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-vehicles', type=int, default=None)
+    parser.add_argument('--optimizer', choices=sorted(OPTIMIZERS), default='fixed')
+    parser.add_argument('--backend-url', default=None,
+                        help="OpenAI-compatible endpoint for --optimizer ai")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes; the grid is split into that many bands")
+    args = parser.parse_args(argv)
+
+    spec = NetworkSpec(args.rows, args.cols, args.segment_delay, args.seed, args.engine,
+                       args.max_vehicles, args.optimizer, args.backend_url)
+    summary = run_network(spec, args.ticks, args.workers)
+    print(json.dumps(dict(summary, spec=asdict(spec)), indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main()
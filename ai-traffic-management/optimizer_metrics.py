@@ -0,0 +1,168 @@
+import bisect
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Sequence
+
+# Upper bounds in seconds; the last bucket catches everything slower
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    # Fixed buckets, so observing is a bisect and an increment and memory stays flat
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'bounds': list(self.bounds),
+            'buckets': list(self.counts),  # one more than bounds: the overflow bucket
+        }
+
+
+class OptimizerMetrics:
+    # Counters and latency histograms for one optimizer. 'decision' times a whole
+    # get_optimal_timing call, 'backend' times each request to the model backend.
+    # Updates come from the event loop; the lock is for readers on other threads
+    # such as the metrics endpoint.
+    def __init__(self):
+        self.counters: Counter = Counter()
+        self.fallbacks: Counter = Counter()  # reason -> times the fallback plan was used
+        self.latency = {'decision': LatencyHistogram(), 'backend': LatencyHistogram()}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def fallback(self, reason: str) -> None:
+        with self._lock:
+            self.fallbacks[reason] += 1
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.latency[name].observe(seconds)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+            fallbacks = dict(self.fallbacks)
+            latency = {name: histogram.snapshot() for name, histogram in self.latency.items()}
+        decisions = counters.get('decisions', 0)
+        parses = counters.get('parses', 0)
+        backend_calls = counters.get('backend_calls', 0)
+        return {
+            'uptime': time.time() - self.started_at,
+            'counters': counters,
+            'fallbacks': fallbacks,
+            'rates': {
+                'fallback_rate': sum(fallbacks.values()) / decisions if decisions else 0.0,
+                'parse_failure_rate': counters.get('parse_failures', 0) / parses if parses else 0.0,
+                'backend_error_rate': (counters.get('backend_errors', 0) +
+                                       counters.get('backend_timeouts', 0)) / backend_calls
+                                      if backend_calls else 0.0,
+                'cache_hit_rate': counters.get('cache_hits', 0) / decisions if decisions else 0.0,
+            },
+            'latency': latency,
+        }
+
+
+def render_text(snapshot: Dict, prefix: str = 'traffic_optimizer') -> str:
+    # Prometheus text exposition: numbers become gauges, strings become a labelled 1,
+    # and latency histograms get cumulative buckets
+    lines = []
+
+    def emit(name: str, value, labels: str = '') -> None:
+        lines.append(f"{prefix}_{name}{labels} {value}")
+
+    def walk(path: List[str], value) -> None:
+        name = '_'.join(path)
+        if isinstance(value, dict):
+            for key, item in value.items():
+                walk(path + [str(key).replace('-', '_')], item)
+        elif isinstance(value, bool):
+            emit(name, int(value))
+        elif isinstance(value, (int, float)):
+            emit(name, value)
+        elif isinstance(value, str):
+            emit(name, 1, f'{{value="{value}"}}')
+
+    for key, value in snapshot.items():
+        if key != 'latency':
+            walk([key], value)
+    for name, histogram in snapshot.get('latency', {}).items():
+        lines.append(f"# TYPE {prefix}_{name}_seconds histogram")
+        cumulative = 0
+        for bound, count in zip(histogram['bounds'] + ['+Inf'], histogram['buckets']):
+            cumulative += count
+            le = bound if isinstance(bound, str) else repr(bound)
+            emit(f"{name}_seconds_bucket", cumulative, f'{{le="{le}"}}')
+        emit(f"{name}_seconds_sum", histogram['sum'])
+        emit(f"{name}_seconds_count", histogram['count'])
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    # GET /metrics for text, /metrics.json for the raw snapshot
+    source: Callable[[], Dict] = dict
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path.endswith('/metrics.json'):
+            self._send(json.dumps(self.source()), 'application/json')
+        elif path.endswith('/metrics'):
+            self._send(render_text(self.source()), 'text/plain; version=0.0.4')
+        else:
+            self.send_error(404)
+
+    def _send(self, body: str, content_type: str):
+        payload = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(source: Callable[[], Dict], host: str = '127.0.0.1',
+                  port: int = 0) -> ThreadingHTTPServer:
+    # Serves on a daemon thread; port 0 picks a free port (see server.server_address)
+    handler = type('Handler', (MetricsHandler,), {'source': staticmethod(source)})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
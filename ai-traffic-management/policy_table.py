@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from traffic_core import CONGESTION_LEVELS, SimulationConfig, TrafficSimulation, Vehicle
+from controllers import CONTROLLERS, LocalOptimizer, PlanController, SignalController
+
+DIRECTIONS = ['right', 'down', 'left', 'up']
+# Unit vector of travel; queued vehicles line up from the stop line back against it
+TRAVEL = {'right': (1, 0), 'down': (0, 1), 'left': (-1, 0), 'up': (0, -1)}
+LANES = 3
+
+
+class PolicyTable(SignalController):
+    # Green times for a grid of quantized states: a queue level and a flow level per
+    # approach. A state is binned onto the grid and answered with one array lookup;
+    # grid cells that weren't swept borrow the plan of the nearest swept cell.
+    def __init__(self, queue_edges: Sequence[float], flow_edges: Sequence[float],
+                 cells: np.ndarray, green_times: np.ndarray):
+        self.queue_edges = np.asarray(queue_edges, dtype=np.float64)
+        self.flow_edges = np.asarray(flow_edges, dtype=np.float64)
+        self.cells = np.asarray(cells, dtype=np.int16).reshape(-1, 8)
+        self.greens = np.asarray(green_times, dtype=np.uint8).reshape(-1, 4)
+        self.shape = (len(self.queue_edges),) * 4 + (len(self.flow_edges),) * 4
+        self._rows = np.full(self.shape, -1, dtype=np.int32)
+        self._rows[tuple(self.cells.T)] = np.arange(len(self.cells))
+
+    def levels(self, state: Dict) -> tuple:
+        queues = np.searchsorted(self.queue_edges, state['waiting_vehicles'], side='right') - 1
+        flows = np.searchsorted(self.flow_edges, state['flow_rates'], side='right') - 1
+        return tuple(np.maximum(queues, 0).tolist() + np.maximum(flows, 0).tolist())
+
+    def green_times(self, state: Dict) -> List[float]:
+        levels = self.levels(state)
+        row = self._rows[levels]
+        if row < 0:
+            row = int(np.argmin(((self.cells - levels) ** 2).sum(axis=1)))
+        return self.greens[row].tolist()
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path, queue_edges=self.queue_edges, flow_edges=self.flow_edges,
+                            cells=self.cells, green_times=self.greens)
+
+    @classmethod
+    def load(cls, path: str) -> 'PolicyTable':
+        with np.load(path) as data:
+            return cls(data['queue_edges'], data['flow_edges'], data['cells'],
+                       data['green_times'])
+
+
+def cell_state(levels: Sequence[int], queue_edges: Sequence[float],
+               flow_edges: Sequence[float]) -> Dict:
+    # The state at the lower corner of a cell, in the shape _get_current_state returns
+    queues = [int(queue_edges[level]) for level in levels[:4]]
+    return {
+        'waiting_vehicles': queues,
+        'flow_rates': [float(flow_edges[level]) for level in levels[4:]],
+        'congestion': [min(CONGESTION_LEVELS[min(count, 11)], 1.0) for count in queues],
+        'time_of_day': 12,
+    }
+
+
+def queue_capacity(direction: str) -> int:
+    # Cars that fit between the stop line and the spawn point across an approach's
+    # lanes; any further back and they would start behind the spawn point, out of
+    # spawn order and off the road the model keeps
+    vehicle = Vehicle(0, 'car', direction, False)
+    dx, dy = TRAVEL[direction]
+    along = abs(dx) * vehicle.position[0] + abs(dy) * vehicle.position[1]
+    room = (vehicle.stop_position - along) * (dx + dy)
+    return LANES * (int(room // (vehicle.size[0] + SimulationConfig.GAP)) + 1)
+
+
+def build_simulation(state: Dict, plan: List[float], seed: int) -> TrafficSimulation:
+    simulation = TrafficSimulation(LocalOptimizer(PlanController(plan)), seed=seed)
+    for direction, count in zip(DIRECTIONS, state['waiting_vehicles']):
+        if count > queue_capacity(direction):
+            raise ValueError(f"{count} queued cars don't fit on the {direction} approach "
+                             f"(at most {queue_capacity(direction)})")
+        dx, dy = TRAVEL[direction]
+        # Front of the queue first, so spawn order is queue order
+        for index in range(count):
+            vehicle = Vehicle(index % LANES, 'car', direction, False)
+            back = (index // LANES) * (vehicle.size[0] + SimulationConfig.GAP)
+            x, y = vehicle.position
+            if dx:
+                vehicle.position = (vehicle.stop_position - dx * back, y)
+            else:
+                vehicle.position = (x, vehicle.stop_position - dy * back)
+            simulation._add_vehicle(vehicle)
+    window = simulation.counters.flow_window
+    crossings = [round(rate * window) for rate in state['flow_rates']]
+    simulation.counters.load_history(
+        [[int(tick < count) for count in crossings] for tick in range(window)])
+    return simulation
+
+
+async def rollout_delay(state: Dict, plan: List[float], seed: int, horizon: int) -> int:
+    # Vehicle-ticks spent waiting over the horizon
+    simulation = build_simulation(state, plan, seed)
+    delay = 0
+    for _ in range(horizon):
+        await simulation.update()
+        delay += sum(simulation.counters.waiting)
+    return delay
+
+
+def candidate_plans(state: Dict) -> List[List[int]]:
+    plans = []
+    for controller in CONTROLLERS.values():
+        plan = controller().timing(state)['green_times']
+        if plan not in plans:
+            plans.append(plan)
+    return plans
+
+
+def best_plan(task: tuple) -> List[int]:
+    levels, queue_edges, flow_edges, horizon, seed = task
+    state = cell_state(levels, queue_edges, flow_edges)
+
+    async def evaluate():
+        # Every candidate sees the same seed, so only the plan differs between rollouts;
+        # ties go to the earlier candidate (the fixed plan first)
+        scored = []
+        for plan in candidate_plans(state):
+            scored.append((await rollout_delay(state, plan, seed, horizon), plan))
+        return min(scored, key=lambda item: item[0])[1]
+
+    return asyncio.run(evaluate())
+
+
+def distill_policy(queue_edges: Sequence[float] = (0, 2, 5),
+                   flow_edges: Sequence[float] = (0.0, 0.05), horizon: int = 100,
+                   seed: int = 0, sample: Optional[int] = None,
+                   workers: Optional[int] = None) -> PolicyTable:
+    capacity = min(queue_capacity(direction) for direction in DIRECTIONS)
+    if max(queue_edges) > capacity:
+        raise ValueError(f"queue edges above {capacity} cars don't fit between the spawn "
+                         f"point and the stop line")
+    cells = [queues + flows
+             for queues in itertools.product(range(len(queue_edges)), repeat=4)
+             for flows in itertools.product(range(len(flow_edges)), repeat=4)]
+    if sample is not None and sample < len(cells):
+        cells = sorted(random.Random(seed).sample(cells, sample))
+    tasks = [(levels, list(queue_edges), list(flow_edges), horizon, seed) for levels in cells]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        plans = [best_plan(task) for task in tasks]
+    else:
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            plans = list(executor.map(best_plan, tasks, chunksize=chunksize))
+    return PolicyTable(queue_edges, flow_edges, np.array(cells), np.array(plans))
+
+
+def main(argv: Optional[List[str]] = None) -> PolicyTable:
+    parser = argparse.ArgumentParser(
+        description="Sweep quantized traffic states offline and write a lookup-table policy")
+    parser.add_argument('--out', default='policy_table.npz')
+    parser.add_argument('--queue-edges', type=float, nargs='+', default=[0, 2, 5],
+                        help="lower edges of the waiting-vehicle levels per approach")
+    parser.add_argument('--flow-edges', type=float, nargs='+', default=[0.0, 0.05],
+                        help="lower edges of the flow-rate levels per approach (vehicles/tick)")
+    parser.add_argument('--horizon', type=int, default=100, help="ticks per rollout")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sample', type=int, default=None,
+                        help="sweep only this many random cells; the rest use nearest neighbours")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    capacity = min(queue_capacity(direction) for direction in DIRECTIONS)
+    if max(args.queue_edges) > capacity:
+        parser.error(f"--queue-edges can't go above {capacity}: longer queues don't fit "
+                     f"between the spawn point and the stop line")
+
+    start = time.perf_counter()
+    table = distill_policy(args.queue_edges, args.flow_edges, args.horizon, args.seed,
+                           args.sample, args.workers)
+    table.save(args.out)
+    print(f"Swept {len(table.cells)} of {int(np.prod(table.shape))} cells in "
+          f"{time.perf_counter() - start:.1f} s; wrote {args.out}")
+    return table
+
+
+if __name__ == "__main__":
+    main()
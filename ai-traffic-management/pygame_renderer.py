@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pygame
+
+from traffic_core import VEHICLE_CONFIGS
+
+SCREEN_SIZE = (900, 600)
+ROAD_COLOR = (85, 85, 85)
+SIGNAL_POSITIONS = [(300, 150), (600, 150), (600, 450), (300, 450)]
+SIGNAL_RADIUS = 10
+MAX_RAIN_DROPS = 100
+
+
+class PygameRenderer:
+    # Draws a simulation onto a pygame surface without redrawing the whole screen.
+    # The road layer is rendered once; fog is a single reusable overlay that is
+    # composited into that layer (and into the vehicle sprites) only when its
+    # intensity changes. Each vehicle is a blit of a cached sprite, and only the
+    # rectangles drawn this frame or last frame are restored and sent to the display.
+    def __init__(self, screen: Optional[pygame.Surface] = None, seed: Optional[int] = None,
+                 full_update_ratio: float = 0.5):
+        self.screen = screen if screen is not None else pygame.display.get_surface()
+        self.size = self.screen.get_size()
+        self.rng = random.Random(seed)  # rain only; never the simulation's
+        # Past this share of the screen, one full flip is cheaper than many rects
+        self.full_update_ratio = full_update_ratio
+        self.clock = pygame.time.Clock()  # ticked by whoever paces the frames
+        self.road = self._draw_road()
+        self.fog_overlay = pygame.Surface(self.size)
+        self.fog_overlay.fill((255, 255, 255))
+        self.fog_alpha = None
+        self.background = self.road
+        self._sprites: Dict[tuple, pygame.Surface] = {}
+        self._previous: List[pygame.Rect] = []
+        self._full_redraw = True
+
+    def _draw_road(self) -> pygame.Surface:
+        road = pygame.Surface(self.size).convert()
+        road.fill(ROAD_COLOR)
+        pygame.draw.rect(road, (0, 0, 0), (300, 150, 300, 300), 2)  # Intersection
+        for y in range(150, 451, 20):  # Horizontal road markings
+            pygame.draw.line(road, (255, 255, 255), (0, y), (900, y), 1)
+        for x in range(300, 601, 20):  # Vertical road markings
+            pygame.draw.line(road, (255, 255, 255), (x, 0), (x, 600), 1)
+        return road
+
+    def _set_fog(self, intensity: float) -> None:
+        alpha = int(intensity * 100) if intensity > 0.3 else 0
+        if alpha == self.fog_alpha:
+            return
+        self.fog_alpha = alpha
+        self.background = self._fogged(self.road)
+        self._sprites.clear()
+        self._full_redraw = True
+
+    def _fogged(self, surface: pygame.Surface) -> pygame.Surface:
+        if not self.fog_alpha:
+            return surface
+        fogged = surface.copy()
+        self.fog_overlay.set_alpha(self.fog_alpha)
+        fogged.blit(self.fog_overlay, (0, 0), fogged.get_rect())
+        return fogged
+
+    def sprite(self, color, size: Tuple[int, int]) -> pygame.Surface:
+        key = (color, size)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            sprite = pygame.Surface(size).convert()
+            sprite.fill(pygame.Color(color))
+            sprite = self._sprites[key] = self._fogged(sprite)
+        return sprite
+
+    def _vehicle_blits(self, vehicles) -> list:
+        arrays_x = getattr(vehicles, 'x', None)
+        if arrays_x is not None:
+            # VehicleArrays: read the columns instead of building a view per vehicle
+            sprites = [self.sprite(VEHICLE_CONFIGS['colors'].get(name, 'gray'),
+                                   VEHICLE_CONFIGS['sizes'].get(name, (30, 20)))
+                       for name in vehicles.type_names]
+            count = vehicles.count
+            return [(sprites[code], (x, y)) for code, x, y in zip(
+                vehicles.type[:count].tolist(), arrays_x[:count].tolist(),
+                vehicles.y[:count].tolist())]
+        return [(self.sprite(vehicle.color, tuple(vehicle.size)), vehicle.position)
+                for vehicle in vehicles]
+
+    def draw(self, vehicles, signal_colors: Sequence, weather: Dict) -> List[pygame.Rect]:
+        self._set_fog(weather['fog'])
+        screen = self.screen
+        if self._full_redraw:
+            screen.blit(self.background, (0, 0))
+        else:
+            for rect in self._previous:
+                screen.blit(self.background, rect, rect)
+
+        drawn = screen.blits(self._vehicle_blits(vehicles))
+        for position, color in zip(SIGNAL_POSITIONS, signal_colors):
+            drawn.append(pygame.draw.circle(screen, self._fogged_color(color), position,
+                                            SIGNAL_RADIUS))
+        if weather['rain'] > 0.3:
+            rain = self._fogged_color((0, 0, 255))
+            width, height = self.size
+            for _ in range(int(weather['rain'] * MAX_RAIN_DROPS)):
+                x = self.rng.randint(0, width)
+                y = self.rng.randint(0, height)
+                drawn.append(pygame.draw.line(screen, rain, (x, y), (x - 5, y - 5), 1))
+
+        dirty = self._previous + drawn
+        self._previous = drawn
+        if self._full_redraw:
+            self._full_redraw = False
+            return [screen.get_rect()]
+        return dirty
+
+    def _fogged_color(self, color) -> pygame.Color:
+        color = pygame.Color(color)
+        if self.fog_alpha:
+            color = color.lerp((255, 255, 255), self.fog_alpha / 255)
+        return color
+
+    def render(self, simulation) -> List[pygame.Rect]:
+        dirty = self.draw(simulation.vehicles,
+                          [simulation._get_signal_color(i) for i in range(len(SIGNAL_POSITIONS))],
+                          simulation.weather.conditions)
+        self.present(dirty)
+        return dirty
+
+    def present(self, dirty: List[pygame.Rect]) -> None:
+        area = sum(rect.width * rect.height for rect in dirty)
+        if area > self.full_update_ratio * self.size[0] * self.size[1]:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
+
+    @property
+    def fps(self) -> float:
+        return self.clock.get_fps()
+
+
+def main(argv: Optional[List[str]] = None) -> float:
+    from headless import ENGINES, OPTIMIZERS, create_simulation
+
+    parser = argparse.ArgumentParser(
+        description="Show a headless engine in a pygame window with the cached renderer")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='vectorized')
+    parser.add_argument('--optimizer', choices=sorted(OPTIMIZERS), default='fixed')
+    parser.add_argument('--vehicles', type=int, default=1000,
+                        help="vehicle cap; the spawn rate is raised to reach it quickly")
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--frames', type=int, default=None, help="stop after this many frames")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    pygame.display.set_caption("Traffic Simulation")
+    # Built like a headless run, so optimizers that plan ahead get attached
+    simulation = create_simulation(args.engine, args.optimizer, max_vehicles=args.vehicles,
+                                   seed=args.seed, spawn_probability=1.0)
+    renderer = PygameRenderer(screen, seed=args.seed)
+    loop = asyncio.new_event_loop()
+    frames = 0
+    try:
+        while args.frames is None or frames < args.frames:
+            if any(event.type == pygame.QUIT for event in pygame.event.get()):
+                break
+            loop.run_until_complete(simulation.update())
+            renderer.render(simulation)
+            frames += 1
+            if frames % 60 == 0:
+                pygame.display.set_caption(f"Traffic Simulation - {len(simulation.vehicles)} "
+                                           f"vehicles, {renderer.fps:.0f} fps")
+            renderer.clock.tick(args.fps)  # caps the frame rate
+    finally:
+        loop.close()
+        pygame.quit()
+    return renderer.fps
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PatchCollection, PolyCollection
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle, Rectangle
+
+from traffic_core import VEHICLE_CONFIGS
+
+SIGNAL_POSITIONS = [(300, 150), (600, 150), (600, 450), (300, 450)]
+MAX_RAIN_DROPS = 100
+
+
+class IntersectionRenderer:
+    # One persistent figure per simulation. The road, lane markings and intersection
+    # box are drawn once and kept as a pixel buffer; each frame restores that buffer
+    # and draws only what moves: every vehicle as one polygon collection, the signals
+    # as one patch collection and the rain as one line collection, all updated in
+    # place. render_image() gives the frame as an RGBA array; figure() gives the
+    # Figure itself for code that wants to savefig or st.pyplot it.
+    def __init__(self, figsize: Tuple[float, float] = (10, 10), dpi: float = 100,
+                 seed: Optional[int] = None):
+        self.fig = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        self.rng = np.random.default_rng(seed)  # rain only; never the simulation's
+        self._rgba: Dict[str, tuple] = {}
+        self._background = None
+        self._draw_infrastructure()
+
+        # zorder keeps full draws (figure()) stacked like the blitted frames
+        self.vehicles = PolyCollection([], linewidths=0, zorder=3)
+        self.signals = PatchCollection([Circle(pos, 10) for pos in SIGNAL_POSITIONS],
+                                       facecolors='red', linewidths=0, zorder=4)
+        self.rain = LineCollection([], colors='b', alpha=0.3, zorder=5)
+        self.fog = Rectangle((0, 0), 900, 600, color='white', visible=False, zorder=6)
+        for collection in (self.vehicles, self.signals, self.rain):
+            self.ax.add_collection(collection)
+        self.ax.add_patch(self.fog)
+        self.dynamic = [self.vehicles, self.signals, self.rain, self.fog]
+
+    def _draw_infrastructure(self):
+        ax = self.ax
+        ax.set_xlim(0, 900)
+        ax.set_ylim(0, 600)
+        ax.set_facecolor('#555555')  # Dark gray for road
+        ax.add_patch(Rectangle((300, 150), 300, 300, fill=False, color='black'))
+        markings = ([[(0, y), (900, y)] for y in range(150, 451, 20)] +
+                    [[(x, 0), (x, 600)] for x in range(300, 601, 20)])
+        ax.add_collection(LineCollection(markings, colors='w', linestyles='--', alpha=0.5))
+
+    def _color(self, name: str) -> tuple:
+        rgba = self._rgba.get(name)
+        if rgba is None:
+            rgba = self._rgba[name] = to_rgba(name)
+        return rgba
+
+    def update(self, simulation) -> None:
+        vehicles = simulation.vehicles
+        if getattr(vehicles, 'x', None) is not None:
+            boxes, colors = self._column_boxes(vehicles)
+        else:
+            vehicles = list(vehicles)
+            boxes = np.empty((len(vehicles), 4, 2))
+            for i, vehicle in enumerate(vehicles):
+                x, y = vehicle.position
+                width, height = vehicle.size
+                boxes[i] = ((x, y), (x + width, y), (x + width, y + height), (x, y + height))
+            colors = [vehicle.color for vehicle in vehicles]
+        self.update_artists(
+            boxes, colors,
+            [simulation._get_signal_color(i) for i in range(len(SIGNAL_POSITIONS))],
+            simulation.weather.conditions)
+
+    def _column_boxes(self, vehicles) -> tuple:
+        # VehicleArrays or a trace frame: build every rectangle from the columns at once
+        names = vehicles.type_names
+        sizes = np.array([VEHICLE_CONFIGS['sizes'].get(name, (30, 20)) for name in names],
+                         dtype=np.float64).reshape(-1, 2)
+        palette = [VEHICLE_CONFIGS['colors'].get(name, 'gray') for name in names]
+        count = vehicles.count
+        codes = np.asarray(vehicles.type[:count], dtype=np.intp)
+        x = np.asarray(vehicles.x[:count], dtype=np.float64)
+        y = np.asarray(vehicles.y[:count], dtype=np.float64)
+        width, height = sizes[codes, 0], sizes[codes, 1]
+        boxes = np.stack([np.stack([x, y], axis=1), np.stack([x + width, y], axis=1),
+                          np.stack([x + width, y + height], axis=1),
+                          np.stack([x, y + height], axis=1)], axis=1)
+        return boxes, [palette[code] for code in codes.tolist()]
+
+    def update_artists(self, boxes: np.ndarray, colors: Sequence[str],
+                       signal_colors: Sequence[str], weather: Dict) -> None:
+        # boxes is (vehicles, 4, 2): the corners of each vehicle rectangle
+        self.vehicles.set_verts(boxes)
+        self.vehicles.set_facecolors([self._color(color) for color in colors])
+        self.signals.set_facecolors([self._color(color) for color in signal_colors])
+
+        rain = weather['rain']
+        if rain > 0.3:
+            drops = int(rain * MAX_RAIN_DROPS)
+            start = self.rng.uniform((0, 0), (900, 600), size=(drops, 2))
+            self.rain.set_segments(np.stack([start, start - 5], axis=1))
+            self.rain.set_visible(True)
+        else:
+            self.rain.set_visible(False)
+
+        fog = weather['fog']
+        self.fog.set_visible(fog > 0.3)
+        self.fog.set_alpha(fog * 0.3)
+
+    def _cache_background(self) -> None:
+        # Draw once with the moving artists hidden and keep the pixels
+        visible = [artist.get_visible() for artist in self.dynamic]
+        for artist in self.dynamic:
+            artist.set_visible(False)
+        self.canvas.draw()
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        for artist, was_visible in zip(self.dynamic, visible):
+            artist.set_visible(was_visible)
+
+    def render_image(self, simulation=None) -> np.ndarray:
+        if simulation is not None:
+            self.update(simulation)
+        if self._background is None:
+            self._cache_background()
+        self.canvas.restore_region(self._background)
+        for artist in self.dynamic:
+            self.ax.draw_artist(artist)
+        return np.asarray(self.canvas.buffer_rgba()).copy()
+
+    def figure(self, simulation=None) -> Figure:
+        if simulation is not None:
+            self.update(simulation)
+        return self.fig
@@ -0,0 +1,125 @@
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+@dataclass
+class LoopStats:
+    ticks: int = 0
+    frames: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def sim_rate(self) -> float:
+        return self.ticks / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def render_rate(self) -> float:
+        return self.frames / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class FixedTimestepLoop:
+    # Advances a simulation at a fixed rate independent of rendering. The model
+    # always steps one tick at a time; rendering happens every `render_every`
+    # ticks or at `render_fps` frames per wall-clock second, whichever is set.
+    # In time-warp mode ticks run back to back and only rendering is paced.
+    def __init__(self, simulation, tick_rate: float = 10.0, speed: float = 1.0,
+                 time_warp: bool = False, render_every: Optional[int] = None,
+                 render_fps: Optional[float] = None, on_render: Optional[Callable] = None,
+                 max_catch_up: int = 100, clock: Callable[[], float] = time.perf_counter):
+        self.simulation = simulation
+        self.tick_rate = tick_rate
+        self.speed = speed
+        self.time_warp = time_warp
+        self.render_every = render_every
+        self.render_fps = render_fps
+        self.on_render = on_render
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.stats = LoopStats()
+        self._running = False
+
+    @property
+    def tick_interval(self) -> float:
+        return 1.0 / (self.tick_rate * self.speed)
+
+    def stop(self):
+        self._running = False
+
+    def _render_due(self, now: float, last_render: float, ticks_since_render: int) -> bool:
+        if ticks_since_render == 0:
+            return False
+        if self.render_every is not None:
+            return ticks_since_render >= self.render_every
+        if self.render_fps is not None:
+            return now - last_render >= 1.0 / self.render_fps
+        return True
+
+    async def _render(self):
+        if self.on_render is not None:
+            result = self.on_render()
+            if inspect.isawaitable(result):
+                await result
+        self.stats.frames += 1
+
+    async def run(self, ticks: Optional[int] = None, duration: Optional[float] = None) -> LoopStats:
+        self.stats = LoopStats()
+        self._running = True
+        start = self.clock()
+        next_tick = start
+        last_render = start
+        ticks_since_render = 0
+
+        while self._running:
+            if ticks is not None and self.stats.ticks >= ticks:
+                break
+            now = self.clock()
+            if duration is not None and now - start >= duration:
+                break
+
+            if self.time_warp:
+                # Step until a frame is due; the clock is cheap next to a tick
+                while self._running and (ticks is None or self.stats.ticks < ticks):
+                    await self.simulation.update()
+                    self.stats.ticks += 1
+                    ticks_since_render += 1
+                    now = self.clock()
+                    if self._render_due(now, last_render, ticks_since_render):
+                        break
+                    if duration is not None and now - start >= duration:
+                        break
+                next_tick = now
+            else:
+                steps = 0
+                while next_tick <= now and steps < self.max_catch_up:
+                    if ticks is not None and self.stats.ticks >= ticks:
+                        break
+                    await self.simulation.update()
+                    self.stats.ticks += 1
+                    ticks_since_render += 1
+                    next_tick += self.tick_interval
+                    steps += 1
+                if steps == self.max_catch_up:
+                    # Too far behind to catch up; drop the backlog instead of spiralling
+                    next_tick = self.clock()
+                now = self.clock()
+
+            if self._render_due(now, last_render, ticks_since_render):
+                await self._render()
+                last_render = self.clock()
+                ticks_since_render = 0
+
+            self.stats.elapsed = self.clock() - start
+            if self.time_warp:
+                await asyncio.sleep(0)
+            else:
+                wake = next_tick
+                if self.render_fps is not None and self.render_every is None:
+                    wake = min(wake, last_render + 1.0 / self.render_fps)
+                await asyncio.sleep(max(0.0, wake - self.clock()))
+
+        self.stats.elapsed = self.clock() - start
+        self._running = False
+        return self.stats
@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import io
+import struct
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from snapshot import encode_snapshot, decode_snapshot
+from sim_loop import FixedTimestepLoop
+from trace_replay import TraceFrame, TraceVehicles, VEHICLE_COLUMNS, tick_row, vehicle_columns
+
+# Frames go out as a 4-byte big-endian length followed by a snapshot-encoded
+# message: the header carries the tick, signals, weather and the sidebar stats, the
+# arrays carry the vehicle columns of trace_replay.py and, optionally, the frame
+# already rendered to an image so viewers only have to display it.
+_LENGTH = struct.Struct('>I')
+
+
+def encode_frame(simulation, stats: Dict, image: Optional[bytes] = None) -> bytes:
+    type_names: List[str] = []
+    type_codes: Dict[str, int] = {}
+
+    def type_code(name: str) -> int:
+        if name not in type_codes:
+            type_codes[name] = len(type_names)
+            type_names.append(name)
+        return type_codes[name]
+
+    arrays = vehicle_columns(simulation.vehicles, type_code)
+    arrays['tick'] = tick_row(simulation, 0, len(arrays['x']))
+    if image is not None:
+        arrays['image'] = np.frombuffer(image, dtype=np.uint8)
+    return encode_snapshot({'type_names': type_names, 'stats': stats}, arrays)
+
+
+class SharedFrame(TraceFrame):
+    # A published frame: draws like a trace frame and carries the publisher's stats
+    def __init__(self, data: bytes):
+        header, arrays = decode_snapshot(data)
+        columns = {name: arrays[name] for name in VEHICLE_COLUMNS}
+        super().__init__(arrays['tick'][0], TraceVehicles(columns, header['type_names']))
+        self.stats: Dict = header['stats']
+        self.image: Optional[bytes] = arrays['image'].tobytes() if 'image' in arrays else None
+
+
+class _Subscriber:
+    # Latest-wins slot: a viewer that can't keep up skips frames instead of queueing them
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.pending: Optional[bytes] = None
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, frame: bytes) -> None:
+        if self.pending is not None:
+            self.dropped += 1
+        self.pending = frame
+        self.ready.set()
+
+
+class FramePublisher:
+    # Local pub/sub channel over TCP. Each frame is encoded once by the caller and
+    # handed to every subscriber, so adding viewers costs a socket write each and
+    # nothing on the simulation side.
+    def __init__(self):
+        self.subscribers: Set[_Subscriber] = set()
+        self.latest: Optional[bytes] = None
+        self.published = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._closing = False
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8766) -> Tuple[str, int]:
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    def publish(self, frame: bytes) -> None:
+        self.latest = frame
+        self.published += 1
+        for subscriber in self.subscribers:
+            subscriber.offer(frame)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriber = _Subscriber(writer)
+        self.subscribers.add(subscriber)
+        if self.latest is not None:
+            subscriber.offer(self.latest)  # new viewers see the current state straight away
+        try:
+            while True:
+                await subscriber.ready.wait()
+                subscriber.ready.clear()
+                if self._closing:
+                    break
+                frame, subscriber.pending = subscriber.pending, None
+                writer.write(_LENGTH.pack(len(frame)) + frame)
+                await writer.drain()
+                subscriber.sent += 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.subscribers.discard(subscriber)
+            writer.close()
+
+    async def close(self) -> None:
+        self._closing = True
+        for subscriber in self.subscribers:
+            subscriber.ready.set()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def stats(self) -> Dict:
+        return {
+            'subscribers': len(self.subscribers),
+            'published': self.published,
+            'dropped': sum(subscriber.dropped for subscriber in self.subscribers),
+        }
+
+
+class FrameSubscriber:
+    # Viewer side of the channel
+    def __init__(self, host: str = '127.0.0.1', port: int = 8766):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self) -> 'FrameSubscriber':
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def next_frame(self) -> SharedFrame:
+        (length,) = _LENGTH.unpack(await self._reader.readexactly(_LENGTH.size))
+        return SharedFrame(await self._reader.readexactly(length))
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._writer = None
+
+    async def __aenter__(self) -> 'FrameSubscriber':
+        return await self.connect()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+
+def parse_address(address: str, default_port: int = 8766) -> Tuple[str, int]:
+    # "host:port", "host" or just "port"
+    host, _, port = address.rpartition(':')
+    if host:
+        return host, int(port)
+    if port.isdigit():
+        return '127.0.0.1', int(port)
+    return port or '127.0.0.1', default_port
+
+
+class SimulationServer:
+    # Runs the one shared simulation and publishes a frame at the render rate. The
+    # frame is rendered here once (when `render` is set) instead of once per viewer.
+    def __init__(self, simulation, publisher: Optional[FramePublisher] = None,
+                 tick_rate: float = 10.0, speed: float = 1.0, time_warp: bool = False,
+                 publish_fps: float = 10.0, render: bool = True, image_format: str = 'JPEG'):
+        self.simulation = simulation
+        self.publisher = publisher if publisher is not None else FramePublisher()
+        self.render = render
+        # JPEG encodes a 1000x1000 frame about three times faster than PNG
+        self.image_format = image_format
+        self.loop = FixedTimestepLoop(simulation, tick_rate=tick_rate, speed=speed,
+                                      time_warp=time_warp, render_fps=publish_fps,
+                                      on_render=self.publish)
+        self.encode_time = 0.0
+
+    def frame_stats(self) -> Dict:
+        simulation = self.simulation
+        stats = simulation.stats
+        waiting_times = stats['waiting_times']
+        frame_stats = {
+            'total_vehicles': stats['total_vehicles'],
+            'average_wait_time': waiting_times.mean,
+            'wait_time_p95': waiting_times.percentile(95),
+            'throughput': stats['throughput'][-1] if stats['throughput'] else 0.0,
+            'time_elapsed': simulation.time_elapsed,
+            'sim_rate': self.loop.stats.sim_rate,
+            'publish_rate': self.loop.stats.render_rate,
+            'viewers': len(self.publisher.subscribers),
+        }
+        optimizer = simulation.ai_optimizer
+        if hasattr(optimizer, 'plan_version'):
+            frame_stats['plans_applied'] = optimizer.plan_version
+        inner = getattr(optimizer, 'optimizer', optimizer)
+        if hasattr(inner, 'metrics'):
+            metrics = inner.metrics.snapshot()
+            frame_stats.update(
+                cache_hit_rate=inner.cache.hit_rate,
+                backend_circuit=inner.breaker.state,
+                backend_latency_p95=metrics['latency']['backend']['p95'],
+                fallback_rate=metrics['rates']['fallback_rate'],
+            )
+        return frame_stats
+
+    def publish(self) -> None:
+        if not self.publisher.subscribers:
+            return  # nobody is watching; skip rendering and encoding
+        start = time.perf_counter()
+        image = None
+        if self.render:
+            from PIL import Image
+            buffer = io.BytesIO()
+            pixels = self.simulation.render_image()[:, :, :3]
+            Image.fromarray(pixels).save(buffer, self.image_format)
+            image = buffer.getvalue()
+        self.publisher.publish(encode_frame(self.simulation, self.frame_stats(), image))
+        self.encode_time += time.perf_counter() - start
+
+    async def run(self, host: str = '127.0.0.1', port: int = 8766,
+                  ticks: Optional[int] = None, duration: Optional[float] = None):
+        address = await self.publisher.start(host, port)
+        print(f"Publishing simulation frames on {address[0]}:{address[1]}")
+        try:
+            return await self.loop.run(ticks=ticks, duration=duration)
+        finally:
+            await self.publisher.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    from headless import ENGINES, OPTIMIZERS, create_simulation
+    from background_optimizer import BackgroundOptimizer
+
+    parser = argparse.ArgumentParser(
+        description="Run one shared simulation and publish its frames to any number of viewers")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='object')
+    parser.add_argument('--optimizer', choices=sorted(OPTIMIZERS), default='ai')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--time-warp', action='store_true')
+    parser.add_argument('--fps', type=float, default=10.0, help="frames published per second")
+    parser.add_argument('--no-render', action='store_true',
+                        help="publish vehicle columns only and let viewers draw them")
+    args = parser.parse_args(argv)
+
+    simulation = create_simulation(args.engine, args.optimizer, seed=args.seed)
+    # Like the Streamlit page: the model answers in the background
+    simulation.ai_optimizer = BackgroundOptimizer(simulation.ai_optimizer)
+    server = SimulationServer(simulation, speed=args.speed, time_warp=args.time_warp,
+                              publish_fps=args.fps, render=not args.no_render)
+    try:
+        asyncio.run(server.run(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import json
+import struct
+from typing import Dict, Tuple
+
+import numpy as np
+
+# Layout: prefix (magic, version, header length), JSON header, then raw array blocks
+# whose offsets and dtypes are listed in the header
+MAGIC = b'TSIM'
+VERSION = 1
+_PREFIX = struct.Struct('<4sHI')
+
+VEHICLE_DTYPE = np.dtype([
+    ('x', '<f8'),
+    ('y', '<f8'),
+    ('speed', '<f8'),
+    ('creation_time', '<f8'),
+    ('wait_time', '<i8'),
+    ('lane', '<i2'),
+    ('type', '<i2'),
+    ('direction', 'i1'),
+    ('crossed', '?'),
+    ('priority', '?'),
+    ('will_turn', '?'),
+    ('turned', '?'),
+])
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def encode_snapshot(header: Dict, arrays: Dict[str, np.ndarray]) -> bytes:
+    layout = {}
+    offset = 0
+    blocks = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        layout[name] = {
+            'offset': offset,
+            'shape': list(array.shape),
+            'dtype': np.lib.format.dtype_to_descr(array.dtype),
+        }
+        blocks.append(array.tobytes())
+        offset += array.nbytes
+
+    header_bytes = json.dumps(dict(header, arrays=layout), separators=(',', ':')).encode()
+    return b''.join([_PREFIX.pack(MAGIC, VERSION, len(header_bytes)), header_bytes] + blocks)
+
+
+def decode_snapshot(data: bytes) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    if len(data) < _PREFIX.size:
+        raise SnapshotError("Snapshot is truncated")
+    magic, version, header_length = _PREFIX.unpack_from(data)
+    if magic != MAGIC:
+        raise SnapshotError("Not a traffic simulation snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version}")
+
+    start = _PREFIX.size + header_length
+    header = json.loads(data[_PREFIX.size:start])
+    arrays = {}
+    for name, block in header.pop('arrays').items():
+        dtype = np.lib.format.descr_to_dtype(block['dtype'])
+        count = int(np.prod(block['shape']))
+        arrays[name] = np.frombuffer(data, dtype=dtype, count=count,
+                                     offset=start + block['offset']).reshape(block['shape'])
+    return header, arrays
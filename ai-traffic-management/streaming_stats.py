@@ -0,0 +1,281 @@
+import math
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class RingBuffer:
+    # Fixed-size window over the most recent values; indexes and slices like a list
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._values = np.zeros(capacity, dtype=np.float64)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value: float) -> None:
+        end = (self._start + self._size) % self.capacity
+        self._values[end] = value
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def extend(self, values: np.ndarray) -> None:
+        combined = np.concatenate([self.to_array(), np.asarray(values, dtype=np.float64)])
+        combined = combined[-self.capacity:]
+        self._values[:combined.size] = combined
+        self._start = 0
+        self._size = combined.size
+
+    def to_array(self) -> np.ndarray:
+        return np.roll(self._values, -self._start)[:self._size]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_array()[index].tolist()
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("ring buffer index out of range")
+        return float(self._values[(self._start + index) % self.capacity])
+
+    def __iter__(self):
+        return iter(self.to_array().tolist())
+
+    def clear(self) -> None:
+        self._start = 0
+        self._size = 0
+
+
+class RunningStats:
+    # Welford's online mean and variance
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: 'RunningStats') -> None:
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class QuantileSketch:
+    # Log-bucketed sketch (DDSketch style): quantiles are within relative_accuracy of
+    # the true value, memory depends only on the value range, and sketches merge exactly
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        # Fold the lowest buckets together; upper percentiles stay accurate
+        keys = sorted(self.buckets)
+        excess = len(keys) - self.max_buckets + 1
+        folded = sum(self.buckets.pop(key) for key in keys[:excess])
+        self.buckets[keys[excess]] += folded
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class StreamingSeries:
+    # Replaces an ever-growing list: recent values in a ring buffer plus aggregates
+    # over everything ever appended, all in constant memory
+    def __init__(self, window: int = 1000, quantiles: bool = False):
+        self.recent = RingBuffer(window)
+        self.running = RunningStats()
+        self.sketch: Optional[QuantileSketch] = QuantileSketch() if quantiles else None
+
+    def append(self, value: float) -> None:
+        self.recent.append(value)
+        self.running.add(value)
+        if self.sketch is not None:
+            self.sketch.add(value)
+
+    def __len__(self) -> int:
+        return len(self.recent)
+
+    def __getitem__(self, index):
+        return self.recent[index]
+
+    def __iter__(self):
+        return iter(self.recent)
+
+    @property
+    def count(self) -> int:
+        return self.running.count
+
+    @property
+    def mean(self) -> float:
+        return self.running.mean
+
+    @property
+    def std(self) -> float:
+        return self.running.std
+
+    def percentile(self, p: float) -> float:
+        if self.sketch is None:
+            raise ValueError("Series was created without quantile tracking")
+        return self.sketch.quantile(p / 100)
+
+    def summary(self) -> Dict:
+        summary = {
+            'count': self.count,
+            'mean': self.mean,
+            'std': self.std,
+            'min': self.running.min if self.count else 0.0,
+            'max': self.running.max if self.count else 0.0,
+        }
+        if self.sketch is not None:
+            summary.update(p50=self.percentile(50), p95=self.percentile(95),
+                           p99=self.percentile(99))
+        return summary
+
+    def get_state(self) -> Tuple[Dict, Dict[str, np.ndarray]]:
+        header = {
+            'window': self.recent.capacity,
+            'running': [self.running.count, self.running.mean, self.running.m2,
+                        self.running.min, self.running.max],
+        }
+        arrays = {'recent': self.recent.to_array()}
+        if self.sketch is not None:
+            header['sketch'] = [self.sketch.relative_accuracy, self.sketch.max_buckets,
+                                self.sketch.zero_count, self.sketch.count]
+            keys = sorted(self.sketch.buckets)
+            arrays['sketch_keys'] = np.array(keys, dtype=np.int64)
+            arrays['sketch_counts'] = np.array([self.sketch.buckets[key] for key in keys],
+                                               dtype=np.int64)
+        return header, arrays
+
+    def copy(self) -> 'StreamingSeries':
+        return StreamingSeries.from_state(*self.get_state())
+
+    @classmethod
+    def from_state(cls, header: Dict, arrays: Dict[str, np.ndarray]) -> 'StreamingSeries':
+        series = cls(header['window'], quantiles='sketch' in header)
+        series.recent.extend(arrays['recent'])
+        (series.running.count, series.running.mean, series.running.m2,
+         series.running.min, series.running.max) = header['running']
+        if series.sketch is not None:
+            relative_accuracy, max_buckets, zero_count, count = header['sketch']
+            series.sketch = QuantileSketch(relative_accuracy, max_buckets)
+            series.sketch.zero_count = zero_count
+            series.sketch.count = count
+            series.sketch.buckets = dict(zip(arrays['sketch_keys'].tolist(),
+                                             arrays['sketch_counts'].tolist()))
+        return series
+
+
+class TripStats:
+    # Per-vehicle accounting that every engine can produce, so engines that sample
+    # time differently can still be compared on the same KPIs
+    def __init__(self, window: int = 1000):
+        self.spawned = 0
+        self.crossed = 0
+        self.exited = 0
+        self.ticks = 0
+        self.vehicle_ticks = 0
+        self.crossing_waits = StreamingSeries(window, quantiles=True)
+
+    def record_spawn(self, count: int = 1) -> None:
+        self.spawned += count
+
+    def record_crossing(self, wait_time: float) -> None:
+        self.crossed += 1
+        self.crossing_waits.append(wait_time)
+
+    def record_exit(self, count: int = 1) -> None:
+        self.exited += count
+
+    def record_ticks(self, vehicles: int, ticks: int = 1) -> None:
+        self.ticks += ticks
+        self.vehicle_ticks += vehicles * ticks
+
+    def summary(self) -> Dict:
+        ticks = max(self.ticks, 1)
+        return {
+            'spawned': self.spawned,
+            'crossed': self.crossed,
+            'exited': self.exited,
+            'exit_rate': self.exited / ticks,
+            'mean_vehicles': self.vehicle_ticks / ticks,
+            'mean_crossing_wait': self.crossing_waits.mean,
+            'p95_crossing_wait': self.crossing_waits.percentile(95),
+        }
+
+    def get_state(self) -> Tuple[Dict, Dict[str, np.ndarray]]:
+        header, arrays = self.crossing_waits.get_state()
+        header['counts'] = [self.spawned, self.crossed, self.exited, self.ticks,
+                            self.vehicle_ticks]
+        return header, arrays
+
+    def copy(self) -> 'TripStats':
+        return TripStats.from_state(*self.get_state())
+
+    @classmethod
+    def from_state(cls, header: Dict, arrays: Dict[str, np.ndarray]) -> 'TripStats':
+        trips = cls(header['window'])
+        (trips.spawned, trips.crossed, trips.exited, trips.ticks,
+         trips.vehicle_ticks) = header['counts']
+        trips.crossing_waits = StreamingSeries.from_state(header, arrays)
+        return trips
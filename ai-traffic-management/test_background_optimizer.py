@@ -0,0 +1,100 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from background_optimizer import CircuitBreaker
+from traffic_core import AITrafficOptimizer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def open_breaker(clock: FakeClock) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_threshold_failures_in_a_row():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=clock)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert breaker.times_opened == 1
+    assert not breaker.allow()
+
+
+def test_half_open_admits_a_single_trial():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 9.9
+    assert not breaker.allow()
+    clock.now = 10.0
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+    assert breaker.trial_in_flight
+    assert not breaker.allow()  # only one trial at a time
+
+
+def test_trial_success_closes_and_failure_reopens():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 10.0
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert breaker.times_opened == 1  # still the same outage
+    clock.now = 20.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+
+
+def test_released_trial_lets_the_next_call_try():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 10.0
+    assert breaker.allow()
+    breaker.release_trial()
+    assert breaker.allow()
+
+
+def test_cancelled_trial_call_does_not_wedge_the_breaker():
+    clock = FakeClock()
+    optimizer = AITrafficOptimizer()
+    optimizer.breaker = open_breaker(clock)
+    clock.now = 10.0
+    answered = threading.Event()
+
+    def create(**kwargs):
+        answered.wait(5)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='20 20'))])
+
+    optimizer._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=create)))
+
+    async def cancel_trial():
+        task = asyncio.create_task(optimizer._get_ai_recommendation('state'))
+        await asyncio.sleep(0.05)
+        assert optimizer.breaker.trial_in_flight
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        answered.set()  # let the worker thread finish so the loop can shut down
+
+    asyncio.run(cancel_trial())
+    assert not optimizer.breaker.trial_in_flight
+    assert optimizer.breaker.allow()
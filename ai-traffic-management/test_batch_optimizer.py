@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from batch_optimizer import OptimizerBatcher
+from traffic_core import AITrafficOptimizer, SimulationConfig
+
+
+class ScriptedOptimizer(AITrafficOptimizer):
+    # Answers every backend request with a fixed reply instead of calling a model
+    def __init__(self, reply: str):
+        super().__init__()
+        self.reply = reply
+        self.contexts = []
+
+    async def _get_ai_recommendation(self, context: str) -> str:
+        self.contexts.append(context)
+        return self.reply
+
+
+def state(waiting: int) -> dict:
+    return {'waiting_vehicles': [waiting, 0, 0, 0], 'flow_rates': [0, 0, 0, 0],
+            'congestion': [0, 0, 0, 0], 'time_of_day': 8}
+
+
+@pytest.mark.parametrize('reply', [
+    '5 10 0 20',
+    '5, 10, 0, 20',
+    '[5,10,0,20]',
+    'Waiting: 5; 10; 0; 20.',
+])
+def test_parser_reads_numbers_however_they_are_separated(reply):
+    timing = AITrafficOptimizer()._parse_ai_response(reply)
+    assert timing['green_times'] == [30, 40, 20, 60]
+    assert timing['cycle_length'] == 150 + SimulationConfig.NUM_SIGNALS * SimulationConfig.DEFAULT_YELLOW
+
+
+def test_parser_skips_decimals_and_counts_replies_without_numbers():
+    optimizer = AITrafficOptimizer()
+    assert optimizer._parse_ai_response('2.5 5 5 5 5')['green_times'] == [30, 30, 30, 30]
+    optimizer._parse_ai_response('no idea')
+    assert optimizer.metrics.counters['parse_failures'] == 1
+
+
+def test_batch_reply_with_commas_is_parsed_per_intersection():
+    optimizer = ScriptedOptimizer('Intersection 1: 5, 10, 0, 20\nIntersection 2: 0, 0, 0, 0')
+    batcher = OptimizerBatcher(optimizer)
+
+    async def decide():
+        return await asyncio.gather(batcher.request(state(1)), batcher.request(state(2)))
+
+    first, second = asyncio.run(decide())
+    assert batcher.requests == 1
+    assert first['green_times'] == [30, 40, 20, 60]
+    assert second['green_times'] == [20, 20, 20, 20]
+    assert not optimizer.metrics.fallbacks
+
+
+def test_intersections_missing_from_the_reply_get_the_fallback():
+    optimizer = ScriptedOptimizer('Intersection 1: 5 10 0 20')
+    batcher = OptimizerBatcher(optimizer)
+
+    async def decide():
+        return await asyncio.gather(batcher.request(state(1)), batcher.request(state(2)))
+
+    _, second = asyncio.run(decide())
+    assert second == optimizer._get_fallback_timing()
+    assert optimizer.metrics.fallbacks['missing_from_batch'] == 1
+
+
+def test_cache_hits_are_timed_as_decisions():
+    optimizer = ScriptedOptimizer('Intersection 1: 5 10 0 20')
+    batcher = OptimizerBatcher(optimizer)
+
+    async def decide_twice():
+        await batcher.request(state(1))
+        return await batcher.request(state(1))
+
+    asyncio.run(decide_twice())
+    snapshot = optimizer.metrics.snapshot()
+    assert batcher.requests == 1
+    assert snapshot['counters']['cache_hits'] == 1
+    assert snapshot['latency']['decision']['count'] == snapshot['counters']['decisions'] == 2
@@ -0,0 +1,68 @@
+import asyncio
+import random
+
+import pytest
+
+from controllers import (ActuatedController, LocalOptimizer, MaxPressureController,
+                         PlanController, WebsterController, create_local_optimizer)
+from traffic_core import SignalOptimizer, SimulationConfig
+
+CONTROLLERS = [WebsterController, MaxPressureController, ActuatedController,
+               lambda: PlanController([0, 5, 45, 400])]
+
+
+def random_states(count: int = 200):
+    rng = random.Random(3)
+    states = [{'waiting_vehicles': [0] * 4, 'flow_rates': [0.0] * 4}]
+    for _ in range(count):
+        states.append({
+            'waiting_vehicles': [rng.randint(0, 80) for _ in range(4)],
+            'flow_rates': [rng.uniform(0, 1.5) for _ in range(4)],
+        })
+    return states
+
+
+@pytest.mark.parametrize('controller', CONTROLLERS,
+                         ids=['webster', 'max-pressure', 'actuated', 'plan'])
+def test_green_times_stay_within_bounds_and_cycle_adds_up(controller):
+    controller = controller()
+    for state in random_states():
+        timing = controller.timing(state)
+        green_times = timing['green_times']
+        assert len(green_times) == SimulationConfig.NUM_SIGNALS
+        assert all(isinstance(green, int) for green in green_times)
+        assert all(SimulationConfig.DEFAULT_MIN <= green <= SimulationConfig.DEFAULT_MAX
+                   for green in green_times)
+        assert timing['cycle_length'] == (sum(green_times) +
+                                          SimulationConfig.NUM_SIGNALS * SimulationConfig.DEFAULT_YELLOW)
+
+
+def test_webster_splits_green_by_demand():
+    timing = WebsterController().timing({'waiting_vehicles': [0, 0, 0, 0],
+                                         'flow_rates': [0.2, 0.05, 0.05, 0.05]})
+    assert timing['green_times'][0] == max(timing['green_times'])
+    assert timing['green_times'][1:] == [timing['green_times'][1]] * 3
+
+
+def test_max_pressure_serves_the_longest_queue():
+    state = {'waiting_vehicles': [3, 9, 1, 0], 'flow_rates': [0.0] * 4}
+    assert MaxPressureController().timing(state)['green_times'] == [
+        SimulationConfig.DEFAULT_MIN, SimulationConfig.DEFAULT_MAX,
+        SimulationConfig.DEFAULT_MIN, SimulationConfig.DEFAULT_MIN]
+    state['downstream'] = [0, 9, 0, 0]
+    assert MaxPressureController().timing(state)['green_times'][0] == SimulationConfig.DEFAULT_MAX
+
+
+def test_actuated_extends_to_max_while_vehicles_keep_arriving():
+    state = {'waiting_vehicles': [2, 0, 0, 0], 'flow_rates': [0.0, 0.5, 0.0, 0.0]}
+    assert ActuatedController().timing(state)['green_times'] == [
+        SimulationConfig.DEFAULT_MIN + 4, SimulationConfig.DEFAULT_MAX,
+        SimulationConfig.DEFAULT_MIN, SimulationConfig.DEFAULT_MIN]
+
+
+def test_local_optimizer_answers_with_its_controller():
+    optimizer = create_local_optimizer('webster')
+    assert isinstance(optimizer, SignalOptimizer) and isinstance(optimizer, LocalOptimizer)
+    state = random_states(1)[1]
+    assert asyncio.run(optimizer.get_optimal_timing(state)) == optimizer.controller.timing(state)
+    assert optimizer._get_fallback_timing()['green_times'] == [SimulationConfig.DEFAULT_GREEN] * 4
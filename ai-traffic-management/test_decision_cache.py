@@ -0,0 +1,81 @@
+from decision_cache import DecisionCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def state(waiting, congestion=(0.0, 0.0, 0.0, 0.0), hour=8):
+    return {'waiting_vehicles': list(waiting), 'flow_rates': [0.3, 0.1, 0.0, 0.2],
+            'congestion': list(congestion), 'time_of_day': hour}
+
+
+def plan(green: int) -> dict:
+    return {'green_times': [green] * 4, 'cycle_length': green * 4 + 20}
+
+
+def test_key_quantises_waiting_and_congestion_and_ignores_flow():
+    cache = DecisionCache(waiting_step=2, congestion_step=0.2)
+    base = cache.key(state([4, 0, 7, 1], [0.4, 0.0, 0.7, 0.1]))
+    near = state([5, 1, 6, 0], [0.45, 0.05, 0.65, 0.0])
+    near['flow_rates'] = [9.0, 9.0, 9.0, 9.0]
+    assert cache.key(near) == base
+    assert cache.key(state([6, 0, 7, 1], [0.4, 0.0, 0.7, 0.1])) != base
+    assert cache.key(state([4, 0, 7, 1], [0.6, 0.0, 0.7, 0.1])) != base
+    assert cache.key(state([4, 0, 7, 1], [0.4, 0.0, 0.7, 0.1], hour=9)) != base
+
+
+def test_entries_expire_after_the_ttl():
+    clock = FakeClock()
+    cache = DecisionCache(ttl=10.0, clock=clock)
+    cache.put('a', plan(20))
+    clock.now = 10.0
+    assert cache.get('a') == plan(20)
+    clock.now = 10.5
+    assert cache.get('a') is None
+    assert cache.expirations == 1 and len(cache) == 0
+    # Storing again restarts the clock for that entry
+    cache.put('a', plan(30))
+    clock.now = 20.0
+    assert cache.get('a') == plan(30)
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = DecisionCache(max_entries=2, clock=FakeClock())
+    cache.put('a', plan(10))
+    cache.put('b', plan(20))
+    cache.get('a')  # 'b' is now the least recently used
+    cache.put('c', plan(30))
+    assert cache.get('b') is None
+    assert cache.get('a') == plan(10) and cache.get('c') == plan(30)
+    assert cache.evictions == 1 and len(cache) == 2
+
+
+def test_hit_rate_counts_every_lookup():
+    clock = FakeClock()
+    cache = DecisionCache(ttl=5.0, clock=clock)
+    assert cache.hit_rate == 0.0
+    cache.get('a')  # miss
+    cache.put('a', plan(10))
+    cache.get('a')  # hit
+    cache.get('a')  # hit
+    clock.now = 6.0
+    cache.get('a')  # expired: a miss
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert cache.hit_rate == 0.5
+    assert cache.stats() == {'entries': 0, 'hits': 2, 'misses': 2, 'expirations': 1,
+                             'evictions': 0, 'hit_rate': 0.5}
+
+
+def test_cached_plans_are_copies():
+    cache = DecisionCache(clock=FakeClock())
+    timing = plan(10)
+    cache.put('a', timing)
+    timing['green_times'][0] = 99
+    returned = cache.get('a')
+    returned['green_times'][1] = 99
+    assert cache.get('a') == plan(10)
@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pytest
+
+from demand import APPROACHES, ArrivalSchedule, DemandProfile
+from event_simulation import EventDrivenSimulation
+from headless import FixedTimingOptimizer, run_simulation
+from traffic_core import VEHICLE_CONFIGS, TrafficSimulation
+from vectorized_simulation import VectorizedTrafficSimulation
+
+ENGINES = [TrafficSimulation, VectorizedTrafficSimulation, EventDrivenSimulation]
+TYPES = list(VEHICLE_CONFIGS['speeds'])
+WEEKDAY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'demand_profiles',
+                       'weekday.csv')
+
+
+def write(tmp_path, text):
+    path = tmp_path / 'profile.csv'
+    path.write_text(text)
+    return str(path)
+
+
+def test_unlisted_hours_keep_the_rates_before_them(tmp_path):
+    profile = DemandProfile.from_csv(write(tmp_path, "hour,right,down,left,up\n"
+                                                     "6,100,50,100,50\n"
+                                                     "9,10,20,30,40\n"))
+    assert profile.name == 'profile'
+    assert profile.rates[6:9].tolist() == [[100, 50, 100, 50]] * 3
+    assert profile.rates[9:].tolist() == [[10, 20, 30, 40]] * 15
+    # Hours before the first row wrap round from the last one
+    assert profile.rates[:6].tolist() == [[10, 20, 30, 40]] * 6
+
+
+def test_csv_round_trip(tmp_path):
+    profile = DemandProfile.from_csv(WEEKDAY)
+    path = str(tmp_path / 'copy.csv')
+    profile.to_csv(path)
+    assert np.array_equal(DemandProfile.from_csv(path).rates, profile.rates)
+
+
+@pytest.mark.parametrize('text, message', [
+    ("hour,right,down,left\n0,1,2,3\n", "missing column"),
+    ("hour,right,down,left,up\n24,1,2,3,4\n", "not in 0-23"),
+    ("hour,right,down,left,up\n3,1,x,3,4\n", "line 2"),
+    ("hour,right,down,left,up\n", "no demand rows"),
+    ("hour,right,down,left,up\n3,1,-2,3,4\n", "negative"),
+])
+def test_bad_csv_is_rejected(tmp_path, text, message):
+    with pytest.raises(ValueError, match=message):
+        DemandProfile.from_csv(write(tmp_path, text))
+
+
+def test_schedule_is_reproducible_and_independent_of_how_it_is_read():
+    profile = DemandProfile.from_csv(WEEKDAY)
+    first = ArrivalSchedule(profile, TYPES, seed=4, seconds_per_tick=10, block=500)
+    second = ArrivalSchedule(profile, TYPES, seed=4, seconds_per_tick=10, block=500)
+    for tick in range(2000):
+        first.arrive(tick)
+    for tick in range(0, 2000, 37):
+        second.arrive(tick)
+    second.arrive(1999)
+    assert first.arrived == second.arrived > 0
+    assert [list(queue) for queue in first.queues] == [list(queue) for queue in second.queues]
+
+
+def test_arrival_rate_matches_the_profile():
+    schedule = ArrivalSchedule(DemandProfile.constant(360), TYPES, seed=1)
+    schedule.arrive(36000 - 1)  # ten hours at 0.1 vehicles per tick per approach
+    assert schedule.arrived == pytest.approx(36000 * 0.1 * len(APPROACHES), rel=0.02)
+
+
+@pytest.mark.parametrize('engine', ENGINES, ids=lambda cls: cls.__name__)
+def test_engines_draw_the_same_arrivals(engine):
+    expected = ArrivalSchedule(DemandProfile.from_csv(WEEKDAY), TYPES, seed=9,
+                               seconds_per_tick=5, start_hour=7)
+    expected.arrive(999)
+    simulation = engine(FixedTimingOptimizer(), seed=1)
+    simulation.set_demand(DemandProfile.from_csv(WEEKDAY), seed=9, seconds_per_tick=5,
+                          start_hour=7)
+    run_simulation(simulation, 1000)
+    demand = simulation.demand
+    assert demand.arrived == expected.arrived
+    assert demand.arrived == demand.admitted + demand.queued + demand.dropped
+
+
+def test_full_entry_queues_drop_and_count_arrivals():
+    schedule = ArrivalSchedule(DemandProfile.constant(3600 * 3), TYPES, seed=2,
+                               lane_queue_limit=5)
+    schedule.arrive(99)
+    assert all(len(queue) == 5 for queue in schedule.queues[:3 * len(APPROACHES)])
+    assert schedule.queued == 5 * 3 * len(APPROACHES)
+    assert schedule.dropped == schedule.arrived - schedule.queued > 0
+    assert schedule.summary()['dropped_arrivals'] == schedule.dropped
+    copy = schedule.copy()
+    assert (copy.dropped, copy.lane_queue_limit) == (schedule.dropped, 5)
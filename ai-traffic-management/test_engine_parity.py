@@ -0,0 +1,41 @@
+import pytest
+
+from benchmarks import build
+from headless import FixedTimingOptimizer, run_simulation
+from traffic_core import TrafficSimulation
+from vectorized_simulation import VectorizedTrafficSimulation
+
+
+def kpis(simulation):
+    return {
+        'trips': simulation.trips.summary(),
+        'waiting_times': list(simulation.stats['waiting_times']),
+        'throughput': list(simulation.stats['throughput']),
+        'waiting': list(simulation.counters.waiting),
+        'vehicles': [(vehicle.direction, vehicle.lane, vehicle.position, vehicle.wait_time,
+                      vehicle.crossed) for vehicle in simulation.vehicles],
+    }
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_vectorized_engine_matches_the_object_engine(seed):
+    engines = [engine(FixedTimingOptimizer(), seed=seed)
+               for engine in (TrafficSimulation, VectorizedTrafficSimulation)]
+    for engine in engines:
+        engine.config.SPAWN_PROBABILITY = 0.6
+        run_simulation(engine, 1500)
+    assert kpis(engines[1]) == kpis(engines[0])
+
+
+def test_full_queues_resolve_like_the_object_engine():
+    # The populated scene has long waiting queues in every lane, so every tick goes
+    # through _resolve_waiting with leaders blocking the vehicles behind them
+    engines = [build(engine, 2000) for engine in ('object', 'vectorized')]
+    calls = []
+    resolve = engines[1]._resolve_waiting
+    engines[1]._resolve_waiting = lambda slots, step: calls.append(len(slots)) or resolve(slots, step)
+    for _ in range(3):
+        for engine in engines:
+            run_simulation(engine, 50)
+        assert kpis(engines[1]) == kpis(engines[0])
+    assert max(calls) > 50
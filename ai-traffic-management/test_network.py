@@ -0,0 +1,36 @@
+import pytest
+
+from network import NetworkSpec, partition, run_network
+
+TIMING_KEYS = ('ticks', 'elapsed', 'intersection_ticks_per_second')
+
+
+def run(spec: NetworkSpec, ticks: int, workers: int):
+    summary = run_network(spec, ticks, workers)
+    for key in TIMING_KEYS:
+        summary.pop(key)
+    return summary
+
+
+@pytest.mark.parametrize('spec', [
+    NetworkSpec(rows=2, cols=2, seed=3),
+    NetworkSpec(rows=1, cols=4, seed=1, engine='vectorized', optimizer='webster'),
+], ids=['grid', 'corridor'])
+def test_sharded_network_matches_a_single_process(spec):
+    single = run(spec, 800, workers=1)
+    assert single['transfers'] > 0  # vehicles did cross between shards
+    for workers in (2, spec.size):
+        sharded = run(spec, 800, workers)
+        # Shards add up their intersections' mean waits in a different order
+        assert sharded.pop('average_wait_time') == pytest.approx(single['average_wait_time'])
+        assert sharded == {key: value for key, value in single.items()
+                           if key != 'average_wait_time'}
+
+
+def test_partition_covers_every_intersection_once():
+    spec = NetworkSpec(rows=5, cols=3)
+    for shards in (1, 2, 3, 5, 8):
+        bands = partition(spec, shards)
+        assert len(bands) == min(shards, spec.rows)
+        assert sorted(i for band in bands for i in band) == list(range(spec.size))
+    assert partition(NetworkSpec(rows=1, cols=6), 3) == [[0, 1], [2, 3], [4, 5]]
@@ -0,0 +1,98 @@
+import json
+import urllib.request
+
+import pytest
+
+from optimizer_metrics import LatencyHistogram, OptimizerMetrics, render_text, serve_metrics
+
+
+def parse(text: str) -> dict:
+    # Sample lines of the exposition format, keyed on name plus labels
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_histogram_buckets_are_upper_bound_inclusive():
+    histogram = LatencyHistogram(bounds=(0.01, 0.1, 1.0))
+    for seconds in (0.005, 0.01, 0.02, 0.1, 0.5, 3.0):
+        histogram.observe(seconds)
+    snapshot = histogram.snapshot()
+    assert snapshot['buckets'] == [2, 2, 1, 1]
+    assert snapshot['count'] == 6
+    assert snapshot['sum'] == pytest.approx(3.635)
+    assert snapshot['max'] == 3.0
+    assert snapshot['p50'] == 0.1   # third and fourth observations are in (0.01, 0.1]
+    assert snapshot['p99'] == 3.0   # the overflow bucket reports the largest value seen
+    assert LatencyHistogram().quantile(0.5) == 0.0
+
+
+def test_counters_fallbacks_and_rates():
+    metrics = OptimizerMetrics()
+    metrics.count('decisions', 4)
+    metrics.count('cache_hits')
+    metrics.count('parses', 2)
+    metrics.count('parse_failures')
+    metrics.count('backend_calls', 2)
+    metrics.count('backend_timeouts')
+    metrics.fallback('circuit_open')
+    metrics.observe('decision', 0.003)
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'] == {'decisions': 4, 'cache_hits': 1, 'parses': 2,
+                                    'parse_failures': 1, 'backend_calls': 2,
+                                    'backend_timeouts': 1}
+    assert snapshot['fallbacks'] == {'circuit_open': 1}
+    assert snapshot['rates'] == {'fallback_rate': 0.25, 'parse_failure_rate': 0.5,
+                                 'backend_error_rate': 0.5, 'cache_hit_rate': 0.25}
+    assert snapshot['latency']['decision']['count'] == 1
+    assert snapshot['latency']['backend']['count'] == 0
+
+
+def test_prometheus_text_output():
+    metrics = OptimizerMetrics()
+    metrics.count('decisions', 3)
+    metrics.fallback('parse_error')
+    for seconds in (0.0005, 0.004, 0.004, 20.0):
+        metrics.observe('backend', seconds)
+    snapshot = metrics.snapshot()
+    snapshot['circuit'] = {'state': 'half-open', 'times_opened': 2}
+    text = render_text(snapshot)
+    samples = parse(text)
+
+    assert samples['traffic_optimizer_counters_decisions'] == 3
+    assert samples['traffic_optimizer_fallbacks_parse_error'] == 1
+    assert samples['traffic_optimizer_rates_fallback_rate'] == pytest.approx(1 / 3)
+    assert samples['traffic_optimizer_circuit_state{value="half-open"}'] == 1
+    assert samples['traffic_optimizer_circuit_times_opened'] == 2
+    assert '# TYPE traffic_optimizer_backend_seconds histogram' in text
+    # Buckets are cumulative and end with +Inf at the total count
+    assert samples['traffic_optimizer_backend_seconds_bucket{le="0.001"}'] == 1
+    assert samples['traffic_optimizer_backend_seconds_bucket{le="0.0025"}'] == 1
+    assert samples['traffic_optimizer_backend_seconds_bucket{le="0.005"}'] == 3
+    assert samples['traffic_optimizer_backend_seconds_bucket{le="10.0"}'] == 3
+    assert samples['traffic_optimizer_backend_seconds_bucket{le="+Inf"}'] == 4
+    assert samples['traffic_optimizer_backend_seconds_count'] == 4
+    assert samples['traffic_optimizer_backend_seconds_sum'] == pytest.approx(20.0085)
+    assert samples['traffic_optimizer_decision_seconds_count'] == 0
+    # The raw bounds and bucket lists only appear as histogram lines
+    assert not any('_bounds' in name or name.endswith('_buckets') for name in samples)
+
+
+def test_endpoint_serves_text_and_json():
+    metrics = OptimizerMetrics()
+    metrics.count('decisions', 2)
+    server = serve_metrics(metrics.snapshot, port=0)
+    try:
+        host, port = server.server_address[:2]
+        base = f'http://{host}:{port}'
+        with urllib.request.urlopen(f'{base}/metrics') as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            assert parse(response.read().decode())['traffic_optimizer_counters_decisions'] == 2
+        with urllib.request.urlopen(f'{base}/metrics.json') as response:
+            assert json.loads(response.read())['counters'] == {'decisions': 2}
+    finally:
+        server.shutdown()
+        server.server_close()
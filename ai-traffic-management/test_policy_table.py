@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from policy_table import (DIRECTIONS, LANES, TRAVEL, PolicyTable, build_simulation,
+                          cell_state, queue_capacity)
+from traffic_core import SimulationConfig, Vehicle
+
+
+def along(vehicle) -> float:
+    # Distance travelled along the approach, so larger is nearer the stop line
+    dx, dy = TRAVEL[vehicle.direction]
+    return vehicle.position[0] * dx + vehicle.position[1] * dy
+
+
+def queued(waiting) -> dict:
+    return dict(cell_state([0] * 8, [0], [0.0]), waiting_vehicles=waiting)
+
+
+def test_queue_capacity_per_approach():
+    assert {direction: queue_capacity(direction) for direction in DIRECTIONS} == {
+        'right': 18, 'down': 9, 'left': 24, 'up': 15}
+    assert all(queue_capacity(direction) % LANES == 0 for direction in DIRECTIONS)
+
+
+@pytest.mark.parametrize('direction', DIRECTIONS)
+def test_queues_sit_between_the_spawn_point_and_the_stop_line(direction):
+    count = queue_capacity(direction)
+    waiting = [count if other == direction else 0 for other in DIRECTIONS]
+    simulation = build_simulation(queued(waiting), [20] * 4, seed=0)
+    vehicles = list(simulation.vehicles)
+    assert len(vehicles) == count
+    assert simulation.counters.waiting == waiting
+    spawn = along(Vehicle(0, 'car', direction, False))
+    for lane in range(LANES):
+        queue = [vehicle for vehicle in vehicles if vehicle.lane == lane]
+        # Spawn order is queue order: the front of the queue came first
+        positions = [along(vehicle) for vehicle in queue]
+        assert positions == sorted(positions, reverse=True)
+        assert positions[0] == queue[0].stop_position * sum(TRAVEL[direction])
+        assert positions[-1] >= spawn
+        gaps = np.diff(positions) * -1
+        assert np.all(gaps >= queue[0].size[0] + SimulationConfig.GAP - 1e-9)
+        assert not any(vehicle.crossed for vehicle in queue)
+
+
+@pytest.mark.parametrize('direction', DIRECTIONS)
+def test_queues_that_do_not_fit_are_rejected(direction):
+    waiting = [queue_capacity(direction) + 1 if other == direction else 0
+               for other in DIRECTIONS]
+    with pytest.raises(ValueError, match=direction):
+        build_simulation(queued(waiting), [20] * 4, seed=0)
+
+
+def test_flow_rates_are_loaded_into_the_counters():
+    state = cell_state([1, 0, 2, 0, 1, 0, 1, 1], [0, 2, 5], [0.0, 0.05])
+    simulation = build_simulation(state, [20] * 4, seed=0)
+    assert simulation.counters.flow_rates() == pytest.approx(state['flow_rates'])
+    assert simulation.counters.waiting == state['waiting_vehicles']
+
+
+def small_table() -> PolicyTable:
+    cells = np.array([[0, 0, 0, 0, 0, 0, 0, 0],
+                      [2, 0, 0, 0, 0, 0, 0, 0],
+                      [0, 0, 2, 0, 1, 1, 1, 1]])
+    greens = np.array([[20, 20, 20, 20], [60, 10, 10, 10], [10, 10, 60, 10]])
+    return PolicyTable([0, 2, 5], [0.0, 0.05], cells, greens)
+
+
+def test_swept_cells_are_looked_up_and_others_use_the_nearest():
+    table = small_table()
+    assert table.green_times(cell_state([2, 0, 0, 0, 0, 0, 0, 0], [0, 2, 5], [0.0, 0.05])) == [
+        60, 10, 10, 10]
+    # Not swept: one level off the second cell, further from the others
+    near_second = {'waiting_vehicles': [9, 2, 0, 0], 'flow_rates': [0.0] * 4}
+    assert table.levels(near_second) == (2, 1, 0, 0, 0, 0, 0, 0)
+    assert table.green_times(near_second) == [60, 10, 10, 10]
+    near_third = {'waiting_vehicles': [0, 0, 6, 0], 'flow_rates': [0.1, 0.1, 0.1, 0.0]}
+    assert table.green_times(near_third) == [10, 10, 60, 10]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    table = small_table()
+    path = str(tmp_path / 'table.npz')
+    table.save(path)
+    loaded = PolicyTable.load(path)
+    assert np.array_equal(loaded.cells, table.cells)
+    assert np.array_equal(loaded.greens, table.greens)
+    assert np.array_equal(loaded.queue_edges, table.queue_edges)
+    assert np.array_equal(loaded.flow_edges, table.flow_edges)
+    state = {'waiting_vehicles': [3, 1, 7, 0], 'flow_rates': [0.0, 0.2, 0.0, 0.1]}
+    assert loaded.green_times(state) == table.green_times(state)
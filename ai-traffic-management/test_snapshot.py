@@ -0,0 +1,38 @@
+import pytest
+
+from event_simulation import EventDrivenSimulation
+from headless import FixedTimingOptimizer, run_simulation
+from traffic_core import TrafficSimulation
+from vectorized_simulation import VectorizedTrafficSimulation
+
+ENGINES = [TrafficSimulation, VectorizedTrafficSimulation, EventDrivenSimulation]
+
+
+def kpis(simulation):
+    stats = simulation.stats
+    return {
+        'trips': simulation.trips.summary(),
+        'total_vehicles': stats['total_vehicles'],
+        'waiting_times': list(stats['waiting_times']),
+        'throughput': list(stats['throughput']),
+        'vehicles': len(simulation.vehicles),
+        'waiting': list(simulation.counters.waiting),
+    }
+
+
+@pytest.mark.parametrize('engine', ENGINES, ids=lambda cls: cls.__name__)
+def test_restore_keeps_trips_and_stats(engine):
+    simulation = engine(FixedTimingOptimizer(), seed=7)
+    run_simulation(simulation, 200)
+    restored = engine.from_snapshot(simulation.snapshot(), FixedTimingOptimizer())
+    assert kpis(restored) == kpis(simulation)
+
+
+@pytest.mark.parametrize('engine', ENGINES, ids=lambda cls: cls.__name__)
+def test_restored_copy_runs_on_identically(engine):
+    simulation = engine(FixedTimingOptimizer(), seed=7)
+    run_simulation(simulation, 200)
+    copy = simulation.fork()
+    run_simulation(simulation, 300)
+    run_simulation(copy, 300)
+    assert kpis(copy) == kpis(simulation)
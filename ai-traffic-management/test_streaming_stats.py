@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from streaming_stats import QuantileSketch, RingBuffer, RunningStats, StreamingSeries
+
+
+def samples(seed: int, size: int = 5000) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.lognormal(mean=2.0, sigma=1.0, size=size)
+
+
+@pytest.mark.parametrize('capacity', [1, 7, 64])
+def test_ring_buffer_keeps_the_most_recent_values(capacity):
+    values = samples(0, 200)
+    buffer = RingBuffer(capacity)
+    for count, value in enumerate(values, start=1):
+        buffer.append(value)
+        if count % 13 == 0:
+            expected = values[max(0, count - capacity):count]
+            assert np.array_equal(buffer.to_array(), expected)
+            assert buffer[-1] == expected[-1] and buffer[0] == expected[0]
+            assert buffer[1:3] == expected[1:3].tolist()
+    buffer.extend(values[:5])
+    assert np.array_equal(buffer.to_array(), np.concatenate([values, values[:5]])[-capacity:])
+    with pytest.raises(IndexError):
+        buffer[capacity]
+
+
+def test_welford_matches_numpy():
+    values = samples(1)
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(values.mean(), rel=1e-12)
+    assert stats.std == pytest.approx(values.std(ddof=1), rel=1e-9)
+    assert (stats.min, stats.max) == (values.min(), values.max())
+
+
+def test_merged_welford_matches_numpy_on_the_union():
+    values = samples(2)
+    left, right = RunningStats(), RunningStats()
+    for value in values[:1234]:
+        left.add(value)
+    for value in values[1234:]:
+        right.add(value)
+    left.merge(right)
+    assert left.mean == pytest.approx(values.mean(), rel=1e-12)
+    assert left.variance == pytest.approx(values.var(ddof=1), rel=1e-9)
+
+
+@pytest.mark.parametrize('seed', [3, 4, 5])
+def test_sketch_quantiles_are_within_relative_accuracy(seed):
+    values = np.concatenate([samples(seed), np.zeros(100)])
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    for q in (0.0, 0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 1.0):
+        exact = np.quantile(values, q, method='lower')
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.01, abs=1e-12)
+
+
+def test_merged_sketches_match_one_sketch_over_everything():
+    values = samples(6)
+    whole, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for index, value in enumerate(values):
+        whole.add(value)
+        (left if index % 3 else right).add(value)
+    left.merge(right)
+    assert left.count == whole.count
+    assert left.buckets == whole.buckets
+    for q in (0.5, 0.95, 0.99):
+        assert left.quantile(q) == whole.quantile(q)
+
+
+def test_collapsed_sketch_keeps_upper_percentiles():
+    values = samples(7, 20000)
+    sketch = QuantileSketch(relative_accuracy=0.01, max_buckets=256)
+    for value in values:
+        sketch.add(value)
+    assert len(sketch.buckets) <= 256
+    for q in (0.95, 0.99):
+        assert sketch.quantile(q) == pytest.approx(np.quantile(values, q, method='lower'),
+                                                   rel=0.01)
+
+
+def test_series_summary_and_copy():
+    values = samples(8, 3000)
+    series = StreamingSeries(window=100, quantiles=True)
+    for value in values:
+        series.append(value)
+    assert list(series) == values[-100:].tolist()
+    summary = series.summary()
+    assert summary['count'] == 3000
+    assert summary['mean'] == pytest.approx(values.mean())
+    assert summary['p95'] == pytest.approx(np.quantile(values, 0.95, method='lower'), rel=0.01)
+    copy = series.copy()
+    assert copy.summary() == summary and list(copy) == list(series)
+    with pytest.raises(ValueError):
+        StreamingSeries().percentile(50)
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+from headless import ENGINES, create_simulation, run_simulation
+from trace_replay import (TICK_DTYPE, VEHICLE_COLUMNS, TraceError, TraceRecorder, TraceReplay,
+                          tick_row, vehicle_columns)
+
+TICKS = 300
+
+
+class CopyingRecorder(TraceRecorder):
+    # Keeps what each tick looked like live, next to what went to disk
+    def __init__(self, path: str, metadata=None):
+        super().__init__(path, metadata)
+        self.live = []
+
+    def record(self, simulation) -> None:
+        # The vectorized engine's columns are views of arrays it keeps mutating
+        columns = {name: column.copy() for name, column in
+                   vehicle_columns(simulation.vehicles, self._type_code).items()}
+        vehicles = [(vehicle.type, vehicle.direction, vehicle.lane, vehicle.crossed,
+                     vehicle.wait_time) for vehicle in simulation.vehicles]
+        self.live.append((tick_row(simulation, 0, 0)[0], columns, vehicles))
+        super().record(simulation)
+
+
+def record(path: str, engine: str) -> CopyingRecorder:
+    simulation = create_simulation(engine, seed=4, spawn_probability=0.6)
+    with CopyingRecorder(path, {'engine': engine}) as recorder:
+        run_simulation(simulation, TICKS, recorder)
+    return recorder
+
+
+@pytest.mark.parametrize('engine', sorted(ENGINES))
+def test_replay_matches_every_recorded_tick(tmp_path, engine):
+    recorder = record(str(tmp_path), engine)
+    replay = TraceReplay(str(tmp_path))
+    assert replay.metadata == {'engine': engine}
+    assert len(replay) == TICKS
+    assert sum(len(vehicles) for _, _, vehicles in recorder.live) > 0
+    for frame, (row, columns, vehicles) in zip(replay, recorder.live):
+        assert frame.time_elapsed == row['tick']
+        assert frame.current_green == row['green']
+        assert frame.current_yellow == row['yellow']
+        assert frame.weather.conditions == pytest.approx(
+            {'rain': row['rain'], 'fog': row['fog'], 'wind': row['wind']})
+        for name in VEHICLE_COLUMNS:
+            assert np.array_equal(frame.vehicles.columns[name], columns[name])
+        assert [(vehicle.type, vehicle.direction, vehicle.lane, vehicle.crossed,
+                 vehicle.wait_time) for vehicle in frame.vehicles] == vehicles
+    # Seeking lands on the same frame as stepping
+    middle = replay.ticks[TICKS // 2]
+    assert replay.frame(int(middle)).time_elapsed == middle
+    assert replay.frame(replay.last_tick + 50).time_elapsed == replay.last_tick
+
+
+def test_columns_round_trip_through_mmap(tmp_path):
+    recorder = record(str(tmp_path), 'vectorized')
+    replay = TraceReplay(str(tmp_path))
+    for name, dtype in VEHICLE_COLUMNS.items():
+        column = replay.columns[name]
+        assert isinstance(column, np.memmap) and column.dtype == dtype
+        assert len(column) == recorder.rows
+        expected = np.concatenate([columns[name] for _, columns, _ in recorder.live])
+        assert np.array_equal(column, expected)
+        # The file is the raw column and nothing else
+        assert os.path.getsize(tmp_path / f'{name}.bin') == recorder.rows * dtype.itemsize
+    assert isinstance(replay.index, np.memmap) and replay.index.dtype == TICK_DTYPE
+    assert np.array_equal(np.diff(replay.index['start']), replay.index['count'][:-1])
+
+
+def test_unfinished_trace_drops_the_partial_tick(tmp_path):
+    record(str(tmp_path), 'object')
+    replay = TraceReplay(str(tmp_path))
+    last = replay.index[-1]
+    assert last['count'] > 0
+    # Lose the tail of one column, as if the writer died mid-tick
+    path = tmp_path / 'x.bin'
+    os.truncate(path, os.path.getsize(path) - VEHICLE_COLUMNS['x'].itemsize)
+    truncated = TraceReplay(str(tmp_path))
+    assert len(truncated) == TICKS - 1
+    assert truncated.last_tick == replay.index[-2]['tick']
+
+
+def test_recorder_refuses_to_overwrite_and_reader_checks_the_format(tmp_path):
+    record(str(tmp_path / 'trace'), 'object')
+    with pytest.raises(TraceError, match='already holds'):
+        TraceRecorder(str(tmp_path / 'trace'))
+    (tmp_path / 'other').mkdir()
+    (tmp_path / 'other' / 'header.json').write_text('{"format": "something-else"}')
+    with pytest.raises(TraceError, match='not a traffic trace'):
+        TraceReplay(str(tmp_path / 'other'))
@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from event_simulation import EventDrivenSimulation
+from headless import FixedTimingOptimizer, run_simulation
+from traffic_core import CONGESTION_LEVELS, DirectionCounters, TrafficSimulation
+from vectorized_simulation import VectorizedTrafficSimulation
+
+ENGINES = [TrafficSimulation, VectorizedTrafficSimulation, EventDrivenSimulation]
+DIRECTIONS = ['right', 'down', 'left', 'up']
+
+
+def recount(simulation):
+    waiting = [0] * 4
+    for vehicle in simulation.vehicles:
+        if not vehicle.crossed:
+            waiting[DIRECTIONS.index(vehicle.direction)] += 1
+    return waiting
+
+
+@pytest.mark.parametrize('engine', ENGINES, ids=lambda cls: cls.__name__)
+def test_waiting_counts_match_a_recount_of_the_vehicles(engine):
+    simulation = engine(FixedTimingOptimizer(), seed=11)
+    simulation.config.SPAWN_PROBABILITY = 0.7
+    for _ in range(60):
+        run_simulation(simulation, 25)
+        assert simulation.counters.waiting == recount(simulation)
+    assert simulation.trips.crossed > 0
+
+
+def test_flow_window_matches_a_recount_of_recent_crossings():
+    rng = random.Random(2)
+    counters = DirectionCounters(flow_window=10)
+    ticks = []  # crossings per direction for every closed tick
+    for _ in range(200):
+        current = [0] * 4
+        for _ in range(rng.randint(0, 3)):
+            index = rng.randrange(4)
+            counters.spawned(DIRECTIONS[index])
+            counters.crossed(DIRECTIONS[index])
+            current[index] += 1
+        idle = rng.choice([1, 1, 1, 3, 15])
+        counters.advance(idle)
+        ticks += [current] + [[0] * 4] * (idle - 1)
+        window = ticks[-10:]
+        assert counters.recent_crossings == [sum(column) for column in zip(*window)]
+        assert counters.flow_rates() == [sum(column) / 10 for column in zip(*window)]
+        assert counters.history()[-len(window):] == window
+    assert counters.waiting == [0] * 4
+
+
+def test_load_history_and_copy():
+    counters = DirectionCounters(flow_window=5)
+    for index in range(8):
+        counters.spawned('down')
+        counters.crossed('down', 1)
+        counters.advance()
+    restored = DirectionCounters(flow_window=5)
+    restored.load_history(counters.history())
+    assert restored.recent_crossings == counters.recent_crossings == [0, 5, 0, 0]
+    restored.advance()
+    assert restored.recent_crossings == [0, 4, 0, 0]
+    empty = DirectionCounters()
+    empty.load_history([])
+    assert empty.recent_crossings == [0] * 4 and empty.history() == []
+
+    copy = counters.copy()
+    copy.spawned('left')
+    copy.advance(10)
+    assert counters.waiting == [0, 0, 0, 0] and counters.recent_crossings == [0, 5, 0, 0]
+    assert copy.waiting == [0, 0, 1, 0] and copy.recent_crossings == [0, 0, 0, 0]
+
+
+def test_congestion_levels_follow_the_waiting_counts():
+    counters = DirectionCounters()
+    for _ in range(3):
+        counters.spawned('right')
+    for _ in range(20):
+        counters.spawned('up')
+    counters.spawned('left', crossed=True)
+    counters.removed('right', crossed=False)
+    assert counters.waiting == [2, 0, 0, 20]
+    assert counters.congestion_levels() == [CONGESTION_LEVELS[2], 0.0, 0.0,
+                                            min(CONGESTION_LEVELS[11], 1.0)]
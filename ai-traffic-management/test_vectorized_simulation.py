@@ -0,0 +1,39 @@
+from benchmarks import build
+from headless import FixedTimingOptimizer, run_simulation
+from vectorized_simulation import VectorizedTrafficSimulation
+
+
+def ahead_positions(simulation):
+    return [[other.position for other in simulation._get_vehicles_ahead(vehicle)]
+            for vehicle in simulation.vehicles]
+
+
+def test_vehicles_ahead_match_the_object_engine():
+    # The populated benchmark scene has full queues; both engines get the same one
+    engines = [build(engine, 1000) for engine in ('object', 'vectorized')]
+    assert max(map(len, ahead_positions(engines[1]))) > 5
+    for _ in range(4):
+        assert ahead_positions(engines[1]) == ahead_positions(engines[0])
+        for engine in engines:
+            run_simulation(engine, 25)
+
+
+def test_waiting_lanes_survive_clone_and_restore():
+    simulation = build('vectorized', 1000)
+    run_simulation(simulation, 30)
+    expected = ahead_positions(simulation)
+    clone = simulation.clone()
+    restored = VectorizedTrafficSimulation.from_snapshot(simulation.snapshot(),
+                                                         FixedTimingOptimizer())
+    assert ahead_positions(clone) == expected
+    assert ahead_positions(restored) == expected
+
+
+def test_crossing_a_vehicle_by_hand_takes_it_off_its_lane():
+    simulation = build('vectorized', 1000)
+    vehicle = max(simulation.vehicles, key=lambda other: len(simulation._get_vehicles_ahead(other)))
+    leader = simulation._get_vehicles_ahead(vehicle)[1]
+    leader.crossed = True
+    assert leader not in simulation._get_vehicles_ahead(vehicle)
+    leader.crossed = False
+    assert simulation._get_vehicles_ahead(vehicle)[1] == leader
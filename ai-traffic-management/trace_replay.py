@@ -0,0 +1,336 @@
+import argparse
+import json
+import os
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from traffic_core import VEHICLE_CONFIGS
+
+# A trace is a directory of append-only column files plus a JSON header. Vehicle
+# columns hold one row per vehicle per tick, back to back; the tick index holds one
+# row per recorded tick with where that tick's vehicles start in the columns, the
+# signal state and the weather. Every file is raw little-endian data, so readers
+# memory-map them and seeking to a tick is one search in the index.
+FORMAT = 'traffic-trace'
+VERSION = 1
+HEADER = 'header.json'
+TICK_DTYPE = np.dtype([
+    ('tick', '<i8'),
+    ('start', '<i8'),
+    ('count', '<i4'),
+    ('green', 'i1'),
+    ('yellow', '?'),
+    ('rain', '<f4'),
+    ('fog', '<f4'),
+    ('wind', '<f4'),
+])
+VEHICLE_COLUMNS = {
+    'x': np.dtype('<f4'),
+    'y': np.dtype('<f4'),
+    'type': np.dtype('u1'),
+    'direction': np.dtype('i1'),
+    'lane': np.dtype('i1'),
+    'crossed': np.dtype('?'),
+    'wait_time': np.dtype('<i4'),
+}
+DIRECTIONS = ['right', 'down', 'left', 'up']
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+SIGNAL_COLORS = ['red', 'green', 'yellow']
+
+
+class TraceError(ValueError):
+    pass
+
+
+def vehicle_columns(vehicles, type_code: Callable[[str], int]) -> Dict[str, np.ndarray]:
+    # The vehicles of one tick as VEHICLE_COLUMNS arrays; type_code numbers type names
+    if getattr(vehicles, 'x', None) is not None:
+        # VehicleArrays: copy the columns straight out
+        count = vehicles.count
+        codes = np.array([type_code(name) for name in vehicles.type_names] or [0])
+        columns = {
+            'x': vehicles.x[:count], 'y': vehicles.y[:count],
+            'type': codes[vehicles.type[:count]],
+            'direction': vehicles.direction[:count], 'lane': vehicles.lane[:count],
+            'crossed': vehicles.crossed[:count], 'wait_time': vehicles.wait_time[:count],
+        }
+    else:
+        vehicles = list(vehicles)
+        positions = np.array([vehicle.position for vehicle in vehicles]).reshape(-1, 2)
+        columns = {
+            'x': positions[:, 0], 'y': positions[:, 1],
+            'type': [type_code(vehicle.type) for vehicle in vehicles],
+            'direction': [DIRECTION_CODES[vehicle.direction] for vehicle in vehicles],
+            'lane': [vehicle.lane for vehicle in vehicles],
+            'crossed': [vehicle.crossed for vehicle in vehicles],
+            'wait_time': [vehicle.wait_time for vehicle in vehicles],
+        }
+    return {name: np.asarray(columns[name], dtype=dtype)
+            for name, dtype in VEHICLE_COLUMNS.items()}
+
+
+def tick_row(simulation, start: int, count: int) -> np.ndarray:
+    weather = simulation.weather.conditions
+    return np.array([(simulation.time_elapsed, start, count, simulation.current_green,
+                      simulation.current_yellow, weather['rain'], weather['fog'],
+                      weather['wind'])], dtype=TICK_DTYPE)
+
+
+class TraceRecorder:
+    # Appends the state of a simulation after each tick it is given. Files are
+    # flushed on close (and by the OS along the way); a reader of an unfinished
+    # trace only sees ticks whose vehicle rows are fully on disk.
+    def __init__(self, path: str, metadata: Optional[Dict] = None):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, HEADER)):
+            raise TraceError(f"{path} already holds a trace")
+        self.metadata = dict(metadata or {})
+        self.type_names = list(VEHICLE_CONFIGS['sizes'])
+        self.type_codes = {name: code for code, name in enumerate(self.type_names)}
+        self.rows = 0
+        self.ticks = 0
+        self._index = open(os.path.join(path, 'ticks.bin'), 'ab')
+        self._columns = {name: open(os.path.join(path, f'{name}.bin'), 'ab')
+                         for name in VEHICLE_COLUMNS}
+        self._write_header()
+
+    def _write_header(self) -> None:
+        header = {
+            'format': FORMAT,
+            'version': VERSION,
+            'type_names': self.type_names,
+            'directions': DIRECTIONS,
+            'ticks': np.lib.format.dtype_to_descr(TICK_DTYPE),
+            'columns': {name: dtype.str for name, dtype in VEHICLE_COLUMNS.items()},
+            'metadata': self.metadata,
+        }
+        temporary = os.path.join(self.path, HEADER + '.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(header, f)
+        os.replace(temporary, os.path.join(self.path, HEADER))
+
+    def _type_code(self, name: str) -> int:
+        code = self.type_codes.get(name)
+        if code is None:
+            code = self.type_codes[name] = len(self.type_names)
+            self.type_names.append(name)
+            self._write_header()
+        return code
+
+    def record(self, simulation) -> None:
+        columns = vehicle_columns(simulation.vehicles, self._type_code)
+        count = len(columns['x'])
+        for name in VEHICLE_COLUMNS:
+            self._columns[name].write(columns[name].tobytes())
+        row = tick_row(simulation, self.rows, count)
+        # Index rows go last so a partly written tick is never listed
+        self._index.write(row.tobytes())
+        self.rows += count
+        self.ticks += 1
+
+    def flush(self) -> None:
+        for f in self._columns.values():
+            f.flush()
+        self._index.flush()
+
+    def close(self) -> None:
+        self.flush()
+        for f in list(self._columns.values()) + [self._index]:
+            f.close()
+
+    def __enter__(self) -> 'TraceRecorder':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class TraceVehicle:
+    # A read-only vehicle for consumers that iterate vehicles one by one
+    __slots__ = ('type', 'position', 'direction', 'lane', 'crossed', 'wait_time')
+
+    def __init__(self, vehicle_type: str, position: tuple, direction: str, lane: int,
+                 crossed: bool, wait_time: int):
+        self.type = vehicle_type
+        self.position = position
+        self.direction = direction
+        self.lane = lane
+        self.crossed = crossed
+        self.wait_time = wait_time
+
+    @property
+    def size(self) -> tuple:
+        return VEHICLE_CONFIGS['sizes'].get(self.type, (30, 20))
+
+    @property
+    def color(self) -> str:
+        return VEHICLE_CONFIGS['colors'].get(self.type, 'gray')
+
+
+class TraceVehicles:
+    # The vehicles of one tick as column views, shaped like VehicleArrays so the
+    # renderers take their column fast path
+    def __init__(self, columns: Dict[str, np.ndarray], type_names: List[str]):
+        self.columns = columns
+        self.type_names = type_names
+        self.count = len(columns['x'])
+        self.x = columns['x']
+        self.y = columns['y']
+        self.type = columns['type']
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[TraceVehicle]:
+        c = self.columns
+        for i in range(self.count):
+            yield TraceVehicle(self.type_names[c['type'][i]], (float(c['x'][i]), float(c['y'][i])),
+                               DIRECTIONS[c['direction'][i]], int(c['lane'][i]),
+                               bool(c['crossed'][i]), int(c['wait_time'][i]))
+
+
+class TraceWeather:
+    def __init__(self, conditions: Dict[str, float]):
+        self.conditions = conditions
+
+
+class TraceFrame:
+    # One recorded tick, with the attributes the renderers read off a simulation
+    def __init__(self, row: np.void, vehicles: TraceVehicles):
+        self.time_elapsed = int(row['tick'])
+        self.current_green = int(row['green'])
+        self.current_yellow = bool(row['yellow'])
+        self.vehicles = vehicles
+        self.weather = TraceWeather({'rain': float(row['rain']), 'fog': float(row['fog']),
+                                     'wind': float(row['wind'])})
+
+    def _get_signal_color(self, signal_index: int) -> str:
+        if signal_index == self.current_green:
+            return 'yellow' if self.current_yellow else 'green'
+        return 'red'
+
+
+class TraceReplay:
+    # Memory-maps a trace and hands out frames by tick without re-simulating
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, HEADER)) as f:
+            header = json.load(f)
+        if header.get('format') != FORMAT:
+            raise TraceError(f"{path} is not a traffic trace")
+        if header['version'] != VERSION:
+            raise TraceError(f"Unsupported trace version {header['version']}")
+        self.type_names = header['type_names']
+        self.metadata = header.get('metadata', {})
+        self.columns = {name: self._map(f'{name}.bin', np.dtype(dtype))
+                        for name, dtype in header['columns'].items()}
+        index = self._map('ticks.bin', np.lib.format.descr_to_dtype(header['ticks']))
+        # Leave out trailing ticks whose vehicle rows didn't make it to disk
+        rows = min(len(column) for column in self.columns.values())
+        complete = index['start'] + index['count'] <= rows
+        self.index = index[:int(np.argmin(complete)) if not complete.all() else len(index)]
+        self.ticks = self.index['tick']
+
+    def _map(self, name: str, dtype: np.dtype) -> np.ndarray:
+        path = os.path.join(self.path, name)
+        size = os.path.getsize(path) // dtype.itemsize
+        if size == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(size,))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def first_tick(self) -> int:
+        return int(self.ticks[0]) if len(self) else 0
+
+    @property
+    def last_tick(self) -> int:
+        return int(self.ticks[-1]) if len(self) else 0
+
+    def position(self, tick: int) -> int:
+        # Index of the last recorded tick at or before `tick`
+        return max(int(np.searchsorted(self.ticks, tick, side='right')) - 1, 0)
+
+    def frame_at(self, position: int) -> TraceFrame:
+        row = self.index[position]
+        start, stop = int(row['start']), int(row['start']) + int(row['count'])
+        columns = {name: column[start:stop] for name, column in self.columns.items()}
+        return TraceFrame(row, TraceVehicles(columns, self.type_names))
+
+    def frame(self, tick: int) -> TraceFrame:
+        if not len(self):
+            raise TraceError(f"{self.path} has no recorded ticks")
+        return self.frame_at(self.position(tick))
+
+    def __iter__(self) -> Iterator[TraceFrame]:
+        for position in range(len(self)):
+            yield self.frame_at(position)
+
+
+def play(path: str, start: int = 0, fps: int = 30, step: int = 1) -> None:
+    # Plays a trace in a pygame window. Left/right seek 100 ticks, Home jumps to the
+    # start, space pauses.
+    import pygame
+    from pygame_renderer import PygameRenderer, SCREEN_SIZE
+
+    replay = TraceReplay(path)
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    renderer = PygameRenderer(screen)
+    position = replay.position(start)
+    paused = False
+    try:
+        while True:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_SPACE:
+                        paused = not paused
+                    elif event.key == pygame.K_HOME:
+                        position = 0
+                    elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                        sign = -1 if event.key == pygame.K_LEFT else 1
+                        tick = int(replay.ticks[position]) + sign * 100
+                        position = replay.position(tick)
+            frame = replay.frame_at(position)
+            renderer.render(frame)
+            pygame.display.set_caption(f"Replay - tick {frame.time_elapsed} of "
+                                       f"{replay.last_tick}, {len(frame.vehicles)} vehicles")
+            if not paused:
+                position = min(position + step, len(replay) - 1)
+            renderer.clock.tick(fps)
+    finally:
+        pygame.quit()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    # Traces are recorded with headless.py --trace PATH
+    parser = argparse.ArgumentParser(description="Play back a recorded trace")
+    commands = parser.add_subparsers(dest='command', required=True)
+    replay = commands.add_parser('play', help="play a trace in a pygame window")
+    replay.add_argument('path')
+    replay.add_argument('--start', type=int, default=0, help="tick to start from")
+    replay.add_argument('--fps', type=int, default=30)
+    replay.add_argument('--step', type=int, default=1, help="recorded ticks per frame")
+    frame = commands.add_parser('frame', help="write one tick as a PNG with the matplotlib renderer")
+    frame.add_argument('path')
+    frame.add_argument('tick', type=int)
+    frame.add_argument('--out', default='frame.png')
+    args = parser.parse_args(argv)
+
+    if args.command == 'play':
+        play(args.path, args.start, args.fps, args.step)
+    else:
+        import matplotlib.pyplot as plt
+        from renderer import IntersectionRenderer
+        plt.imsave(args.out, IntersectionRenderer().render_image(TraceReplay(args.path).frame(args.tick)))
+        print(f"Wrote tick {args.tick} of {args.path} to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
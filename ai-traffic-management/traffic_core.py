@@ -0,0 +1,827 @@
+import asyncio
+import functools
+import logging
+import math
+import random
+import re
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from dataclasses import dataclass, asdict
+from collections import deque
+from snapshot import VEHICLE_DTYPE, encode_snapshot, decode_snapshot
+from streaming_stats import StreamingSeries, TripStats
+from decision_cache import DecisionCache
+from background_optimizer import CircuitBreaker
+from optimizer_metrics import OptimizerMetrics
+from demand import ArrivalSchedule, DemandProfile
+
+# The simulation model on its own: nothing here imports streamlit, matplotlib, g4f or
+# pygame, so headless runs and worker processes start without them. The LLM client
+# and the renderer are imported on first use; main.py is the Streamlit page.
+logger = logging.getLogger(__name__)
+
+INTEGER = re.compile(r'(?<![\d.])\d+(?!\.?\d)')  # whole numbers, not parts of decimals
+
+# Configuration
+@dataclass
+class SimulationConfig:
+    DEFAULT_RED: int = 150
+    DEFAULT_YELLOW: int = 5
+    DEFAULT_GREEN: int = 20
+    DEFAULT_MIN: int = 10
+    DEFAULT_MAX: int = 60
+    NUM_SIGNALS: int = 4
+    SIM_TIME: int = 300
+    GAP: int = 15
+    MOVING_GAP: int = 15
+    MAX_VEHICLES: int = 50
+    SPAWN_PROBABILITY: float = 0.3  # chance of a new vehicle each tick
+    STATS_WINDOW: int = 1000
+
+# Vehicle configurations
+VEHICLE_CONFIGS = {
+    'speeds': {'car': 2.25, 'bus': 1.8, 'truck': 1.8, 'rickshaw': 2, 'bike': 2.5},
+    'colors': {'car': 'blue', 'bus': 'red', 'truck': 'gray', 'rickshaw': 'green', 
+               'bike': 'yellow', 'emergency': 'red'},
+    'sizes': {'car': (30, 20), 'bus': (40, 20), 'truck': (40, 20), 
+              'rickshaw': (25, 15), 'bike': (20, 10), 'emergency': (35, 20)}
+}
+
+class WeatherConditions:
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.rng = rng if rng is not None else random.Random()
+        self.conditions = {
+            'rain': 0.0,
+            'fog': 0.0,
+            'wind': 0.0
+        }
+        self.update_interval = 100  # Update weather every 100 simulation steps
+        self.last_update = 0
+
+    def update(self):
+        self.last_update += 1
+        if self.last_update >= self.update_interval:
+            self.conditions['rain'] = self.rng.random()
+            self.conditions['fog'] = self.rng.random() * 0.8  # Less intense fog
+            self.conditions['wind'] = self.rng.random() * 0.6  # Moderate wind
+            self.last_update = 0
+
+    def get_speed_modifier(self) -> float:
+        # Calculate speed reduction based on weather conditions
+        rain_effect = 1 - (self.conditions['rain'] * 0.3)  # Up to 30% slower in rain
+        fog_effect = 1 - (self.conditions['fog'] * 0.2)   # Up to 20% slower in fog
+        wind_effect = 1 - (self.conditions['wind'] * 0.1)  # Up to 10% slower in wind
+        return min(rain_effect, fog_effect, wind_effect)
+
+class EmergencyVehicleHandler:
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.rng = rng if rng is not None else random.Random()
+        self.emergency_probability = 0.001  # Probability of emergency vehicle spawn
+        self.active_emergency = False
+        self.emergency_cooldown = 200  # Minimum time between emergency vehicles
+        self.last_emergency = 0
+        # Eligible ticks left before the next spawn. One geometric draw per emergency
+        # replaces a Bernoulli draw on every eligible tick; the distribution is the same.
+        self.next_emergency: Optional[int] = None
+
+    def update(self, simulation):
+        if not self.active_emergency and self.last_emergency > self.emergency_cooldown:
+            if self.next_emergency is None:
+                self.next_emergency = int(math.log(1.0 - self.rng.random()) /
+                                          math.log(1.0 - self.emergency_probability))
+            if self.next_emergency == 0:
+                self.next_emergency = None
+                self._spawn_emergency_vehicle(simulation)
+                self.last_emergency = 0
+            else:
+                self.next_emergency -= 1
+        
+        self.last_emergency += 1
+        self._update_emergency_status(simulation)
+
+    def _spawn_emergency_vehicle(self, simulation):
+        direction = self.rng.choice(['right', 'down', 'left', 'up'])
+        lane = self.rng.randint(0, 2)
+        emergency_vehicle = Vehicle(lane, 'emergency', direction, False)
+        if simulation._is_safe_to_spawn(emergency_vehicle):
+            simulation._add_vehicle(emergency_vehicle)
+            self.active_emergency = True
+
+    def _update_emergency_status(self, simulation):
+        if self.active_emergency:
+            emergency_vehicles = [v for v in simulation.vehicles 
+                                if v.type == 'emergency']
+            if not emergency_vehicles:
+                self.active_emergency = False
+
+class SignalOptimizer:
+    # What a simulation asks for its signal timing: a plan for the current state, and
+    # the default plan to fall back on. Only optimizers that call a backend carry a
+    # cache, circuit breaker and metrics.
+    def __init__(self):
+        self.history = deque(maxlen=10)
+
+    async def get_optimal_timing(self, current_state: Dict) -> Dict:
+        raise NotImplementedError
+
+    def _get_fallback_timing(self) -> Dict:
+        return {
+            'green_times': [SimulationConfig.DEFAULT_GREEN] * SimulationConfig.NUM_SIGNALS,
+            'cycle_length': (SimulationConfig.DEFAULT_GREEN * SimulationConfig.NUM_SIGNALS + 
+                           SimulationConfig.DEFAULT_YELLOW * SimulationConfig.NUM_SIGNALS)
+        }
+
+class AITrafficOptimizer(SignalOptimizer):
+    def __init__(self, cache: Optional[DecisionCache] = None, base_url: Optional[str] = None,
+                 metrics: Optional[OptimizerMetrics] = None):
+        super().__init__()
+        # base_url points the client at any OpenAI-compatible server, such as
+        # local_chat_server.py
+        self.base_url = base_url
+        self._client = None
+        self.model = "gpt-4o-mini"
+        self.cache = cache if cache is not None else DecisionCache()
+        self.timeout = 10.0  # seconds to wait for the backend
+        self.breaker = CircuitBreaker()
+        self.metrics = metrics if metrics is not None else OptimizerMetrics()
+
+    @property
+    def client(self):
+        # g4f is only imported once a request actually goes to the backend
+        if self._client is None:
+            from g4f.client import Client
+            self._client = Client(base_url=self.base_url) if self.base_url else Client()
+        return self._client
+
+    async def get_optimal_timing(self, current_state: Dict) -> Dict:
+        start = time.perf_counter()
+        self.metrics.count('decisions')
+        try:
+            key = self.cache.key(current_state)
+            timing = self.cache.get(key)
+            if timing is not None:
+                self.metrics.count('cache_hits')
+                return timing
+
+            context = self._prepare_ai_context(current_state)
+            response = await self._get_ai_recommendation(context)
+            timing = self._parse_ai_response(response)
+            # A failed request comes back as the fallback plan; don't keep it
+            if isinstance(response, str):
+                self.cache.put(key, timing)
+            
+            self.history.append({
+                'state': current_state,
+                'recommendation': timing
+            })
+            
+            return timing
+        except Exception as e:
+            self.metrics.count('errors')
+            self.metrics.fallback('error')
+            logger.error("AI optimization error: %s", e)
+            return self._get_fallback_timing()
+        finally:
+            self.metrics.observe('decision', time.perf_counter() - start)
+
+    async def _get_ai_recommendation(self, context: str) -> str:
+        if not self.breaker.allow():
+            self.metrics.fallback('circuit_open')
+            return self._get_fallback_timing()
+        trial = self.breaker.trial_in_flight  # this call decides whether the circuit closes
+        self.metrics.count('backend_calls')
+        start = time.perf_counter()
+        try:
+            # The client call is synchronous; run it on a worker thread so the
+            # event loop (and whatever is drawing) keeps going while it waits
+            loop = asyncio.get_running_loop()
+            response = await asyncio.wait_for(loop.run_in_executor(None, functools.partial(
+                self.client.chat.completions.create,
+                model=self.model,
+                messages=[{"role": "user", "content": context}],
+                web_search=False
+            )), self.timeout)
+            self.breaker.record_success()
+            return response.choices[0].message.content
+        except asyncio.CancelledError:
+            # Not an exception, so nothing below records it; without this a cancelled
+            # trial would leave the circuit half-open and refusing calls for good
+            if trial:
+                self.breaker.release_trial()
+            raise
+        except asyncio.TimeoutError:
+            self.metrics.count('backend_timeouts')
+            self.metrics.fallback('timeout')
+            self.breaker.record_failure()
+            return self._get_fallback_timing()
+        except Exception:
+            self.metrics.count('backend_errors')
+            self.metrics.fallback('backend_error')
+            self.breaker.record_failure()
+            return self._get_fallback_timing()
+        finally:
+            self.metrics.observe('backend', time.perf_counter() - start)
+
+    def metrics_snapshot(self) -> Dict:
+        snapshot = self.metrics.snapshot()
+        snapshot['cache'] = self.cache.stats()
+        snapshot['circuit'] = {'state': self.breaker.state,
+                               'times_opened': self.breaker.times_opened}
+        return snapshot
+
+    def _prepare_ai_context(self, state: Dict) -> str:
+        return f"""
+        Current traffic state:
+        - Waiting vehicles: {state['waiting_vehicles']}
+        - Flow rates: {state['flow_rates']}
+        - Congestion levels: {state['congestion']}
+        - Time of day: {state['time_of_day']}
+        
+        Recommend optimal signal timings based on this data.
+        """
+
+    def _parse_ai_response(self, response: str) -> Dict:
+        if not isinstance(response, str):
+            # The request failed and already came back as the (counted) fallback plan
+            return self._get_fallback_timing()
+        self.metrics.count('parses')
+        try:
+            base_time = 20
+            # Take whole numbers however they are separated ("20 30", "20, 30", "[20,30]")
+            waiting_vehicles = [int(x) for x in INTEGER.findall(response)][:4]
+            if not waiting_vehicles:
+                self.metrics.count('parse_failures')
+                waiting_vehicles = [0] * 4
+                
+            green_times = [
+                min(max(base_time + w * 2, SimulationConfig.DEFAULT_MIN),
+                    SimulationConfig.DEFAULT_MAX) 
+                for w in waiting_vehicles
+            ]
+            
+            return {
+                'green_times': green_times,
+                'cycle_length': sum(green_times) + 
+                               SimulationConfig.NUM_SIGNALS * SimulationConfig.DEFAULT_YELLOW
+            }
+        except Exception:
+            self.metrics.count('parse_failures')
+            self.metrics.fallback('parse_error')
+            return self._get_fallback_timing()
+
+class Vehicle:
+    def __init__(self, lane: int, vehicle_type: str, direction: str, will_turn: bool):
+        self.lane = lane
+        self.type = vehicle_type
+        self.speed = VEHICLE_CONFIGS['speeds'].get(vehicle_type, 2.0)
+        self.direction = direction
+        self.position = self._initialize_position()
+        self.size = VEHICLE_CONFIGS['sizes'].get(vehicle_type, (30, 20))
+        self.color = VEHICLE_CONFIGS['colors'].get(vehicle_type, 'gray')
+        self.crossed = False
+        self.will_turn = will_turn
+        self.turned = False
+        self.creation_time = time.time()
+        self.wait_time = 0
+        self.stop_position = self._calculate_stop_position()
+        self.priority = vehicle_type == 'emergency'
+
+    def _initialize_position(self) -> tuple:
+        positions = {
+            'right': (50, 200 + self.lane * 20),
+            'down': (450 - self.lane * 20, 50),
+            'left': (850, 300 - self.lane * 20),
+            'up': (400 + self.lane * 20, 550)
+        }
+        return positions[self.direction]
+
+    def _calculate_stop_position(self) -> float:
+        stop_lines = {'right': 350, 'down': 200, 'left': 550, 'up': 400}
+        return stop_lines[self.direction] - self.size[0] - SimulationConfig.GAP
+
+    def move(self, current_green: int, current_yellow: int, vehicles_ahead: List['Vehicle'],
+            weather_modifier: float = 1.0) -> None:
+        if self._can_move(current_green, current_yellow, vehicles_ahead):
+            modified_speed = self.speed * weather_modifier
+            if self.direction in ['right', 'left']:
+                new_x = self.position[0] + (modified_speed if self.direction == 'right' else -modified_speed)
+                new_y = self.position[1]
+            else:  # up or down
+                new_x = self.position[0]
+                new_y = self.position[1] + (modified_speed if self.direction == 'down' else -modified_speed)
+            
+            self.position = (new_x, new_y)
+            self._check_crossing()
+        else:
+            self.wait_time += 1
+
+    def _can_move(self, current_green: int, current_yellow: int, vehicles_ahead: List['Vehicle']) -> bool:
+        if self.crossed:
+            return True
+        
+        direction_numbers = {'right': 0, 'down': 1, 'left': 2, 'up': 3}
+        # Yellow is the clearance interval before the next green: only vehicles already
+        # past the stop line (and priority vehicles) keep going
+        if not self.priority and (current_yellow or current_green != direction_numbers[self.direction]):
+            return False
+
+        if vehicles_ahead:
+            next_vehicle = vehicles_ahead[0]
+            if self._distance_to(next_vehicle) < SimulationConfig.MOVING_GAP:
+                return False
+
+        return True
+
+    def _distance_to(self, other: 'Vehicle') -> float:
+        return ((self.position[0] - other.position[0]) ** 2 + 
+                (self.position[1] - other.position[1]) ** 2) ** 0.5
+
+    def _check_crossing(self) -> None:
+        if not self.crossed:
+            stop_lines = {'right': 350, 'down': 200, 'left': 550, 'up': 400}
+            if ((self.direction in ['right', 'left'] and 
+                 abs(self.position[0] - stop_lines[self.direction]) > 50) or
+                (self.direction in ['up', 'down'] and 
+                 abs(self.position[1] - stop_lines[self.direction]) > 50)):
+                self.crossed = True
+
+class LaneIndex:
+    # Per (direction, lane) bookkeeping so neighbour lookups don't scan every vehicle.
+    # Vehicles never move backwards and spawn only with a clear gap, so within a lane
+    # spawn order is also the order of waiting vehicles from the stop line back.
+    def __init__(self):
+        self.lanes = {}   # (direction, lane) -> vehicles in spawn order (dict as ordered set)
+        self._tails = {}  # (direction, lane) -> last waiting vehicle
+        self._ahead = {}  # waiting vehicle -> waiting vehicle directly in front of it
+        self._behind = {}
+
+    def add(self, vehicle: Vehicle) -> None:
+        key = (vehicle.direction, vehicle.lane)
+        self.lanes.setdefault(key, {})[vehicle] = None
+        if not vehicle.crossed:
+            tail = self._tails.get(key)
+            self._ahead[vehicle] = tail
+            self._behind[vehicle] = None
+            if tail is not None:
+                self._behind[tail] = vehicle
+            self._tails[key] = vehicle
+
+    def mark_crossed(self, vehicle: Vehicle) -> None:
+        if vehicle not in self._ahead:
+            return
+        ahead = self._ahead.pop(vehicle)
+        behind = self._behind.pop(vehicle)
+        if ahead is not None:
+            self._behind[ahead] = behind
+        if behind is not None:
+            self._ahead[behind] = ahead
+        else:
+            self._tails[(vehicle.direction, vehicle.lane)] = ahead
+
+    def remove(self, vehicle: Vehicle) -> None:
+        self.mark_crossed(vehicle)
+        self.lanes[(vehicle.direction, vehicle.lane)].pop(vehicle, None)
+
+    def leader(self, vehicle: Vehicle) -> Optional[Vehicle]:
+        return self._ahead.get(vehicle)
+
+    def vehicles_ahead(self, vehicle: Vehicle) -> List[Vehicle]:
+        ahead = []
+        leader = self._ahead.get(vehicle)
+        while leader is not None:
+            ahead.append(leader)
+            leader = self._ahead[leader]
+        return ahead
+
+    def last_spawned(self, direction: str, lane: int) -> Optional[Vehicle]:
+        vehicles = self.lanes.get((direction, lane))
+        return next(reversed(vehicles)) if vehicles else None
+
+# Congestion adds 0.1 per waiting vehicle; keep the rounding of repeated addition
+CONGESTION_LEVELS = [0]
+for _ in range(11):
+    CONGESTION_LEVELS.append(CONGESTION_LEVELS[-1] + 0.1)
+
+class DirectionCounters:
+    # Per-direction counts kept up to date on spawn, crossing and removal, so the
+    # optimizer state never needs a pass over the vehicles
+    DIRECTIONS = {'right': 0, 'down': 1, 'left': 2, 'up': 3}
+
+    def __init__(self, flow_window: int = 60):
+        self.flow_window = flow_window
+        self.waiting = [0] * 4
+        self.recent_crossings = [0] * 4  # sum over the last flow_window ticks
+        self._history = deque()
+        self._current = [0] * 4
+
+    def spawned(self, direction: str, crossed: bool = False) -> None:
+        if not crossed:
+            self.waiting[self.DIRECTIONS[direction]] += 1
+
+    def crossed(self, direction: str, count: int = 1) -> None:
+        index = self.DIRECTIONS[direction]
+        self.waiting[index] -= count
+        self._current[index] += count
+
+    def removed(self, direction: str, crossed: bool = True) -> None:
+        if not crossed:
+            self.waiting[self.DIRECTIONS[direction]] -= 1
+
+    def advance(self, ticks: int = 1) -> None:
+        # Close the current tick and slide the flow window forward; any further ticks
+        # had no crossings, and more than a window of them leaves nothing to track
+        for _ in range(min(ticks, self.flow_window + 1)):
+            self._history.append(self._current)
+            for index, count in enumerate(self._current):
+                self.recent_crossings[index] += count
+            if len(self._history) > self.flow_window:
+                for index, count in enumerate(self._history.popleft()):
+                    self.recent_crossings[index] -= count
+            self._current = [0] * 4
+
+    def flow_rates(self) -> List[float]:
+        return [count / self.flow_window for count in self.recent_crossings]
+
+    def congestion_levels(self) -> List[float]:
+        # Same 0.1-per-vehicle accumulation the levels have always used
+        return [min(CONGESTION_LEVELS[min(count, 11)], 1.0) for count in self.waiting]
+
+    def history(self) -> List[List[int]]:
+        return [list(counts) for counts in self._history]
+
+    def copy(self) -> 'DirectionCounters':
+        counters = DirectionCounters(self.flow_window)
+        counters.waiting = list(self.waiting)
+        counters.recent_crossings = list(self.recent_crossings)
+        # Closed ticks are never modified again, so their rows can be shared
+        counters._history = deque(self._history)
+        counters._current = list(self._current)
+        return counters
+
+    def load_history(self, history: List[List[int]]) -> None:
+        self._history = deque(list(counts) for counts in history)
+        self.recent_crossings = [sum(column) for column in zip(*self._history)] or [0] * 4
+        self._current = [0] * 4
+
+class TrafficSimulation:
+    # Approaches that get vehicles from the generator; a network narrows this to
+    # the approaches on its edge
+    entry_directions = ('right', 'down', 'left', 'up')
+
+    def __init__(self, ai_optimizer: Optional[AITrafficOptimizer] = None,
+                 seed: Optional[int] = None):
+        self.config = SimulationConfig()
+        # One stream per simulation so runs are reproducible and independent of each other;
+        # rendering has its own generator so drawing never perturbs the model
+        self.rng = random.Random(seed)
+        self.ai_optimizer = ai_optimizer if ai_optimizer is not None else AITrafficOptimizer()
+        self.lane_index = LaneIndex()
+        self.counters = DirectionCounters()
+        self.vehicles = []
+        self.current_green = 0
+        self.current_yellow = False
+        self.phase_end = 0  # first tick of the next signal phase
+        self.time_elapsed = 0
+        # Recent values in fixed-size windows plus running aggregates, so memory stays
+        # constant however long the simulation runs
+        self.stats = {
+            'total_vehicles': 0,
+            'waiting_times': StreamingSeries(self.config.STATS_WINDOW, quantiles=True),
+            'throughput': StreamingSeries(self.config.STATS_WINDOW)
+        }
+        self.trips = TripStats(self.config.STATS_WINDOW)
+        self.weather = WeatherConditions(self.rng)
+        self.emergency_handler = EmergencyVehicleHandler(self.rng)
+        # Pre-sampled arrivals from a demand profile; None keeps the per-tick generator
+        self.demand: Optional[ArrivalSchedule] = None
+        self._renderer = None
+
+    def set_demand(self, profile: Optional[DemandProfile], seed: Optional[int] = None,
+                   seconds_per_tick: float = 1.0, start_hour: float = 0.0) -> None:
+        # Replace the constant SPAWN_PROBABILITY with time-of-day demand. Without a
+        # seed the arrival stream is seeded from the simulation's own generator.
+        if profile is None:
+            self.demand = None
+            return
+        if seed is None:
+            seed = self.rng.getrandbits(64)
+        self.demand = ArrivalSchedule(profile, list(VEHICLE_CONFIGS['speeds'].keys()), seed,
+                                      seconds_per_tick, start_hour, self.entry_directions)
+        self.demand.tick = self.time_elapsed - 1
+        self.demand.sampled_until = self.time_elapsed
+
+    def _count_waiting_vehicles(self) -> List[int]:
+        return list(self.counters.waiting)
+
+    def _calculate_flow_rates(self) -> List[float]:
+        return self.counters.flow_rates()
+
+    def _calculate_congestion_levels(self) -> List[float]:
+        return self.counters.congestion_levels()
+
+    async def update(self):
+        self.weather.update()
+        self.emergency_handler.update(self)
+        await self._update_signals()
+        self._update_vehicles()
+        self._generate_vehicles()
+        self._update_stats()
+        self.counters.advance()
+        self.trips.record_ticks(len(self.vehicles))
+        self.time_elapsed += 1
+
+    async def _update_signals(self):
+        state = self._get_current_state()
+        timing = await self.ai_optimizer.get_optimal_timing(state)
+        self._apply_signal_timing(timing)
+
+    def _get_current_state(self) -> Dict:
+        return {
+            'waiting_vehicles': self._count_waiting_vehicles(),
+            'flow_rates': self._calculate_flow_rates(),
+            'congestion': self._calculate_congestion_levels(),
+            'time_of_day': (self.demand.hour(self.time_elapsed) if self.demand is not None
+                            else time.localtime().tm_hour)
+        }
+
+    def _apply_signal_timing(self, timing: Dict):
+        # The phase model: the signals take turns, each green preceded by a yellow
+        # clearance interval in which no approach may enter (only vehicles already past
+        # the stop line, and priority vehicles, keep moving), so yellow is lost time.
+        # phase_end is the first tick of the next phase; a plan only takes effect at a
+        # phase end, however often it is asked for: its 'yellow' ticks (DEFAULT_YELLOW if
+        # it has none) when a green ends, its green time for the signal whose green starts.
+        while self.time_elapsed >= self.phase_end:
+            if self.current_yellow:
+                self.current_yellow = False
+                green_times = timing['green_times']
+                green = (green_times[self.current_green] if self.current_green < len(green_times)
+                         else SimulationConfig.DEFAULT_GREEN)
+                self.phase_end += max(int(green), 1)
+            else:
+                self.current_yellow = True
+                self.current_green = (self.current_green + 1) % SimulationConfig.NUM_SIGNALS
+                self.phase_end += max(int(timing.get('yellow', SimulationConfig.DEFAULT_YELLOW)), 0)
+
+    def _update_vehicles(self):
+        weather_modifier = self.weather.get_speed_modifier()
+        for vehicle in self.vehicles[:]:
+            was_crossed = vehicle.crossed
+            leader = self.lane_index.leader(vehicle)
+            vehicle.move(
+                self.current_green,
+                self.current_yellow,
+                [leader] if leader is not None else [],
+                weather_modifier
+            )
+            if vehicle.crossed and not was_crossed:
+                self.lane_index.mark_crossed(vehicle)
+                self.counters.crossed(vehicle.direction)
+                self.trips.record_crossing(vehicle.wait_time)
+            if self._is_vehicle_out_of_bounds(vehicle):
+                self.vehicles.remove(vehicle)
+                self.lane_index.remove(vehicle)
+                self.counters.removed(vehicle.direction, vehicle.crossed)
+                self.trips.record_exit()
+                self._on_vehicle_exit(vehicle)
+
+    def _get_vehicles_ahead(self, vehicle: Vehicle) -> List[Vehicle]:
+        # Waiting vehicles in the same lane, nearest first
+        return self.lane_index.vehicles_ahead(vehicle)
+
+    def _is_ahead(self, vehicle1: Vehicle, vehicle2: Vehicle) -> bool:
+        if vehicle1.direction in ['right', 'left']:
+            return ((vehicle1.direction == 'right' and 
+                    vehicle2.position[0] > vehicle1.position[0]) or
+                   (vehicle1.direction == 'left' and 
+                    vehicle2.position[0] < vehicle1.position[0]))
+        else:
+            return ((vehicle1.direction == 'down' and 
+                    vehicle2.position[1] > vehicle1.position[1]) or
+                   (vehicle1.direction == 'up' and 
+                    vehicle2.position[1] < vehicle1.position[1]))
+                    
+    def _generate_vehicles(self):
+        if self.demand is not None:
+            self._admit_arrivals()
+            return
+        if self.rng.random() < self.config.SPAWN_PROBABILITY and len(self.vehicles) < self.config.MAX_VEHICLES:
+            vehicle_type = self.rng.choice(list(VEHICLE_CONFIGS['speeds'].keys()))
+            direction = self.rng.choice(['right', 'down', 'left', 'up'])
+            lane = self.rng.randint(0, 2)
+            will_turn = self.rng.random() < 0.4
+            
+            new_vehicle = Vehicle(lane, vehicle_type, direction, will_turn)
+            if direction in self.entry_directions and self._is_safe_to_spawn(new_vehicle):
+                self._add_vehicle(new_vehicle)
+
+    def _admit_arrivals(self):
+        # This tick's scheduled arrivals join their lane's entry queue, and the head of
+        # each queue enters if there is room
+        demand = self.demand
+        demand.arrive(self.time_elapsed)
+        if not demand.queued:
+            return
+        for lane_id, direction, lane, vehicle_type, will_turn in list(demand.waiting()):
+            if len(self.vehicles) >= self.config.MAX_VEHICLES:
+                break
+            vehicle = Vehicle(lane, vehicle_type, direction, will_turn)
+            if self._is_safe_to_spawn(vehicle):
+                demand.admit(lane_id)
+                self._add_vehicle(vehicle)
+
+    def _add_vehicle(self, vehicle: Vehicle):
+        self.vehicles.append(vehicle)
+        self.lane_index.add(vehicle)
+        self.counters.spawned(vehicle.direction, vehicle.crossed)
+        self.trips.record_spawn()
+
+    def _on_vehicle_exit(self, vehicle: Vehicle):
+        pass
+
+    def _is_vehicle_out_of_bounds(self, vehicle: Vehicle) -> bool:
+        x, y = vehicle.position
+        return (x < -50 or x > 950 or y < -50 or y > 650)
+
+    def _is_safe_to_spawn(self, vehicle: Vehicle) -> bool:
+        # Older vehicles in the lane were already clear of the spawn point when the
+        # newest one spawned, so only the newest can still be too close
+        existing = self.lane_index.last_spawned(vehicle.direction, vehicle.lane)
+        return (existing is None or
+                self._distance_between_positions(existing.position, vehicle.position) >= SimulationConfig.GAP * 2)
+
+    def _distance_between_positions(self, pos1: tuple, pos2: tuple) -> float:
+        return ((pos1[0] - pos2[0]) ** 2 + (pos1[1] - pos2[1]) ** 2) ** 0.5
+
+    def _update_stats(self):
+        self.stats['total_vehicles'] = len([v for v in self.vehicles if v.crossed])
+        waiting_times = [v.wait_time for v in self.vehicles if not v.crossed]
+        
+        if waiting_times:
+            self.stats['waiting_times'].append(sum(waiting_times) / len(waiting_times))
+        
+        self.stats['throughput'].append(
+            self.stats['total_vehicles'] / (self.time_elapsed + 1)
+        )
+
+    def snapshot(self) -> bytes:
+        return encode_snapshot(*self._snapshot_state())
+
+    def _snapshot_state(self) -> tuple:
+        rng_version, rng_state, gauss_next = self.rng.getstate()
+        records, type_names = self._vehicle_records()
+        arrays = {
+            'vehicles': records,
+            'rng_state': np.array(rng_state, dtype=np.uint32),
+            'flow_history': np.array(self.counters.history(), dtype=np.int64).reshape(-1, 4),
+        }
+        series_headers = {}
+        for name in ('waiting_times', 'throughput'):
+            series_headers[name], series_arrays = self.stats[name].get_state()
+            arrays.update({f'{name}.{key}': array for key, array in series_arrays.items()})
+        trips_header, trips_arrays = self.trips.get_state()
+        arrays.update({f'trips.{key}': array for key, array in trips_arrays.items()})
+        demand_header = None
+        if self.demand is not None:
+            demand_header, demand_arrays = self.demand.get_state()
+            arrays.update({f'demand.{key}': array for key, array in demand_arrays.items()})
+
+        header = {
+            'time_elapsed': self.time_elapsed,
+            'current_green': self.current_green,
+            'current_yellow': self.current_yellow,
+            'phase_end': self.phase_end,
+            'config': asdict(self.config),
+            'weather': {
+                'conditions': self.weather.conditions,
+                'update_interval': self.weather.update_interval,
+                'last_update': self.weather.last_update,
+            },
+            'emergency': {
+                'emergency_probability': self.emergency_handler.emergency_probability,
+                'active_emergency': self.emergency_handler.active_emergency,
+                'emergency_cooldown': self.emergency_handler.emergency_cooldown,
+                'last_emergency': self.emergency_handler.last_emergency,
+                'next_emergency': self.emergency_handler.next_emergency,
+            },
+            'rng': {'version': rng_version, 'gauss_next': gauss_next},
+            'total_vehicles': self.stats['total_vehicles'],
+            'stats': series_headers,
+            'trips': trips_header,
+            'demand': demand_header,
+            'flow_window': self.counters.flow_window,
+            'vehicle_types': type_names,
+        }
+        return header, arrays
+
+    def restore(self, data: bytes) -> None:
+        self._restore_state(*decode_snapshot(data))
+
+    def _restore_state(self, header: Dict, arrays: Dict[str, np.ndarray]) -> None:
+        self.time_elapsed = header['time_elapsed']
+        self.current_green = header['current_green']
+        self.current_yellow = header['current_yellow']
+        self.phase_end = header.get('phase_end', self.time_elapsed)
+        self.config = SimulationConfig(**header['config'])
+
+        weather = header['weather']
+        self.weather.conditions = dict(weather['conditions'])
+        self.weather.update_interval = weather['update_interval']
+        self.weather.last_update = weather['last_update']
+        self.emergency_handler.next_emergency = None  # not in older snapshots
+        for name, value in header['emergency'].items():
+            setattr(self.emergency_handler, name, value)
+
+        # Restore in place: weather and the emergency handler share this generator
+        rng = header['rng']
+        self.rng.setstate((rng['version'], tuple(int(word) for word in arrays['rng_state']),
+                           rng['gauss_next']))
+
+        self.stats = {'total_vehicles': header['total_vehicles']}
+        for name, series_header in header['stats'].items():
+            prefix = f'{name}.'
+            series_arrays = {key[len(prefix):]: array for key, array in arrays.items()
+                             if key.startswith(prefix)}
+            self.stats[name] = StreamingSeries.from_state(series_header, series_arrays)
+        self.demand = None
+        if header.get('demand') is not None:
+            self.demand = ArrivalSchedule.from_state(header['demand'], {
+                key[len('demand.'):]: array for key, array in arrays.items()
+                if key.startswith('demand.')
+            })
+        self.counters = DirectionCounters(header['flow_window'])
+        self._load_vehicle_records(arrays['vehicles'], header['vehicle_types'])
+        self.counters.load_history(arrays['flow_history'].tolist())
+        # After the vehicles: adding them back goes through _add_vehicle, which would
+        # count every one of them as a new spawn
+        self.trips = TripStats.from_state(header['trips'], {
+            key[len('trips.'):]: array for key, array in arrays.items() if key.startswith('trips.')
+        })
+
+    @classmethod
+    def from_snapshot(cls, data: bytes,
+                      ai_optimizer: Optional[AITrafficOptimizer] = None) -> 'TrafficSimulation':
+        simulation = cls(ai_optimizer)
+        simulation.restore(data)
+        return simulation
+
+    def fork(self, seed: Optional[int] = None) -> 'TrafficSimulation':
+        # Copy of the current state sharing this simulation's optimizer; a seed makes
+        # the copy diverge from the original instead of replaying the same draws
+        simulation = self.from_snapshot(self.snapshot(), self.ai_optimizer)
+        if seed is not None:
+            simulation.rng.seed(seed)
+            if simulation.demand is not None:
+                simulation.demand.reseed(seed)
+        return simulation
+
+    def _vehicle_records(self) -> tuple:
+        type_names = list(VEHICLE_CONFIGS['sizes'].keys())
+        direction_map = {'right': 0, 'down': 1, 'left': 2, 'up': 3}
+        records = np.zeros(len(self.vehicles), dtype=VEHICLE_DTYPE)
+        for i, vehicle in enumerate(self.vehicles):
+            if vehicle.type not in type_names:
+                type_names.append(vehicle.type)
+            records[i] = (vehicle.position[0], vehicle.position[1], vehicle.speed,
+                          vehicle.creation_time, vehicle.wait_time, vehicle.lane,
+                          type_names.index(vehicle.type), direction_map[vehicle.direction],
+                          vehicle.crossed, vehicle.priority, vehicle.will_turn, vehicle.turned)
+        return records, type_names
+
+    def _load_vehicle_records(self, records: np.ndarray, type_names: List[str]) -> None:
+        directions = ['right', 'down', 'left', 'up']
+        self.lane_index = LaneIndex()
+        self.vehicles = []
+        for record in records.tolist():
+            (x, y, speed, creation_time, wait_time, lane, type_code, direction,
+             crossed, priority, will_turn, turned) = record
+            vehicle = Vehicle(lane, type_names[type_code], directions[direction], will_turn)
+            vehicle.position = (x, y)
+            vehicle.speed = speed
+            vehicle.creation_time = creation_time
+            vehicle.wait_time = wait_time
+            vehicle.crossed = crossed
+            vehicle.priority = priority
+            vehicle.turned = turned
+            self._add_vehicle(vehicle)
+
+    def render(self):
+        return self.renderer.figure(self)
+
+    def render_image(self) -> np.ndarray:
+        # The frame as an RGBA array, drawn over the cached background
+        return self.renderer.render_image(self)
+
+    @property
+    def renderer(self):
+        # Created on first draw so headless runs never build a figure (or import matplotlib)
+        if self._renderer is None:
+            from renderer import IntersectionRenderer
+            self._renderer = IntersectionRenderer()
+        return self._renderer
+
+    def _get_signal_color(self, signal_index: int) -> str:
+        if signal_index == self.current_green:
+            return 'yellow' if self.current_yellow else 'green'
+        return 'red'
@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from headless import ENGINES, FixedTimingOptimizer, run_simulation_async
+from ensemble import replication_seeds
+
+# Named demand levels as the chance of a new vehicle per tick
+DEMAND_PROFILES = {'off-peak': 0.05, 'normal': 0.3, 'peak': 0.6}
+
+
+@dataclass(frozen=True)
+class SignalPlan:
+    green_times: Tuple[int, ...]
+    yellow: int
+
+    @property
+    def cycle_length(self) -> int:
+        return sum(self.green_times) + len(self.green_times) * self.yellow
+
+    def config_values(self) -> Dict:
+        # The SimulationConfig defaults that reproduce this plan
+        return {
+            'DEFAULT_GREEN': round(sum(self.green_times) / len(self.green_times)),
+            'DEFAULT_MIN': min(self.green_times),
+            'DEFAULT_MAX': max(self.green_times),
+            'DEFAULT_YELLOW': self.yellow,
+        }
+
+
+class PlanOptimizer(FixedTimingOptimizer):
+    # Answers every request with one candidate plan, unclamped
+    def __init__(self, plan: SignalPlan):
+        super().__init__()
+        self.timing = {'green_times': list(plan.green_times), 'yellow': plan.yellow,
+                       'cycle_length': plan.cycle_length}
+
+    async def get_optimal_timing(self, current_state: Dict) -> Dict:
+        return self.timing
+
+
+def candidate_plans(cycle_lengths=(60, 80, 100, 120, 150), yellows=(3, 5),
+                    splits=(0.3, 0.4, 0.5, 0.6, 0.7), min_green: int = 5) -> List[SignalPlan]:
+    # A split is the share of green going to the horizontal approaches (right, left)
+    plans = []
+    for cycle_length, yellow, split in itertools.product(cycle_lengths, yellows, splits):
+        green = cycle_length - 4 * yellow
+        horizontal = round(green * split / 2)
+        vertical = round(green * (1 - split) / 2)
+        if min(horizontal, vertical) >= min_green:
+            plans.append(SignalPlan((horizontal, vertical, horizontal, vertical), yellow))
+    return plans
+
+
+def evaluate(task: tuple) -> Dict:
+    plan, engine, spawn_probability, ticks, seed = task
+    simulation = ENGINES[engine](PlanOptimizer(plan), seed=seed)
+    simulation.config.SPAWN_PROBABILITY = spawn_probability
+    asyncio.run(run_simulation_async(simulation, ticks))
+    return simulation.trips.summary()
+
+
+def score(kpis: Dict) -> tuple:
+    # Lower is better: delay per crossing vehicle first, then more vehicles served
+    return (kpis['mean_crossing_wait'], -kpis['exit_rate'])
+
+
+@dataclass
+class TuningResult:
+    profile: str
+    spawn_probability: float
+    plan: SignalPlan
+    kpis: Dict
+    rounds: List[Dict] = field(default_factory=list)
+    tied: int = 1  # plans in the last round that scored the same as `plan`
+
+    def to_dict(self) -> Dict:
+        # A tie names no plan: the KPIs can't tell the tied plans apart
+        winner = self.tied == 1
+        return {
+            'profile': self.profile,
+            'spawn_probability': self.spawn_probability,
+            'tied': self.tied,
+            'green_times': list(self.plan.green_times) if winner else None,
+            'cycle_length': self.plan.cycle_length if winner else None,
+            'config': self.plan.config_values() if winner else None,
+            'kpis': self.kpis,
+            'rounds': self.rounds,
+        }
+
+
+def successive_halving(executor, plans: List[SignalPlan], profile: str,
+                       spawn_probability: float, engine: str, min_ticks: int, max_ticks: int,
+                       eta: int, replications: int, seed: int, workers: int) -> TuningResult:
+    # Every round runs the survivors eta times longer and keeps the best 1/eta of them,
+    # so most of the budget goes to the few plans that look promising
+    survivors = list(plans)
+    ticks = min_ticks
+    rounds = []
+    while True:
+        seeds = replication_seeds(seed + ticks, replications)
+        tasks = [(plan, engine, spawn_probability, ticks, run_seed)
+                 for plan in survivors for run_seed in seeds]
+        results = list(executor.map(evaluate, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+        kpis = []
+        for index in range(len(survivors)):
+            runs = results[index * replications:(index + 1) * replications]
+            kpis.append({key: sum(run[key] for run in runs) / len(runs) for key in runs[0]})
+        ranked = sorted(range(len(survivors)), key=lambda index: score(kpis[index]))
+        rounds.append({'ticks': ticks, 'candidates': len(survivors),
+                       'best_mean_crossing_wait': kpis[ranked[0]]['mean_crossing_wait']})
+
+        if len(survivors) == 1 or ticks >= max_ticks:
+            best = ranked[0]
+            tied = sum(score(kpis[index]) == score(kpis[best]) for index in ranked)
+            return TuningResult(profile, spawn_probability, survivors[best], kpis[best], rounds,
+                                tied)
+        survivors = [survivors[index] for index in ranked[:max(1, math.ceil(len(survivors) / eta))]]
+        ticks = min(ticks * eta, max_ticks)
+
+
+class _InlineExecutor:
+    def map(self, function, tasks, chunksize=1):
+        return map(function, tasks)
+
+
+def tune(profiles: Dict[str, float], plans: Optional[List[SignalPlan]] = None,
+         engine: str = 'event', min_ticks: int = 500, max_ticks: int = 8000, eta: int = 3,
+         replications: int = 2, seed: int = 0,
+         workers: Optional[int] = None) -> List[TuningResult]:
+    plans = plans or candidate_plans()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [successive_halving(_InlineExecutor(), plans, name, probability, engine,
+                                   min_ticks, max_ticks, eta, replications, seed, workers)
+                for name, probability in profiles.items()]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [successive_halving(executor, plans, name, probability, engine,
+                                   min_ticks, max_ticks, eta, replications, seed, workers)
+                for name, probability in profiles.items()]
+
+
+def format_report(results: List[TuningResult], elapsed: float) -> str:
+    lines = [f"Tuned {len(results)} demand profiles in {elapsed:.1f} s"]
+    for result in results:
+        kpis = result.kpis
+        if result.tied > 1:
+            plan = f"no difference between the last {result.tied} plans"
+        else:
+            plan = (f"greens={list(result.plan.green_times)} yellow={result.plan.yellow} "
+                    f"cycle={result.plan.cycle_length}")
+        lines.append(
+            f"{result.profile:<10} p={result.spawn_probability:<5} {plan}  "
+            f"wait={kpis['mean_crossing_wait']:.2f} "
+            f"p95={kpis['p95_crossing_wait']:.2f} exits/tick={kpis['exit_rate']:.4f}"
+        )
+    return "\n".join(lines)
+
+
+def parse_profile(text: str) -> Tuple[str, float]:
+    if '=' in text:
+        name, probability = text.split('=', 1)
+        return name, float(probability)
+    return text, DEMAND_PROFILES[text]
+
+
+def main(argv: Optional[List[str]] = None) -> List[TuningResult]:
+    parser = argparse.ArgumentParser(
+        description="Search signal plans per demand profile with successive halving")
+    parser.add_argument('--profile', action='append', type=parse_profile, default=None,
+                        help="NAME or NAME=SPAWN_PROBABILITY; repeatable "
+                             f"(default: {', '.join(DEMAND_PROFILES)})")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='event')
+    parser.add_argument('--min-ticks', type=int, default=500)
+    parser.add_argument('--max-ticks', type=int, default=8000)
+    parser.add_argument('--eta', type=int, default=3, help="keep 1/eta of the plans per round")
+    parser.add_argument('--replications', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    profiles = dict(args.profile) if args.profile else dict(DEMAND_PROFILES)
+    start = time.perf_counter()
+    results = tune(profiles, engine=args.engine, min_ticks=args.min_ticks,
+                   max_ticks=args.max_ticks, eta=args.eta, replications=args.replications,
+                   seed=args.seed, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    if args.json:
+        print(json.dumps([result.to_dict() for result in results], indent=2))
+    else:
+        print(format_report(results, elapsed))
+    return results
+
+
+if __name__ == "__main__":
+    main()
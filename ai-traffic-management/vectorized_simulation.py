@@ -0,0 +1,464 @@
+import bisect
+from dataclasses import replace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from traffic_core import (SimulationConfig, VEHICLE_CONFIGS, AITrafficOptimizer, Vehicle,
+                          TrafficSimulation)
+from snapshot import VEHICLE_DTYPE
+from streaming_stats import StreamingSeries
+
+# Direction codes follow the signal numbering used by Vehicle._can_move
+DIRECTIONS = ['right', 'down', 'left', 'up']
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+DIRECTION_DX = np.array([1.0, 0.0, -1.0, 0.0])
+DIRECTION_DY = np.array([0.0, 1.0, 0.0, -1.0])
+HORIZONTAL = np.array([True, False, True, False])
+STOP_LINES = np.array([350.0, 200.0, 550.0, 400.0])
+
+
+class VehicleArrays:
+    # Struct-of-arrays vehicle storage, kept in spawn order like the original list
+    FIELDS = {
+        'id': np.int64,
+        'x': np.float64,
+        'y': np.float64,
+        'speed': np.float64,
+        'lane': np.int16,
+        'direction': np.int8,
+        'type': np.int16,
+        'crossed': np.bool_,
+        'priority': np.bool_,
+        'will_turn': np.bool_,
+        'turned': np.bool_,
+        'wait_time': np.int64,
+        'creation_time': np.float64,
+    }
+
+    def __init__(self, capacity: int = 64):
+        self.count = 0
+        self.next_id = 0
+        # Bumped whenever slots shift so views know to look themselves up again
+        self.generation = 0
+        self.type_names = list(VEHICLE_CONFIGS['sizes'].keys())
+        self.type_codes = {name: code for code, name in enumerate(self.type_names)}
+        # (direction code, lane) -> ids of the waiting vehicles in spawn order, which is
+        # queue order from the stop line back; what LaneIndex keeps for the object engine
+        self.waiting_lanes: Dict[tuple, List[int]] = {}
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self):
+        return iter([VehicleView(self, int(vehicle_id)) for vehicle_id in self.id[:self.count]])
+
+    def __getitem__(self, index: int) -> 'VehicleView':
+        return VehicleView(self, int(self.id[:self.count][index]))
+
+    def _type_code(self, vehicle_type: str) -> int:
+        if vehicle_type not in self.type_codes:
+            self.type_codes[vehicle_type] = len(self.type_names)
+            self.type_names.append(vehicle_type)
+        return self.type_codes[vehicle_type]
+
+    def _grow(self):
+        capacity = len(self.id) * 2
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def append(self, vehicle: Vehicle) -> None:
+        if self.count == len(self.id):
+            self._grow()
+        i = self.count
+        self.id[i] = self.next_id
+        self.x[i], self.y[i] = vehicle.position
+        self.speed[i] = vehicle.speed
+        self.lane[i] = vehicle.lane
+        self.direction[i] = DIRECTION_CODES[vehicle.direction]
+        self.type[i] = self._type_code(vehicle.type)
+        self.crossed[i] = vehicle.crossed
+        self.priority[i] = vehicle.priority
+        self.will_turn[i] = vehicle.will_turn
+        self.turned[i] = vehicle.turned
+        self.wait_time[i] = vehicle.wait_time
+        self.creation_time[i] = vehicle.creation_time
+        if not vehicle.crossed:
+            self.waiting_lanes.setdefault(self._lane_key(i), []).append(self.next_id)
+        self.next_id += 1
+        self.count += 1
+
+    def _lane_key(self, slot: int) -> tuple:
+        return (int(self.direction[slot]), int(self.lane[slot]))
+
+    def _unlist(self, slots: np.ndarray) -> None:
+        for slot in slots.tolist():
+            self.waiting_lanes[self._lane_key(slot)].remove(int(self.id[slot]))
+
+    def index_lanes(self) -> None:
+        self.waiting_lanes = {}
+        for slot in np.flatnonzero(~self.crossed[:self.count]).tolist():
+            self.waiting_lanes.setdefault(self._lane_key(slot), []).append(int(self.id[slot]))
+
+    def set_crossed(self, slots: np.ndarray, crossed: bool = True) -> None:
+        slots = slots[self.crossed[slots] != crossed]
+        if crossed:
+            self._unlist(slots)
+        else:
+            for slot in slots.tolist():
+                bisect.insort(self.waiting_lanes.setdefault(self._lane_key(slot), []),
+                              int(self.id[slot]))
+        self.crossed[slots] = crossed
+
+    def waiting_ahead(self, slot: int) -> List[int]:
+        # Ids of the waiting vehicles in front of a waiting vehicle, nearest first
+        lane = self.waiting_lanes.get(self._lane_key(slot), [])
+        return lane[:bisect.bisect_left(lane, int(self.id[slot]))][::-1]
+
+    def remove(self, vehicle: 'VehicleView') -> None:
+        keep = np.ones(self.count, dtype=bool)
+        keep[vehicle._slot()] = False
+        self.keep(keep)
+
+    def keep(self, mask: np.ndarray) -> None:
+        if mask.all():
+            return
+        self._unlist(np.flatnonzero(~mask & ~self.crossed[:self.count]))
+        kept = int(mask.sum())
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[:kept] = array[:self.count][mask]
+        self.count = kept
+        self.generation += 1
+
+    def clear(self) -> None:
+        self.count = 0
+        self.waiting_lanes = {}
+        self.generation += 1
+
+    def copy(self) -> 'VehicleArrays':
+        arrays = VehicleArrays(max(self.count, 1))
+        for name in self.FIELDS:
+            getattr(arrays, name)[:self.count] = getattr(self, name)[:self.count]
+        arrays.count = self.count
+        arrays.next_id = self.next_id
+        arrays.type_names = list(self.type_names)
+        arrays.type_codes = dict(self.type_codes)
+        arrays.waiting_lanes = {key: list(ids) for key, ids in self.waiting_lanes.items()}
+        return arrays
+
+    def slot_of(self, vehicle_id: int) -> int:
+        slot = int(np.searchsorted(self.id[:self.count], vehicle_id))
+        if slot >= self.count or self.id[slot] != vehicle_id:
+            raise LookupError(f"Vehicle {vehicle_id} is no longer in the simulation")
+        return slot
+
+
+class VehicleView(Vehicle):
+    # Vehicle facade over one row of VehicleArrays, so renderers and handlers keep working
+    def __init__(self, arrays: VehicleArrays, vehicle_id: int, slot: Optional[int] = None):
+        self._arrays = arrays
+        self._id = vehicle_id
+        self._cached_slot = arrays.slot_of(vehicle_id) if slot is None else slot
+        self._generation = arrays.generation
+
+    def _slot(self) -> int:
+        if self._generation != self._arrays.generation:
+            self._cached_slot = self._arrays.slot_of(self._id)
+            self._generation = self._arrays.generation
+        return self._cached_slot
+
+    def __eq__(self, other) -> bool:
+        return (isinstance(other, VehicleView) and other._arrays is self._arrays
+                and other._id == self._id)
+
+    def __hash__(self) -> int:
+        return hash((id(self._arrays), self._id))
+
+    @property
+    def lane(self) -> int:
+        return int(self._arrays.lane[self._slot()])
+
+    @property
+    def direction(self) -> str:
+        return DIRECTIONS[self._arrays.direction[self._slot()]]
+
+    @property
+    def type(self) -> str:
+        return self._arrays.type_names[self._arrays.type[self._slot()]]
+
+    @property
+    def speed(self) -> float:
+        return float(self._arrays.speed[self._slot()])
+
+    @property
+    def size(self) -> tuple:
+        return VEHICLE_CONFIGS['sizes'].get(self.type, (30, 20))
+
+    @property
+    def color(self) -> str:
+        return VEHICLE_CONFIGS['colors'].get(self.type, 'gray')
+
+    @property
+    def priority(self) -> bool:
+        return bool(self._arrays.priority[self._slot()])
+
+    @property
+    def will_turn(self) -> bool:
+        return bool(self._arrays.will_turn[self._slot()])
+
+    @property
+    def turned(self) -> bool:
+        return bool(self._arrays.turned[self._slot()])
+
+    @property
+    def creation_time(self) -> float:
+        return float(self._arrays.creation_time[self._slot()])
+
+    @property
+    def stop_position(self) -> float:
+        return self._calculate_stop_position()
+
+    @property
+    def position(self) -> tuple:
+        slot = self._slot()
+        return (float(self._arrays.x[slot]), float(self._arrays.y[slot]))
+
+    @position.setter
+    def position(self, value: tuple):
+        slot = self._slot()
+        self._arrays.x[slot], self._arrays.y[slot] = value
+
+    @property
+    def crossed(self) -> bool:
+        return bool(self._arrays.crossed[self._slot()])
+
+    @crossed.setter
+    def crossed(self, value: bool):
+        self._arrays.set_crossed(np.array([self._slot()]), bool(value))
+
+    @property
+    def wait_time(self) -> int:
+        return int(self._arrays.wait_time[self._slot()])
+
+    @wait_time.setter
+    def wait_time(self, value: int):
+        self._arrays.wait_time[self._slot()] = value
+
+
+class VectorizedTrafficSimulation(TrafficSimulation):
+    def __init__(self, ai_optimizer: Optional[AITrafficOptimizer] = None,
+                 seed: Optional[int] = None):
+        self._arrays = VehicleArrays()
+        self._lane_tails = {}  # (direction code, lane) -> id of the newest vehicle
+        super().__init__(ai_optimizer, seed)
+
+    @property
+    def vehicles(self) -> VehicleArrays:
+        return self._arrays
+
+    @vehicles.setter
+    def vehicles(self, vehicles: List[Vehicle]):
+        self._arrays.clear()
+        self._lane_tails = {}
+        for vehicle in vehicles:
+            self._add_vehicle(vehicle)
+
+    def _add_vehicle(self, vehicle: Vehicle):
+        self._lane_tails[(DIRECTION_CODES[vehicle.direction], vehicle.lane)] = self._arrays.next_id
+        self._arrays.append(vehicle)
+        self.counters.spawned(vehicle.direction, vehicle.crossed)
+        self.trips.record_spawn()
+
+    def clone(self, seed: Optional[int] = None,
+              ai_optimizer: Optional[AITrafficOptimizer] = None) -> 'VectorizedTrafficSimulation':
+        # Like fork(), but copies the vehicle arrays directly instead of going through
+        # a snapshot, which makes it cheap enough for many short rollouts. Always
+        # returns a plain VectorizedTrafficSimulation.
+        simulation = VectorizedTrafficSimulation(ai_optimizer or self.ai_optimizer)
+        simulation.config = replace(self.config)
+        simulation.entry_directions = self.entry_directions
+        simulation._arrays = self._arrays.copy()
+        simulation._lane_tails = dict(self._lane_tails)
+        simulation.current_green = self.current_green
+        simulation.current_yellow = self.current_yellow
+        simulation.phase_end = self.phase_end
+        simulation.time_elapsed = self.time_elapsed
+        simulation.counters = self.counters.copy()
+        simulation.stats = {name: value.copy() if isinstance(value, StreamingSeries) else value
+                            for name, value in self.stats.items()}
+        simulation.trips = self.trips.copy()
+        simulation.weather.conditions = dict(self.weather.conditions)
+        simulation.weather.last_update = self.weather.last_update
+        simulation.emergency_handler.active_emergency = self.emergency_handler.active_emergency
+        simulation.emergency_handler.last_emergency = self.emergency_handler.last_emergency
+        simulation.emergency_handler.next_emergency = self.emergency_handler.next_emergency
+        if self.demand is not None:
+            simulation.demand = self.demand.copy(seed)
+        if seed is None:
+            simulation.rng.setstate(self.rng.getstate())
+        else:
+            simulation.rng.seed(seed)
+        return simulation
+
+    def _vehicle_records(self) -> tuple:
+        a = self._arrays
+        records = np.zeros(a.count, dtype=VEHICLE_DTYPE)
+        for name in VEHICLE_DTYPE.names:
+            records[name] = getattr(a, name)[:a.count]
+        return records, list(a.type_names)
+
+    def _load_vehicle_records(self, records: np.ndarray, type_names: List[str]) -> None:
+        a = self._arrays
+        a.clear()
+        while len(a.id) < len(records):
+            a._grow()
+        a.type_names = list(type_names)
+        a.type_codes = {name: code for code, name in enumerate(a.type_names)}
+        count = len(records)
+        for name in VEHICLE_DTYPE.names:
+            getattr(a, name)[:count] = records[name]
+        a.id[:count] = np.arange(count)
+        a.count = count
+        a.next_id = count
+        a.index_lanes()
+        self.counters.waiting = np.bincount(records['direction'][~records['crossed']],
+                                            minlength=4).tolist()
+
+        # Newest vehicle per lane is the last one in spawn order
+        lane_keys = list(zip(records['direction'].tolist(), records['lane'].tolist()))
+        self._lane_tails = {key: vehicle_id for vehicle_id, key in enumerate(lane_keys)}
+
+    def _update_vehicles(self):
+        a = self._arrays
+        n = a.count
+        if not n:
+            return
+
+        direction = a.direction[:n]
+        step = a.speed[:n] * self.weather.get_speed_modifier()
+        # Vehicles that have crossed always move; the rest are resolved together
+        moving = a.crossed[:n].copy()
+        waiting = np.flatnonzero(~moving)
+        if waiting.size:
+            moving[waiting] = self._resolve_waiting(waiting, step[waiting])
+
+        x, y = a.x[:n], a.y[:n]
+        x[moving] += DIRECTION_DX[direction[moving]] * step[moving]
+        y[moving] += DIRECTION_DY[direction[moving]] * step[moving]
+        a.wait_time[:n][~moving] += 1
+
+        newly_moved = moving & ~a.crossed[:n]
+        newly_crossed = np.zeros(n, dtype=bool)
+        newly_crossed[newly_moved] = self._past_crossing(
+            x[newly_moved], y[newly_moved], direction[newly_moved])
+        a.set_crossed(np.flatnonzero(newly_crossed))
+        for code, count in enumerate(np.bincount(direction[newly_crossed], minlength=4).tolist()):
+            if count:
+                self.counters.crossed(DIRECTIONS[code], count)
+        for wait_time in a.wait_time[:n][newly_crossed].tolist():
+            self.trips.record_crossing(wait_time)
+
+        out_of_bounds = (x < -50) | (x > 950) | (y < -50) | (y > 650)
+        if out_of_bounds.any():
+            removed_waiting = out_of_bounds & ~a.crossed[:n]
+            for code in direction[removed_waiting].tolist():
+                self.counters.removed(DIRECTIONS[code], crossed=False)
+            self.trips.record_exit(int(out_of_bounds.sum()))
+            for vehicle_id in a.id[:n][out_of_bounds].tolist():
+                self._on_vehicle_exit(VehicleView(a, vehicle_id))
+            a.keep(~out_of_bounds)
+
+    def _resolve_waiting(self, slots: np.ndarray, step: np.ndarray) -> np.ndarray:
+        # The object model moves vehicles one at a time in spawn order, and a waiting
+        # vehicle is only held back by its leader: the nearest older vehicle in its
+        # lane that is still waiting after its own move this tick. With the waiting
+        # vehicles grouped by lane (spawn order within a lane is queue order), every
+        # leader is a running maximum over the lane, so each pass below is linear.
+        # Each vehicle only depends on earlier ones, so iterating to a fixed point
+        # reproduces the sequential result exactly, usually in two passes.
+        a = self._arrays
+        lane_key = a.direction[slots].astype(np.int64) * 1024 + a.lane[slots]
+        order = np.argsort(lane_key, kind='stable')  # slots are already in spawn order
+        slots, step, lane_key = slots[order], step[order], lane_key[order]
+        x, y = a.x[slots], a.y[slots]
+        direction = a.direction[slots]
+        moved_x = x + DIRECTION_DX[direction] * step
+        moved_y = y + DIRECTION_DY[direction] * step
+        # Whether a vehicle that moves this tick crosses depends only on itself
+        crosses = self._past_crossing(moved_x, moved_y, direction)
+
+        signal_allows = a.priority[slots] | ((direction == self.current_green) & (not self.current_yellow))
+
+        index = np.arange(len(slots))
+        first_in_lane = np.ones(len(slots), dtype=bool)
+        first_in_lane[1:] = lane_key[1:] != lane_key[:-1]
+        lane_start = np.maximum.accumulate(np.where(first_in_lane, index, 0))
+
+        moved = signal_allows.copy()
+        for _ in range(len(slots) + 1):
+            new_x = np.where(moved, moved_x, x)
+            new_y = np.where(moved, moved_y, y)
+            # Leader: the last vehicle before this one in the lane that is still waiting
+            still_waiting = ~(moved & crosses)
+            last_waiting = np.maximum.accumulate(np.where(still_waiting, index, -1))
+            leader = np.empty_like(last_waiting)
+            leader[0] = -1
+            leader[1:] = last_waiting[:-1]
+            has_leader = leader >= lane_start
+            distance = ((x - new_x[leader]) ** 2 + (y - new_y[leader]) ** 2) ** 0.5
+            blocked = has_leader & (distance < SimulationConfig.MOVING_GAP)
+
+            resolved = signal_allows & ~blocked
+            if np.array_equal(resolved, moved):
+                break
+            moved = resolved
+        result = np.empty_like(moved)
+        result[order] = moved
+        return result
+
+    def _get_vehicles_ahead(self, vehicle: Vehicle) -> List[Vehicle]:
+        # What LaneIndex.vehicles_ahead gives the object engine: the older waiting
+        # vehicles in the same lane, nearest first, since spawn order is queue order
+        a = self._arrays
+        if not isinstance(vehicle, VehicleView) or vehicle._arrays is not a or vehicle.crossed:
+            return []
+        ahead = a.waiting_ahead(vehicle._slot())
+        slots = a.id[:a.count].searchsorted(ahead).tolist() if ahead else []
+        return [VehicleView(a, vehicle_id, slot) for vehicle_id, slot in zip(ahead, slots)]
+
+    def _past_crossing(self, x: np.ndarray, y: np.ndarray, direction: np.ndarray) -> np.ndarray:
+        along = np.where(HORIZONTAL[direction], x, y)
+        return np.abs(along - STOP_LINES[direction]) > 50
+
+    def _is_safe_to_spawn(self, vehicle: Vehicle) -> bool:
+        # Same argument as TrafficSimulation._is_safe_to_spawn: only the newest
+        # vehicle in the lane can still be near the spawn point
+        tail = self._lane_tails.get((DIRECTION_CODES[vehicle.direction], vehicle.lane))
+        if tail is None:
+            return True
+        try:
+            slot = self._arrays.slot_of(tail)
+        except LookupError:
+            return True
+        x, y = vehicle.position
+        distance = ((self._arrays.x[slot] - x) ** 2 + (self._arrays.y[slot] - y) ** 2) ** 0.5
+        return distance >= SimulationConfig.GAP * 2
+
+    def _update_stats(self):
+        a = self._arrays
+        crossed = a.crossed[:a.count]
+        self.stats['total_vehicles'] = int(crossed.sum())
+        waiting_times = a.wait_time[:a.count][~crossed]
+
+        if waiting_times.size:
+            self.stats['waiting_times'].append(int(waiting_times.sum()) / waiting_times.size)
+
+        self.stats['throughput'].append(
+            self.stats['total_vehicles'] / (self.time_elapsed + 1)
+        )
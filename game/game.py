@@ -2,22 +2,37 @@
 import random
 import time
 import asyncio
+import functools
 import streamlit as st
 from typing import Dict, List, Optional
 import numpy as np
-import g4f
-from g4f.client import Client
 from dataclasses import dataclass
 from collections import deque
 import pygame
 import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'ai-traffic-management'))
+from sim_loop import FixedTimestepLoop
+from background_optimizer import BackgroundOptimizer, CircuitBreaker
+from pygame_renderer import PygameRenderer
+from trace_replay import TraceReplay
 
 # PyGame Configuration
-pygame.init()
 SCREEN_WIDTH, SCREEN_HEIGHT = 900, 600
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Adaptive Traffic Management System")
-clock = pygame.time.Clock()
+# The window is opened by init_display() when the app starts, not on import
+screen = None
+clock = None
+
+def init_display() -> pygame.Surface:
+    global screen, clock
+    if screen is None:
+        pygame.init()
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption("Adaptive Traffic Management System")
+        clock = pygame.time.Clock()
+    return screen
 
 # Configuration
 @dataclass
@@ -99,9 +114,19 @@ class EmergencyVehicleHandler:
 
 class AITrafficOptimizer:
     def __init__(self):
-        self.client = Client()
+        self._client = None
         self.history = deque(maxlen=10)
         self.model = "gpt-4o-mini"
+        self.timeout = 10.0  # seconds to wait for the backend
+        self.breaker = CircuitBreaker()
+
+    @property
+    def client(self):
+        # g4f is only imported once a request actually goes to the backend
+        if self._client is None:
+            from g4f.client import Client
+            self._client = Client()
+        return self._client
 
     async def get_optimal_timing(self, current_state: Dict) -> Dict:
         try:
@@ -120,14 +145,22 @@ class AITrafficOptimizer:
             return self._get_fallback_timing()
 
     async def _get_ai_recommendation(self, context: str) -> str:
+        if not self.breaker.allow():
+            return self._get_fallback_timing()
         try:
-            response = self.client.chat.completions.create(
+            # The client call is synchronous; run it on a worker thread so the
+            # event loop (and whatever is drawing) keeps going while it waits
+            loop = asyncio.get_running_loop()
+            response = await asyncio.wait_for(loop.run_in_executor(None, functools.partial(
+                self.client.chat.completions.create,
                 model=self.model,
                 messages=[{"role": "user", "content": context}],
                 web_search=False
-            )
+            )), self.timeout)
+            self.breaker.record_success()
             return response.choices[0].message.content
         except Exception:
+            self.breaker.record_failure()
             return self._get_fallback_timing()
 
     def _prepare_ai_context(self, state: Dict) -> str:
@@ -246,7 +279,8 @@ class Vehicle:
 class TrafficSimulation:
     def __init__(self):
         self.config = SimulationConfig()
-        self.ai_optimizer = AITrafficOptimizer()
+        # The model answers in the background; ticks use the latest plan it published
+        self.ai_optimizer = BackgroundOptimizer(AITrafficOptimizer())
         self.vehicles = []
         self.current_green = 0
         self.current_yellow = False
@@ -447,15 +481,28 @@ class TrafficSimulation:
 async def main():
     st.set_page_config(page_title="AI Traffic Simulation", layout="wide")
     st.title("AI Traffic Simulation")
+    init_display()
 
     if 'simulation' not in st.session_state:
         st.session_state.simulation = TrafficSimulation()
         st.session_state.running = False
 
+    # A recorded trace (headless.py --trace) plays back in the window without re-simulating
+    trace_path = st.sidebar.text_input("Replay trace directory")
+    if trace_path:
+        await replay_trace(trace_path)
+        return
+
     # Sidebar controls
     st.sidebar.title("Simulation Controls")
     if st.sidebar.button("Start/Stop Simulation"):
         st.session_state.running = not st.session_state.running
+    speed = st.sidebar.slider("Speed Multiplier", 0.5, 20.0, 1.0, 0.5)
+    time_warp = st.sidebar.checkbox("Time Warp (run as fast as possible)")
+    render_fps = st.sidebar.slider("Render FPS", 1, 120, 60)
+    # Cached draws only the dirty rectangles over a pre-rendered road layer
+    render_mode = st.sidebar.radio("Renderer", ["Cached", "Full redraw"])
+    renderer = PygameRenderer(screen)
 
     # Weather display
     st.sidebar.subheader("Weather Conditions")
@@ -475,30 +522,69 @@ async def main():
         st.subheader("Statistics")
         stats_placeholder = st.empty()
 
+    def draw():
+        if render_mode == "Cached":
+            renderer.render(st.session_state.simulation)
+        else:
+            st.session_state.simulation.render()
+        clock.tick()  # measures the display rate; the loop paces the frames
+        
+        with stats_placeholder:
+            stats = st.session_state.simulation.stats
+            st.metric("Total Vehicles", stats['total_vehicles'])
+            st.metric("Average Wait Time", 
+                     round(sum(stats['waiting_times'][-10:]) / 10 
+                           if stats['waiting_times'] else 0, 2))
+            st.metric("Throughput", 
+                     round(stats['throughput'][-1], 2) 
+                     if stats['throughput'] else 0)
+            st.metric("Time Elapsed", st.session_state.simulation.time_elapsed)
+            st.metric("Sim Rate (ticks/s)", round(loop.stats.sim_rate, 1))
+            st.metric("Render Rate (fps)", round(loop.stats.render_rate, 1))
+            st.metric("Display Rate (fps)", round(clock.get_fps(), 1))
+        handle_events()
+
+    # The model ticks at 10 Hz times the speed multiplier (or flat out in time warp)
+    # and the window is redrawn at the render rate, independently of the tick rate
+    loop = FixedTimestepLoop(st.session_state.simulation, tick_rate=10, speed=speed,
+                             time_warp=time_warp, render_fps=render_fps, on_render=draw)
+
     # PyGame loop
     while True:
         if st.session_state.running:
-            await st.session_state.simulation.update()
-            st.session_state.simulation.render()
-            
-            with stats_placeholder:
-                stats = st.session_state.simulation.stats
-                st.metric("Total Vehicles", stats['total_vehicles'])
-                st.metric("Average Wait Time", 
-                         round(sum(stats['waiting_times'][-10:]) / 10 
-                               if stats['waiting_times'] else 0, 2))
-                st.metric("Throughput", 
-                         round(stats['throughput'][-1], 2) 
-                         if stats['throughput'] else 0)
-                st.metric("Time Elapsed", st.session_state.simulation.time_elapsed)
+            await loop.run()
         
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-        
-        clock.tick(30)  # Limit to 30 FPS
+        handle_events()
         await asyncio.sleep(0.1)
 
+async def replay_trace(path: str):
+    replay = TraceReplay(path)
+    if not len(replay):
+        st.warning(f"{path} has no recorded ticks")
+        return
+    tick = st.sidebar.slider("Tick", replay.first_tick, replay.last_tick, replay.first_tick)
+    playing = st.sidebar.checkbox("Play from this tick")
+    fps = st.sidebar.slider("Playback FPS", 1, 120, 60)
+    st.subheader("Replay")
+    st.write(f"Playing {path} in the PyGame window.")
+    tick_placeholder = st.empty()
+
+    renderer = PygameRenderer(screen)
+    position = replay.position(tick)
+    while True:
+        frame = replay.frame_at(position)
+        renderer.render(frame)
+        tick_placeholder.metric("Tick", frame.time_elapsed)
+        handle_events()
+        if playing and position < len(replay) - 1:
+            position += 1
+        await asyncio.sleep(1 / fps)
+
+def handle_events():
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            pygame.quit()
+            sys.exit()
+
 if __name__ == "__main__":
     asyncio.run(main())